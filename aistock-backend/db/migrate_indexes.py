@@ -0,0 +1,113 @@
+"""
+索引迁移：为已有的表补建模型中声明、但数据库中缺失的索引，并删除模型中已去掉的 index=True 单列索引
+
+db.create_all() 只会创建缺失的表，不会给已有的表添加新声明的索引。
+大表上建索引耗时较长，多个进程同时执行还会互相等待元数据锁，
+因此不在 Web/worker 进程启动时执行，升级后由部署流程单独运行一次。
+
+用法（在 aistock-backend 目录下执行）:
+    python -m db.migrate_indexes              # 执行迁移
+    python -m db.migrate_indexes --dry-run    # 只列出需要创建和删除的索引
+
+已存在的索引会被跳过，重复执行是安全的。MySQL(InnoDB) 的 CREATE/DROP INDEX 为在线DDL，执行期间表仍可读写。
+只删除 SQLAlchemy 按 index=True 自动命名（ix_<表名>_<列名>）、且模型中已不再声明的索引，
+手工创建的其他索引不会被删除；有索引创建失败时不执行删除，避免删掉仍被查询依赖的索引。
+"""
+import argparse
+import sys
+import time
+from sqlalchemy import MetaData, Table, inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+from db.models import db, engine
+
+
+def missing_indexes():
+    """
+    对比模型与数据库
+
+    Returns:
+        list: 模型中声明、数据库中缺失的索引；表不存在时跳过（由 db.create_all() 建表）
+    """
+    inspector = inspect(engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def stale_indexes():
+    """
+    对比模型与数据库
+
+    Returns:
+        list: 数据库中存在、模型中已不再声明的 index=True 自动命名索引（反射得到的 Index 对象）
+    """
+    inspector = inspect(engine)
+    stale = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        declared = {index.name for index in table.indexes}
+        names = [
+            index["name"] for index in inspector.get_indexes(table.name)
+            if index["name"].startswith(f"ix_{table.name}_") and index["name"] not in declared
+        ]
+        if names:
+            reflected = Table(table.name, MetaData(), autoload_with=engine)
+            stale.extend(index for index in reflected.indexes if index.name in names)
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description="补建模型中声明、数据库中缺失的索引，删除模型中已去掉的单列索引")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要创建和删除的索引")
+    args = parser.parse_args()
+
+    try:
+        missing = missing_indexes()
+        stale = stale_indexes()
+    except SQLAlchemyError as e:
+        print(f"读取数据库索引失败: {e}")
+        return 1
+
+    if not missing and not stale:
+        print("索引已与模型一致，无需迁移")
+        return 0
+    for index in missing:
+        print(f"待创建: {index.table.name}.{index.name} ({', '.join(column.name for column in index.columns)})")
+    for index in stale:
+        print(f"待删除: {index.table.name}.{index.name} ({', '.join(column.name for column in index.columns)})")
+    if args.dry_run:
+        return 0
+
+    failed = 0
+    for index in missing:
+        start = time.time()
+        try:
+            index.create(bind=engine)
+            print(f"已创建 {index.table.name}.{index.name}，耗时 {time.time() - start:.1f} 秒")
+        except SQLAlchemyError as e:
+            failed += 1
+            print(f"创建索引 {index.table.name}.{index.name} 失败: {e}")
+    if failed:
+        if stale:
+            print("有索引创建失败，跳过删除旧索引")
+        return 1
+
+    for index in stale:
+        start = time.time()
+        try:
+            index.drop(bind=engine)
+            print(f"已删除 {index.table.name}.{index.name}，耗时 {time.time() - start:.1f} 秒")
+        except SQLAlchemyError as e:
+            failed += 1
+            print(f"删除索引 {index.table.name}.{index.name} 失败: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Boolean, Date, BigInteger, UniqueConstraint, JSON, DECIMAL
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Boolean, Date, BigInteger, UniqueConstraint, JSON, DECIMAL, LargeBinary
+from sqlalchemy import Index as TableIndex  # 避免与下方的 Index(指数) 模型重名
 from sqlalchemy.dialects.mysql import CHAR
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -108,6 +109,11 @@ class HotStock(Base):
 
     stocks = relationship('Stocks', back_populates='hot_entries')
 
+    __table_args__ = (
+        # 按榜单取排行：WHERE remark=? ORDER BY rank
+        TableIndex('idx_hot_stock_remark_rank', 'remark', 'rank'),
+    )
+
 
 class Index(Base):
     """市场指数表：存储上证指数、深证成指等主要指数数据"""
@@ -129,8 +135,8 @@ class News(Base):
     title = Column(String(255), nullable=False, comment='新闻标题')
     content = Column(Text, nullable=False, comment='新闻正文')
     content_hash = Column(CHAR(64), nullable=False, unique=True, index=True, comment='内容哈希')
-    link = Column(String(255), comment='原始链接')
-    code = Column(String(10), ForeignKey('stocks.code', ondelete='SET NULL'), nullable=True, index=True, comment='股票代码')
+    link = Column(String(255), index=True, comment='原始链接')
+    code = Column(String(10), ForeignKey('stocks.code', ondelete='SET NULL'), nullable=True, comment='股票代码')
     is_important = Column(Integer, nullable=True, default=None, comment='是否重要：0=不重要，1=重要')
     download_time = Column(DateTime, nullable=True, comment='新闻下载时间')
 
@@ -148,13 +154,21 @@ class News(Base):
     # 添加与推送记录的多对多关系
     push_records = relationship('PushRecord', secondary='push_news_relations', back_populates='news')
 
+    __table_args__ = (
+        # 按股票分页浏览新闻：WHERE code=? ORDER BY ctime DESC, id DESC 及游标分页
+        # 以 code 开头，同时用于 code 的外键和过滤，不再单独给 code 建索引
+        TableIndex('idx_news_code_ctime_id', 'code', 'ctime', 'id'),
+        # 重要新闻列表：WHERE is_important=1 ORDER BY ctime DESC
+        TableIndex('idx_news_important_ctime', 'is_important', 'ctime'),
+    )
+
 
 class NewsEmbedding(Base):
     """存储新闻内容的嵌入向量，用于相似度计算和去重"""
     __tablename__ = 'news_embeddings'
 
     news_id = Column(Integer, ForeignKey('news.id', ondelete='CASCADE'), primary_key=True, comment='关联的新闻ID')
-    embedding_vector = Column(JSON, nullable=False, comment='嵌入向量JSON数据')
+    embedding_vector = Column(LargeBinary, nullable=False, comment='嵌入向量，带维度头的二进制 float32/float16')
     model_name = Column(String(100), nullable=False, comment='使用的嵌入模型')
     created_at = Column(DateTime, default=datetime.now, comment='创建时间')
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
@@ -162,6 +176,36 @@ class NewsEmbedding(Base):
     news = relationship('News', back_populates='embedding')
 
 
+class EmbeddingCache(Base):
+    """按 (模型, 内容哈希) 缓存嵌入向量，内容相同的新闻不重复调用嵌入API"""
+    __tablename__ = 'embedding_cache'
+
+    model_name = Column(String(100), primary_key=True, comment='嵌入模型')
+    content_hash = Column(CHAR(64), primary_key=True, comment='嵌入文本的 SHA-256')
+    embedding_vector = Column(LargeBinary, nullable=False, comment='嵌入向量，带维度头的二进制 float32/float16')
+    token_count = Column(Integer, nullable=True, comment='生成该向量消耗的token数（估算）')
+    created_at = Column(DateTime, default=datetime.now, comment='创建时间')
+
+
+class LLMMemo(Base):
+    """按 (提示词模板版本, 模型, 规范化输入的哈希) 记录大模型的原始回复，相同输入不重复调用大模型"""
+    __tablename__ = 'llm_memo'
+
+    prompt_version = Column(String(64), primary_key=True, comment='提示词模板及版本，如 financial_news:v1')
+    model_name = Column(String(100), primary_key=True, comment='大模型')
+    input_hash = Column(CHAR(64), primary_key=True, comment='规范化输入的 SHA-256')
+    output = Column(Text, nullable=False, comment='大模型的原始回复')
+    prompt_tokens = Column(Integer, nullable=True, comment='生成该回复消耗的输入token数')
+    completion_tokens = Column(Integer, nullable=True, comment='生成该回复消耗的输出token数')
+    hit_count = Column(Integer, default=0, nullable=False, comment='命中次数（即避免的调用次数）')
+    created_at = Column(DateTime, default=datetime.now, comment='创建时间')
+    expires_at = Column(DateTime, nullable=False, comment='过期时间，过期后视为未命中')
+
+    __table_args__ = (
+        TableIndex('idx_llm_memo_expires_at', 'expires_at'),
+    )
+
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -197,6 +241,11 @@ class PushRecord(Base):
     # 添加与news的多对多关系
     news = relationship('News', secondary='push_news_relations', back_populates='push_records')
 
+    __table_args__ = (
+        # 用户推送历史：WHERE user_id=? ORDER BY push_time DESC
+        TableIndex('idx_push_records_user_time', 'user_id', 'push_time'),
+    )
+
 
 class UserStock(Base):
     __tablename__ = 'user_stocks'
@@ -253,7 +302,11 @@ class NewsTagRelation(Base):
     news = relationship('News', back_populates='tags_relation')
     tag = relationship('Tag', back_populates='news')
     
-    __table_args__ = (UniqueConstraint('news_id', 'tag_id', name='uq_news_tag'),)
+    __table_args__ = (
+        UniqueConstraint('news_id', 'tag_id', name='uq_news_tag'),
+        # 按标签查新闻：WHERE tag_id=?（主键以news_id开头，无法用于按标签查找）
+        TableIndex('idx_news_tag_relations_tag', 'tag_id', 'news_id'),
+    )
 
 
 class StockTagRelation(Base):
@@ -281,6 +334,8 @@ class StockEvaluation(Base):
 
     stocks = relationship('Stocks', back_populates='evaluations')
 
+    # 最近一次评价（WHERE code=? ORDER BY evaluation_time DESC）直接使用主键 (code, evaluation_time)，无需额外索引
+
 
 class UpdateRecord(Base):
     """更新记录表：记录各种数据的更新操作"""
@@ -291,6 +346,11 @@ class UpdateRecord(Base):
     message = Column(Text, nullable=True, comment='更新内容描述')
     created_at = Column(DateTime, server_default=func.now(), comment='记录时间')
 
+    __table_args__ = (
+        # 按类型查看最近的更新：WHERE update_type=? ORDER BY created_at DESC
+        TableIndex('idx_update_records_type_time', 'update_type', 'created_at'),
+    )
+
 
 class NewsSummary(Base):
     """存储新闻摘要内容"""
@@ -326,7 +386,11 @@ class UserPushConfig(Base):
     
     user = relationship('User', back_populates='push_configs')
     
-    __table_args__ = (UniqueConstraint('user_id', 'push_type', name='uq_user_push_type'),)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'push_type', name='uq_user_push_type'),
+        # 推送任务筛选订阅用户：WHERE push_type=? AND enabled=1
+        TableIndex('idx_user_push_type_enabled', 'push_type', 'enabled'),
+    )
 
 
 class StockPinyin(Base):
@@ -0,0 +1,53 @@
+"""
+AI任务worker
+
+从Redis任务队列中取出并执行耗时的大模型任务，与Web服务使用同一镜像，以独立进程（容器）运行：
+
+    python eva_worker.py
+
+- eva：/api/eva 提交的评估任务，结果写入数据库和 stock:eva:{code} 缓存，并发数由 EVA_WORKER_CONCURRENCY 控制（默认4），
+  任务超时由 EVA_JOB_TIMEOUT_SECONDS 控制（默认按大模型重试预算计算，约29分钟）
+- tag_leaders：/api/tags/leaders 提交的标签龙头股发现任务，结果写入 stock_tag_relations，
+  并发数由 TAG_WORKER_CONCURRENCY 控制（默认1），任务超时由 TAG_LEADERS_JOB_TIMEOUT_SECONDS 控制（默认约48分钟）
+
+任务主要耗时在等待大模型和网页抓取的响应。
+"""
+import logging
+import os
+import signal
+import threading
+from app import app
+from routes.ai_eva import EVA_QUEUE, EVA_JOB_TIMEOUT_SECONDS, run_eva_job
+from routes.tags import TAG_LEADERS_QUEUE, TAG_LEADERS_JOB_TIMEOUT_SECONDS, run_tag_leaders_job
+from utils.job_queue import JobWorker
+
+logger = logging.getLogger('app')
+
+EVA_WORKER_CONCURRENCY = int(os.getenv("EVA_WORKER_CONCURRENCY", 4))
+TAG_WORKER_CONCURRENCY = int(os.getenv("TAG_WORKER_CONCURRENCY", 1))
+
+
+def main():
+    worker = JobWorker(EVA_QUEUE, run_eva_job, concurrency=EVA_WORKER_CONCURRENCY, wrap=app.app_context,
+                       timeout=EVA_JOB_TIMEOUT_SECONDS)
+    tag_worker = JobWorker(TAG_LEADERS_QUEUE, run_tag_leaders_job, concurrency=TAG_WORKER_CONCURRENCY,
+                           wrap=app.app_context, timeout=TAG_LEADERS_JOB_TIMEOUT_SECONDS)
+    # 两个队列共用停止信号
+    tag_worker.stop_event = worker.stop_event
+
+    def handle_signal(signum, frame):
+        logger.info(f"收到信号 {signum}，处理完当前任务后退出")
+        worker.stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    tag_thread = threading.Thread(target=tag_worker.run, name=f"{TAG_LEADERS_QUEUE}-main", daemon=True)
+    tag_thread.start()
+    with app.app_context():
+        worker.run()
+    tag_thread.join()
+
+
+if __name__ == "__main__":
+    main()
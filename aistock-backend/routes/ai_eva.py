@@ -1,15 +1,16 @@
-from flask import Blueprint, request, jsonify, current_app as app
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app as app
 import logging
 import json
+import os
 import time
 import re
 from datetime import datetime, timedelta
-from flask_jwt_extended import jwt_required
 from db.models import db, StockEvaluation, News
-from sqlalchemy import or_
 from utils.ai_utils import analyze_financial_news
-from .news import get_news
-from utils.redis_cache import redis_cache, get_cached_data, cache_data
+from utils.llm_client import max_call_seconds
+from .news import refresh_stock_news
+from utils.redis_cache import get_or_compute, get_cached_entry
+from utils.job_queue import enqueue_job, get_job, job_view, iter_job_events, JobQueueUnavailable, FINISHED_STATUSES
 
 ai_eva_bp = Blueprint('ai_eva', __name__, url_prefix='/api')
 logger = logging.getLogger('app')
@@ -18,18 +19,36 @@ logger = logging.getLogger('app')
 TRADING_START_HOUR = 9
 TRADING_END_HOUR = 17
 
+# 评估结果缓存时间(秒)：正常结果3小时，无新闻1小时，备用结果30分钟
+EVA_CACHE_SECONDS = 10800
+EVA_EMPTY_CACHE_SECONDS = 3600
+EVA_FALLBACK_CACHE_SECONDS = 1800
+
+# 评估任务队列，由 eva_worker.py 进程消费
+EVA_QUEUE = "eva"
+# 评估任务的最长执行时间(秒)，同时作为单飞锁的有效期：一次大模型调用按最大重试次数与退避时间估算，
+# 另留10分钟给新闻刷新、等待并发名额和限流冷却
+EVA_JOB_TIMEOUT_SECONDS = int(os.getenv("EVA_JOB_TIMEOUT_SECONDS", max_call_seconds() + 600))
+
+
 @ai_eva_bp.route('/eva', methods=['GET'])
 # @jwt_required()
 def evaluate_stock_news():
     """
     根据指定股票代码的近期新闻，评估其利好/利空情况
+
+    评估在后台worker中执行，接口不等待大模型：
+    - 缓存未过期且未要求刷新：直接返回缓存结果
+    - 否则提交评估任务（同一股票同时只有一个未完成的任务），并立即返回：
+      有历史结果时返回历史结果，data.job 为任务句柄；没有任何结果时返回202和任务句柄
+    - 可通过 /api/eva/jobs/<job_id> 轮询或 /api/eva/jobs/<job_id>/events 订阅任务状态
+
     参数：
     - code: 股票代码
     - refresh: 可选，是否强制刷新评估结果，默认false
     返回：
     - 评估结果
     """
-    start_time = time.time()
     stock_code = request.args.get('code', '').strip()
     if not stock_code:
         logger.debug("[ai/eva] 缺少 code 参数")
@@ -41,16 +60,173 @@ def evaluate_stock_news():
 
     # 生成缓存键，包含股票代码
     cache_key = f"stock:eva:{stock_code}"
-    
-    # 如果不是强制刷新，先尝试从缓存获取
-    if not refresh:
-        cached_result = get_cached_data(cache_key)
-        if cached_result is not None:
-            logger.debug(f"[ai/eva] 缓存命中: {cache_key}")
-            return cached_result
+
+    entry = get_cached_entry(cache_key)
+    if entry is not None and entry[1] and not refresh:
+        return jsonify(entry[0]), 200
+
+    try:
+        job = submit_eva_job(stock_code, refresh)
+    except JobQueueUnavailable as e:
+        # 任务队列不可用时退回到请求内同步评估
+        logger.warning(f"[ai/eva] 任务队列不可用，同步评估: {e}")
+        result, status = get_or_compute(
+            cache_key,
+            lambda: _evaluate_stock(stock_code, use_recent=not refresh),
+            expire_seconds=EVA_CACHE_SECONDS,
+            stale_seconds=1800,
+            lock_seconds=EVA_JOB_TIMEOUT_SECONDS,
+            wait_seconds=60,
+            force=refresh,
+        )
+        return jsonify(result), status
+
+    latest = entry[0] if entry is not None else _latest_evaluation(stock_code)
+    if latest is None:
+        return jsonify({"code": 0, "msg": "评估任务已提交", "data": {"job": job}}), 202
+    latest = {**latest, "data": {**latest["data"], "job": job}}
+    return jsonify(latest), 200
+
+
+def submit_eva_job(stock_code, refresh=False):
+    """
+    提交评估任务，同一股票已有未完成的任务时返回该任务
+
+    Returns:
+        dict: 任务句柄 {id, status, status_url}
+
+    Raises:
+        JobQueueUnavailable: Redis不可用
+    """
+    job_id, created = enqueue_job(EVA_QUEUE, {"code": stock_code, "refresh": refresh}, dedup_key=stock_code,
+                                  timeout=EVA_JOB_TIMEOUT_SECONDS)
+    if created:
+        logger.debug(f"[ai/eva] 已提交评估任务: {stock_code} {job_id}")
+        status = "pending"
+    else:
+        job = get_job(job_id)
+        status = job["status"] if job else "pending"
+    return {"id": job_id, "status": status, "status_url": f"/api/eva/jobs/{job_id}"}
+
+
+def run_eva_job(args):
+    """
+    评估任务处理函数（在 eva_worker.py 进程的应用上下文中执行），结果写入 stock:eva:{code} 缓存
+
+    Args:
+        args: {"code": 股票代码, "refresh": 是否忽略近期评测结果}
+
+    Returns:
+        dict: 评估结果
+
+    Raises:
+        RuntimeError: 评估失败
+    """
+    stock_code = args["code"]
+    result, status = get_or_compute(
+        f"stock:eva:{stock_code}",
+        lambda: _evaluate_stock(stock_code, use_recent=not args.get("refresh")),
+        expire_seconds=EVA_CACHE_SECONDS,
+        stale_seconds=1800,
+        lock_seconds=EVA_JOB_TIMEOUT_SECONDS,
+        force=True,
+    )
+    if status != 200:
+        raise RuntimeError((result or {}).get("msg", f"评估失败，状态码 {status}"))
+    return result
+
+
+@ai_eva_bp.route('/eva/jobs/<job_id>', methods=['GET'])
+def get_eva_job(job_id):
+    """查询评估任务状态，完成后附带评估结果"""
+    try:
+        job = get_job(job_id)
+    except JobQueueUnavailable:
+        return jsonify({"code": 503, "msg": "任务队列暂不可用"}), 503
+    if job is None or job.get("queue") != EVA_QUEUE:
+        return jsonify({"code": 404, "msg": "任务不存在或已过期"}), 404
+    return jsonify({"code": 0, "msg": "success", "data": job_view(job)})
+
+
+@ai_eva_bp.route('/eva/jobs/<job_id>/events', methods=['GET'])
+def stream_eva_job(job_id):
+    """以SSE推送评估任务状态，任务结束（done/failed）或超时后关闭连接"""
+    def generate():
+        try:
+            for job in iter_job_events(job_id):
+                if job is None:
+                    # 心跳，防止代理断开空闲连接
+                    yield ": keep-alive\n\n"
+                    continue
+                if job.get("queue") != EVA_QUEUE:
+                    break
+                yield f"data: {json.dumps(job_view(job), ensure_ascii=False)}\n\n"
+                if job["status"] in FINISHED_STATUSES:
+                    return
+            yield f"data: {json.dumps({'id': job_id, 'status': 'not_found'})}\n\n"
+        except JobQueueUnavailable:
+            yield f"data: {json.dumps({'id': job_id, 'status': 'unavailable'})}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _evaluation_payload(evaluation, msg="success"):
+    """StockEvaluation 记录转换为响应数据"""
+    # 确保正确解析JSON字符串
+    try:
+        news_list_data = json.loads(evaluation.news_list) if evaluation.news_list else []
+    except json.JSONDecodeError:
+        logger.warning(f"[ai/eva] 无法解析news_list: {evaluation.news_list}")
+        news_list_data = []
+    return {
+        "code": 0,
+        "msg": msg,
+        "data": {
+            "conclusion": evaluation.conclusion,
+            "reason": evaluation.reason,
+            "news_list": news_list_data,
+            "evaluation_time": evaluation.evaluation_time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+    }
+
+
+def _latest_evaluation(stock_code):
+    """数据库中最近一次评估结果（不限时间），没有时返回None"""
+    evaluation = StockEvaluation.query.filter(
+        StockEvaluation.code == stock_code
+    ).order_by(StockEvaluation.evaluation_time.desc()).first()
+    return _evaluation_payload(evaluation) if evaluation else None
+
+
+def _refresh_news_if_stale(stock_code):
+    """最新新闻为空或下载时间超过1小时时，触发该股票的新闻更新"""
+    if stock_code in ['cn', 'hk_us', 'top']:
+        return
+    latest_news = News.query.filter(
+        News.code == stock_code
+    ).order_by(News.ctime.desc()).first()
+    if latest_news and (datetime.now() - latest_news.download_time).total_seconds() <= 3600:
+        return
+    logger.debug(f"[ai/eva] 更新股票 {stock_code} 的新闻")
+    refresh_stock_news(stock_code)
+
+
+def _evaluate_stock(stock_code, use_recent=True):
+    """
+    评估股票近期新闻
+
+    Args:
+        stock_code: 股票代码
+        use_recent: 是否优先复用近72小时内的评测结果
+
+    Returns:
+        tuple: (响应数据, HTTP状态码, 缓存过期时间)
+    """
+    start_time = time.time()
 
     # 检查是否有近72小时内的评测结果
-    if not refresh:
+    if use_recent:
         twelve_hours_ago = datetime.now() - timedelta(hours=72)
         recent_evaluation = StockEvaluation.query.filter(
             StockEvaluation.code == stock_code,
@@ -59,44 +235,14 @@ def evaluate_stock_news():
 
         if recent_evaluation:
             logger.debug(f"[ai/eva] 找到近72小时内的评测结果，直接返回")
-            # 确保正确解析JSON字符串
-            try:
-                news_list_data = json.loads(recent_evaluation.news_list) if recent_evaluation.news_list else []
-            except json.JSONDecodeError:
-                logger.warning(f"[ai/eva] 无法解析news_list: {recent_evaluation.news_list}")
-                news_list_data = []
-            
-            # 构建返回结果
-            result = jsonify({
-                "code": 0,
-                "msg": "success",
-                "data": {
-                    "conclusion": recent_evaluation.conclusion,
-                    "reason": recent_evaluation.reason,
-                    "news_list": news_list_data,
-                    "evaluation_time": recent_evaluation.evaluation_time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-            })
-            
-            # 缓存数据库查询结果，设置3小时过期时间 (10800秒)
-            try:
-                cache_success = cache_data(cache_key, result.get_json(), expire_seconds=10800)
-                if cache_success:
-                    logger.debug(f"[ai/eva] 数据库结果已缓存: {cache_key}")
-            except Exception as e:
-                logger.error(f"[ai/eva] 缓存数据库结果异常: {e}")
-                
-            return result
+            return _evaluation_payload(recent_evaluation), 200, EVA_CACHE_SECONDS
 
-    # 调用 get_news 方法触发新闻更新
-    logger.debug(f"[ai/eva] 调用 get_news 更新股票 {stock_code} 的新闻")
+    # 触发新闻更新
     try:
-        news_response = get_news()
-        if news_response.status_code != 200:
-            logger.error(f"[ai/eva] 更新新闻失败，返回状态码: {news_response.status_code}")
-            return jsonify({"code": 500, "msg": "更新新闻失败"}), 500
+        _refresh_news_if_stale(stock_code)
     except Exception as e:
         logger.error(f"[ai/eva] 更新新闻异常: {e}", exc_info=True)
+        db.session.rollback()
         # 即使更新失败也继续，使用现有新闻
 
     # 获取特定股票新闻
@@ -109,8 +255,8 @@ def evaluate_stock_news():
 
     if not recent_news:
         logger.debug(f"[ai/eva] 未找到股票 {stock_code} 的相关新闻")
-        # 构建返回结果
-        result = jsonify({
+        # 无新闻结果使用较短的缓存时间
+        return {
             "code": 0,
             "msg": "success",
             "data": {
@@ -119,17 +265,7 @@ def evaluate_stock_news():
                 "news_list": [],
                 "evaluation_time": now.strftime("%Y-%m-%d %H:%M:%S")
             }
-        })
-        
-        # 缓存无新闻结果，设置较短的过期时间 (1小时)
-        try:
-            cache_success = cache_data(cache_key, result.get_json(), expire_seconds=3600)
-            if cache_success:
-                logger.debug(f"[ai/eva] 无新闻结果已缓存: {cache_key}")
-        except Exception as e:
-            logger.error(f"[ai/eva] 缓存无新闻结果异常: {e}")
-            
-        return result
+        }, 200, EVA_EMPTY_CACHE_SECONDS
     
     combined_news = ""
     
@@ -150,7 +286,8 @@ def evaluate_stock_news():
         reason = result.get('reason', '未提供理由')
         raw_news_list = result.get('news_list', [])
         
-        # 处理新闻列表，转换为对象格式
+        # 处理新闻列表，转换为对象格式；发布时间取自已加载的新闻，不再逐条查询数据库
+        ctime_by_link = {news.link: news.ctime for news in recent_news if news.link}
         news_list = []
         for news_item in raw_news_list:
             # 提取链接
@@ -161,12 +298,10 @@ def evaluate_stock_news():
             title_match = re.search(r'\[(.*?)\]', news_item)
             title = title_match.group(1) if title_match else news_item
             
-            # 根据链接查询数据库中的新闻记录获取发布时间
+            # 根据链接匹配新闻的发布时间
             publish_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            if link:
-                db_news = News.query.filter_by(link=link).first()
-                if db_news:
-                    publish_time = db_news.ctime.strftime("%Y-%m-%d %H:%M:%S")
+            if link in ctime_by_link:
+                publish_time = ctime_by_link[link].strftime("%Y-%m-%d %H:%M:%S")
             
             news_list.append({
                 "title": title,
@@ -187,8 +322,7 @@ def evaluate_stock_news():
 
         logger.debug(f"[ai/eva] 评估完成并存储到数据库，股票代码: {stock_code}，总耗时: {time.time() - start_time:.2f}秒")
 
-        # 构建返回结果
-        result = jsonify({
+        return {
             "code": 0,
             "msg": "success",
             "data": {
@@ -197,19 +331,7 @@ def evaluate_stock_news():
                 "news_list": news_list,
                 "evaluation_time": now.strftime("%Y-%m-%d %H:%M:%S")
             }
-        })
-        
-        # 缓存结果，设置3小时过期时间 (10800秒)
-        try:
-            cache_success = cache_data(cache_key, result.get_json(), expire_seconds=10800)
-            if cache_success:
-                logger.debug(f"[ai/eva] 结果已缓存: {cache_key}")
-            else:
-                logger.warning(f"[ai/eva] 结果缓存失败: {cache_key}")
-        except Exception as e:
-            logger.error(f"[ai/eva] 缓存操作异常: {e}")
-        
-        return result
+        }, 200, EVA_CACHE_SECONDS
     except Exception as e:
         logger.error(f"[ai/eva] AI分析失败: {e}", exc_info=True)
         
@@ -227,8 +349,8 @@ def evaluate_stock_news():
                 fallback_news_list = []
                 
             logger.debug(f"[ai/eva] 返回最近一次评估结果作为备用")
-            # 构建返回结果
-            result = jsonify({
+            # 备用结果使用较短的缓存时间
+            return {
                 "code": 0,
                 "msg": f"本次分析失败，返回历史结果",
                 "data": {
@@ -238,20 +360,10 @@ def evaluate_stock_news():
                     "evaluation_time": fallback.evaluation_time.strftime("%Y-%m-%d %H:%M:%S"),
                     "is_fallback": True
                 }
-            })
-            
-            # 缓存备用结果，设置较短的过期时间 (30分钟)
-            try:
-                cache_success = cache_data(cache_key, result.get_json(), expire_seconds=1800)
-                if cache_success:
-                    logger.debug(f"[ai/eva] 备用结果已缓存: {cache_key}")
-            except Exception as e:
-                logger.error(f"[ai/eva] 缓存备用结果异常: {e}")
-                
-            return result
+            }, 200, EVA_FALLBACK_CACHE_SECONDS
         
-        return jsonify({
+        return {
             "code": 500,
             "msg": f"AI分析失败: {str(e)}",
             "data": None
-        }), 500
+        }, 500
@@ -7,11 +7,13 @@ import json
 from datetime import datetime, timedelta
 import akshare as ak
 from db.models import db, Index
+from utils.redis_cache import redis_cache
 
 market_bp = Blueprint('market', __name__, url_prefix='/api')
 logger = logging.getLogger('app')
 
 @market_bp.route('/market/overview', methods=['GET'])
+@redis_cache("market:overview", expire_seconds=10)  # 指数每10秒更新一次
 def get_market_overview():
     """
     极简市场概览API（仅返回核心指标）
@@ -4,6 +4,9 @@ import hashlib
 import time
 import os
 from flask_jwt_extended import jwt_required
+from utils.redis_cache import get_cache_stats
+from utils.llm_memo import get_memo_stats
+from utils.llm_client import get_llm_stats
 
 monitor_bp = Blueprint('monitor', __name__, url_prefix='/api/monitor')
 
@@ -79,3 +82,27 @@ def get_server_status():
             "message": f"获取服务器状态失败: {str(e)}",
             "data": None
         }), 500
+
+
+@monitor_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    """获取当前worker进程的缓存统计信息（含大模型记忆命中与调用统计），供监控系统抓取，需要JWT认证"""
+    try:
+        return jsonify({
+            "code": 200,
+            "message": "获取缓存统计成功",
+            "data": {
+                "pid": os.getpid(),
+                **get_cache_stats(),
+                "llm_memo": get_memo_stats(),
+                "llm": get_llm_stats()
+            }
+        })
+    except Exception as e:
+        current_app.logger.error(f"获取缓存统计错误: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "message": f"获取缓存统计失败: {str(e)}",
+            "data": None
+        }), 500
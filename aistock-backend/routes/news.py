@@ -8,11 +8,46 @@ from db.models import db, News, Stocks, NewsTagRelation, Tag, NewsSummary
 from semhash import SemHash
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
 from sqlalchemy import func, and_, text, or_
-from utils.redis_cache import redis_cache, get_cached_data, cache_data, clear_cache_pattern
+from utils.redis_cache import redis_cache, get_cached_data, cache_data, get_namespace_version, bump_namespace_version
+from utils.http_cache import cache_response, get_cached_response
+from utils.news_utils import load_news_tags, load_news_summaries, paginate_desc
+from utils.news_index import get_news_index, embed_query, NewsIndexUnavailable
 
 news_bp = Blueprint('news', __name__, url_prefix='/api')
 logger = logging.getLogger('app')
 
+# 新闻按 (发布时间, ID) 倒序排列，作为游标分页的排序键
+NEWS_ORDER_COLUMNS = (News.ctime, News.id)
+
+def _news_cache_key(stock_code, page, limit, cursor=None):
+    """新闻分页缓存键，嵌入该股票新闻缓存的版本号，版本号递增后旧键全部失效"""
+    version = get_namespace_version(f"stock:news:{stock_code}")
+    position = f"cursor:{cursor}" if cursor else f"page:{page}"
+    return f"stock:news:{stock_code}:v{version}:{position}:limit:{limit}"
+
+def _count_stock_news(stock_code):
+    """
+    获取股票新闻总数，结果按新闻缓存版本号缓存10分钟，新闻更新后自动失效
+    """
+    version = get_namespace_version(f"stock:news:{stock_code}")
+    cache_key = f"stock:news:{stock_code}:v{version}:total"
+    total = get_cached_data(cache_key)
+    if total is None:
+        total = News.query.filter(News.code == stock_code).count()
+        cache_data(cache_key, total, expire_seconds=600)
+    return total
+
+def _query_stock_news(stock_code, limit, cursor=None, page=1):
+    """按 (ctime, id) 倒序查询一页股票新闻，返回 (新闻列表, 下一页游标)"""
+    return paginate_desc(
+        News.query.filter(News.code == stock_code),
+        NEWS_ORDER_COLUMNS,
+        limit,
+        cursor=cursor,
+        page=page,
+        cursor_of=lambda news: (news.ctime, news.id),
+    )
+
 @news_bp.route('/news/get', methods=['GET'])
 def get_news():
     stock_code = request.args.get('code', '').strip()
@@ -21,47 +56,40 @@ def get_news():
 
     logger.debug(f"[news/get] 请求 code={stock_code}")
 
-    # 分页参数
+    # 分页参数：优先使用上一页返回的游标(cursor)，没有游标时按页码分页
     try:
         page = max(1, int(request.args.get('page', 1)))
         limit = max(1, min(int(request.args.get('limit', 20)), 100))
     except ValueError:
         return jsonify({"error": "分页参数格式错误"}), 400
+    cursor = request.args.get('cursor', '').strip() or None
 
     # 新增强制刷新参数，默认为不强制刷新
     refresh = request.args.get('refresh', '0') == '1'
 
     # 生成缓存键，包含股票代码和分页参数
-    cache_key = f"stock:news:{stock_code}:page:{page}:limit:{limit}"
+    cache_key = _news_cache_key(stock_code, page, limit, cursor)
     
     # 如果不是强制刷新，先尝试从缓存获取
     if not refresh:
-        cached_result = get_cached_data(cache_key)
-        if cached_result is not None:
+        cached_response = get_cached_response(cache_key)
+        if cached_response is not None:
             logger.debug(f"[news/get] 缓存命中: {cache_key}")
-            return cached_result
+            return cached_response.to_response()
 
     logger.debug(f"[news/get] 缓存未命中或强制刷新，查询数据库: {cache_key}")
 
-    # 获取股票简称
-    stock_name = None
+    # 查询数据库中的新闻
     try:
-        stock = db.session.query(Stocks).filter_by(code=stock_code).first()
-        if stock:
-            stock_name = stock.name
-    except Exception as e:
-        logger.error(f"[news/get] 获取股票简称失败: {e}", exc_info=True)
-        stock_name = None
-
-    # 查询数据库中的新闻 - 正确引用 tags_relation
-    query = News.query.filter(News.code == stock_code).order_by(News.ctime.desc())
-    total = query.count()
-    news_list = query.offset((page - 1) * limit).limit(limit).all()
-
-    # 特殊处理：如果code是cn或者hk_us，或者有分页参数(page > 1)，不触发更新，直接返回数据库数据
-    if stock_code in ['cn', 'hk_us','top'] or page > 1:
-        if page > 1:
-            logger.debug(f"[news/get] 分页请求 page={page}，不触发新闻更新，直接返回数据库数据")
+        news_list, next_cursor = _query_stock_news(stock_code, limit, cursor, page)
+    except ValueError as e:
+        logger.debug(f"[news/get] {e}")
+        return jsonify({"error": "分页游标无效"}), 400
+
+    # 特殊处理：如果code是cn或者hk_us，或者请求的不是第一页，不触发更新，直接返回数据库数据
+    if stock_code in ['cn', 'hk_us','top'] or page > 1 or cursor:
+        if page > 1 or cursor:
+            logger.debug(f"[news/get] 分页请求 page={page}, cursor={cursor}，不触发新闻更新，直接返回数据库数据")
         else:
             logger.debug(f"[news/get] code为 {stock_code}，不触发新闻更新，直接返回数据库数据")
     else:
@@ -69,131 +97,25 @@ def get_news():
         now = datetime.now()
         if refresh or not news_list or (news_list and (now - news_list[0].download_time).total_seconds() > 3600):
             logger.debug(f"[news/get] 触发新闻更新，stock_code={stock_code}，refresh={refresh}")
-            try:
-                if not stock_name:
-                    logger.debug(f"[news/get] 股票简称未找到，使用股票代码作为名称")
-                    stock_name = stock_code
-                logger.debug(f"[news/get] akshare 拉取股票新闻，stock_name={stock_name}")
-                # 使用 akshare 拉取最新新闻
-                df = ak.stock_news_em(symbol=stock_name)
-                if df is not None and not df.empty:
-                    # 过滤新闻，确保包含股票名称或股票代码
-                    filtered_df = df[df["新闻标题"].str.contains(stock_name) | 
-                                    df["新闻内容"].str.contains(stock_name) |
-                                    df["新闻标题"].str.contains(stock_code) | 
-                                    df["新闻内容"].str.contains(stock_code)]
-                    
-                    logger.debug(f"[news/get] 原始新闻数量: {len(df)}，过滤后数量: {len(filtered_df)}")
-                    
-                    # 如果过滤后有新闻，则使用SemHash去重后更新到数据库
-                    if not filtered_df.empty:
-                        try:
-                            # 将DataFrame转换为记录列表
-                            news_records = filtered_df.to_dict('records')
-                            
-                            # 添加检查：确保记录不为空
-                            if news_records:
-                                logger.debug(f"[news/get] 新闻记录数量: {len(news_records)}")
-                                
-                                # 记录新闻记录的一些示例数据，帮助调试
-                                logger.debug(f"[news/get] 新闻记录示例: {news_records[0].keys()}")
-                                
-                                # 检查是否所有记录都有必要的列
-                                for i, record in enumerate(news_records):
-                                    if "新闻标题" not in record or "新闻内容" not in record:
-                                        logger.warning(f"[news/get] 记录 {i} 缺少必要列: {record.keys()}")
-                                
-                                # 确保所有记录都有所需的列
-                                valid_records = [r for r in news_records if "新闻标题" in r and "新闻内容" in r]
-                                if len(valid_records) != len(news_records):
-                                    logger.warning(f"[news/get] 过滤掉了 {len(news_records) - len(valid_records)} 条缺少必要列的记录")
-                                    news_records = valid_records
-                                
-                                if news_records:  # 再次检查，确保过滤后还有记录
-                                    logger.debug(f"[news/get] 开始创建SemHash实例，有效记录数: {len(news_records)}")
-                                    
-                                    semhash = SemHash.from_records(records=news_records, columns=["新闻标题", "新闻内容"], use_ann=False)
-                                    
-                                    logger.debug(f"[news/get] SemHash实例创建成功，开始执行去重操作")
-                                    # 执行去重操作，失败则直接返回空结果，不再重试
-                                    try:
-                                        logger.debug(f"[news/get] 执行SemHash去重操作")
-                                        dedup_result = semhash.self_deduplicate(threshold=0.8)
-                                    except Exception as e:
-                                        logger.error(f"[news/get] SemHash去重失败: {str(e)}，直接返回空结果")
-                                        dedup_result = None
-                                    
-                                    if dedup_result is not None:
-                                        deduplicated_news = dedup_result.selected
-                                        logger.debug(f"[news/get] SemHash去重后新闻数量: {len(deduplicated_news)}")
-                                        # 检测重复项信息
-                                        duplicates = dedup_result.duplicates
-                                        if duplicates:
-                                            logger.debug(f"[news/get] 发现并去除了 {len(duplicates)} 条重复新闻")
-                                        # 将去重后的数据转回DataFrame
-                                        import pandas as pd
-                                        if deduplicated_news:
-                                            # 确保所有记录都有必要的列
-                                            required_columns = ["新闻标题", "新闻内容"]
-                                            for record in deduplicated_news:
-                                                for col in required_columns:
-                                                    if col not in record:
-                                                        record[col] = ""
-                                            # 使用去重后的数据更新数据库
-                                            deduplicated_df = pd.DataFrame(deduplicated_news)
-                                            _update_news_in_db(stock_code, deduplicated_df)
-                                            # 清除该股票的所有新闻缓存
-                                            _clear_stock_news_cache(stock_code)
-                                        else:
-                                            logger.debug(f"[news/get] 去重后新闻为空，不更新数据库")
-                                    else:
-                                        logger.debug(f"[news/get] SemHash去重失败，未更新数据库")
-                            else:
-                                logger.debug(f"[news/get] 新闻记录为空，不进行去重处理")
-                        except Exception as e:
-                            logger.error(f"[news/get] 新闻处理失败: {e}", exc_info=True)
-                            # 确保事务回滚
-                            db.session.rollback()
-                    else:
-                        logger.debug(f"[news/get] 过滤后新闻为空，不更新数据库")
-            except Exception as e:
-                logger.error(f"[news/get] akshare 拉取失败: {e}", exc_info=True)
+            refresh_stock_news(stock_code)
+            # 新闻更新后版本号可能已递增，按新版本号缓存
+            cache_key = _news_cache_key(stock_code, page, limit)
 
             # 重新查询数据库获取最新数据
-            query = News.query.filter(News.code == stock_code).order_by(News.ctime.desc())
-            total = query.count()
-            news_list = query.offset((page - 1) * limit).limit(limit).all()
+            news_list, next_cursor = _query_stock_news(stock_code, limit, page=page)
 
     # 构建返回数据
+    # 整页新闻的标签和摘要各用一次查询批量获取
+    news_ids = [news.id for news in news_list]
+    tags_by_news = load_news_tags(news_ids)
+    summaries_by_news = load_news_summaries(news_ids)
+
     news_data = []
     for news in news_list:
-        # 构建标签数据
-        tag = {
-            "positive": [],
-            "negative": []
-        }
-        
-        # 通过关联查询获取标签信息
-        positive_tags_query = db.session.query(Tag.name)\
-            .join(NewsTagRelation, Tag.id == NewsTagRelation.tag_id)\
-            .filter(NewsTagRelation.news_id == news.id)\
-            .filter(Tag.tag_type == 1).all()
-        
-        negative_tags_query = db.session.query(Tag.name)\
-            .join(NewsTagRelation, Tag.id == NewsTagRelation.tag_id)\
-            .filter(NewsTagRelation.news_id == news.id)\
-            .filter(Tag.tag_type == 0).all()
-        
-        tag["positive"] = [t[0] for t in positive_tags_query]
-        tag["negative"] = [t[0] for t in negative_tags_query]
-        
         # 获取摘要 - 优先使用 NewsSummary 表中的摘要
         content = news.content[:100] + "..." if len(news.content) > 100 else news.content
-        
-        # 查询新闻摘要
-        summary_obj = NewsSummary.query.filter_by(news_id=news.id).first()
-        if summary_obj:
-            content = summary_obj.summary
+        if news.id in summaries_by_news:
+            content = summaries_by_news[news.id]
         
         news_data.append({
             "id": news.id,
@@ -202,14 +124,15 @@ def get_news():
             "publish_time": news.ctime.strftime("%Y-%m-%d %H:%M:%S"),
             "source": news.link,
             "url": news.link,
-            "tag": tag
+            "tag": tags_by_news[news.id]
         })
 
+    total = _count_stock_news(stock_code)
     total_pages = (total + limit - 1) // limit
-    logger.debug(f"[news/get] 返回 page={page}, limit={limit}, total={total}")
+    logger.debug(f"[news/get] 返回 page={page}, cursor={cursor}, limit={limit}, total={total}")
 
-    # 构建返回结果
-    result = jsonify({
+    # 构建返回结果，编码后的响应体缓存1小时
+    result = cache_response(cache_key, {
         "code": 0,
         "msg": "success",
         "data": {
@@ -219,22 +142,117 @@ def get_news():
                 "limit": limit,
                 "total": total,
                 "total_pages": total_pages,
-                "has_more": page < total_pages
+                "has_more": next_cursor is not None,
+                # 下一页请求携带该游标，翻页耗时与页码无关
+                "next_cursor": next_cursor
             }
         }
-    })
+    }, expire_seconds=3600)
+
+    return result.to_response()
+
+def refresh_stock_news(stock_code, stock_name=None):
+    """
+    从 akshare 拉取股票最新新闻，SemHash去重后写入数据库并清除该股票的新闻缓存
+
+    不依赖请求上下文，可在后台线程（应用上下文）中调用
 
-    # 缓存结果，设置1小时过期时间
+    Args:
+        stock_code: 股票代码
+        stock_name: 股票简称，为空时从数据库查询，查不到则使用股票代码
+    """
+    if not stock_name:
+        stock = db.session.query(Stocks).filter_by(code=stock_code).first()
+        stock_name = stock.name if stock else None
     try:
-        cache_success = cache_data(cache_key, result.get_json(), expire_seconds=3600)
-        if cache_success:
-            logger.debug(f"[news/get] 结果已缓存: {cache_key}")
-        else:
-            logger.warning(f"[news/get] 结果缓存失败: {cache_key}")
+        if not stock_name:
+            logger.debug(f"[news/get] 股票简称未找到，使用股票代码作为名称")
+            stock_name = stock_code
+        logger.debug(f"[news/get] akshare 拉取股票新闻，stock_name={stock_name}")
+        # 使用 akshare 拉取最新新闻
+        df = ak.stock_news_em(symbol=stock_name)
+        if df is not None and not df.empty:
+            # 过滤新闻，确保包含股票名称或股票代码
+            filtered_df = df[df["新闻标题"].str.contains(stock_name) | 
+                            df["新闻内容"].str.contains(stock_name) |
+                            df["新闻标题"].str.contains(stock_code) | 
+                            df["新闻内容"].str.contains(stock_code)]
+            
+            logger.debug(f"[news/get] 原始新闻数量: {len(df)}，过滤后数量: {len(filtered_df)}")
+            
+            # 如果过滤后有新闻，则使用SemHash去重后更新到数据库
+            if not filtered_df.empty:
+                try:
+                    # 将DataFrame转换为记录列表
+                    news_records = filtered_df.to_dict('records')
+                    
+                    # 添加检查：确保记录不为空
+                    if news_records:
+                        logger.debug(f"[news/get] 新闻记录数量: {len(news_records)}")
+                        
+                        # 记录新闻记录的一些示例数据，帮助调试
+                        logger.debug(f"[news/get] 新闻记录示例: {news_records[0].keys()}")
+                        
+                        # 检查是否所有记录都有必要的列
+                        for i, record in enumerate(news_records):
+                            if "新闻标题" not in record or "新闻内容" not in record:
+                                logger.warning(f"[news/get] 记录 {i} 缺少必要列: {record.keys()}")
+                        
+                        # 确保所有记录都有所需的列
+                        valid_records = [r for r in news_records if "新闻标题" in r and "新闻内容" in r]
+                        if len(valid_records) != len(news_records):
+                            logger.warning(f"[news/get] 过滤掉了 {len(news_records) - len(valid_records)} 条缺少必要列的记录")
+                            news_records = valid_records
+                        
+                        if news_records:  # 再次检查，确保过滤后还有记录
+                            logger.debug(f"[news/get] 开始创建SemHash实例，有效记录数: {len(news_records)}")
+                            
+                            semhash = SemHash.from_records(records=news_records, columns=["新闻标题", "新闻内容"], use_ann=False)
+                            
+                            logger.debug(f"[news/get] SemHash实例创建成功，开始执行去重操作")
+                            # 执行去重操作，失败则直接返回空结果，不再重试
+                            try:
+                                logger.debug(f"[news/get] 执行SemHash去重操作")
+                                dedup_result = semhash.self_deduplicate(threshold=0.8)
+                            except Exception as e:
+                                logger.error(f"[news/get] SemHash去重失败: {str(e)}，直接返回空结果")
+                                dedup_result = None
+                            
+                            if dedup_result is not None:
+                                deduplicated_news = dedup_result.selected
+                                logger.debug(f"[news/get] SemHash去重后新闻数量: {len(deduplicated_news)}")
+                                # 检测重复项信息
+                                duplicates = dedup_result.duplicates
+                                if duplicates:
+                                    logger.debug(f"[news/get] 发现并去除了 {len(duplicates)} 条重复新闻")
+                                # 将去重后的数据转回DataFrame
+                                import pandas as pd
+                                if deduplicated_news:
+                                    # 确保所有记录都有必要的列
+                                    required_columns = ["新闻标题", "新闻内容"]
+                                    for record in deduplicated_news:
+                                        for col in required_columns:
+                                            if col not in record:
+                                                record[col] = ""
+                                    # 使用去重后的数据更新数据库
+                                    deduplicated_df = pd.DataFrame(deduplicated_news)
+                                    _update_news_in_db(stock_code, deduplicated_df)
+                                    # 清除该股票的所有新闻缓存
+                                    _clear_stock_news_cache(stock_code)
+                                else:
+                                    logger.debug(f"[news/get] 去重后新闻为空，不更新数据库")
+                            else:
+                                logger.debug(f"[news/get] SemHash去重失败，未更新数据库")
+                    else:
+                        logger.debug(f"[news/get] 新闻记录为空，不进行去重处理")
+                except Exception as e:
+                    logger.error(f"[news/get] 新闻处理失败: {e}", exc_info=True)
+                    # 确保事务回滚
+                    db.session.rollback()
+            else:
+                logger.debug(f"[news/get] 过滤后新闻为空，不更新数据库")
     except Exception as e:
-        logger.error(f"[news/get] 缓存操作异常: {e}")
-
-    return result
+        logger.error(f"[news/get] akshare 拉取失败: {e}", exc_info=True)
 
 def _clear_stock_news_cache(stock_code):
     """
@@ -244,10 +262,9 @@ def _clear_stock_news_cache(stock_code):
         stock_code: 股票代码
     """
     try:
-        # 清除该股票所有分页的缓存
-        pattern = f"stock:news:{stock_code}:*"
-        cleared_count = clear_cache_pattern(pattern)
-        logger.debug(f"[cache] 已清除股票 {stock_code} 的 {cleared_count} 个新闻缓存")
+        # 递增版本号，该股票所有分页的旧缓存键不再被访问，随TTL自然过期
+        version = bump_namespace_version(f"stock:news:{stock_code}")
+        logger.debug(f"[cache] 已清除股票 {stock_code} 的新闻缓存，当前版本: {version}")
     except Exception as e:
         logger.error(f"[cache] 清除股票 {stock_code} 缓存失败: {e}")
 
@@ -375,30 +392,10 @@ def get_news_detail():
         return jsonify({'code': 404, 'msg': '新闻不存在'}), 404
 
     # 构建标签数据
-    tag = {
-        "positive": [],
-        "negative": []
-    }
-    
-    # 通过关联查询获取标签信息
-    positive_tags_query = db.session.query(Tag.name)\
-        .join(NewsTagRelation, Tag.id == NewsTagRelation.tag_id)\
-        .filter(NewsTagRelation.news_id == news.id)\
-        .filter(Tag.tag_type == 1).all()
-    
-    negative_tags_query = db.session.query(Tag.name)\
-        .join(NewsTagRelation, Tag.id == NewsTagRelation.tag_id)\
-        .filter(NewsTagRelation.news_id == news.id)\
-        .filter(Tag.tag_type == 0).all()
-    
-    tag["positive"] = [t[0] for t in positive_tags_query]
-    tag["negative"] = [t[0] for t in negative_tags_query]
+    tag = load_news_tags([news.id])[news.id]
     
     # 查找摘要
-    summary = None
-    summary_obj = NewsSummary.query.filter_by(news_id=news.id).first()
-    if summary_obj:
-        summary = summary_obj.summary
+    summary = load_news_summaries([news.id]).get(news.id)
 
     # 构建返回数据
     detail = {
@@ -427,6 +424,107 @@ def get_news_detail():
     app.logger.debug(f"[news/detail] 成功返回 news_id={news_id}")
     return result
 
+def _similar_news_data(matches):
+    """
+    按相似度顺序组装新闻列表，已删除的新闻跳过
+
+    Args:
+        matches: [(新闻ID, 相似度)]
+    """
+    news_ids = [news_id for news_id, _ in matches]
+    news_by_id = {news.id: news for news in News.query.filter(News.id.in_(news_ids)).all()} if news_ids else {}
+    tags_by_news = load_news_tags(list(news_by_id))
+    summaries_by_news = load_news_summaries(list(news_by_id))
+
+    news_data = []
+    for news_id, score in matches:
+        news = news_by_id.get(news_id)
+        if news is None:
+            continue
+        content = summaries_by_news.get(news.id) or (news.content[:100] + "..." if len(news.content) > 100 else news.content)
+        news_data.append({
+            "id": news.id,
+            "title": news.title,
+            "content": content,
+            "publish_time": news.ctime.strftime("%Y-%m-%d %H:%M:%S"),
+            "url": news.link,
+            "tag": tags_by_news[news.id],
+            "score": round(score, 4)
+        })
+    return news_data
+
+def _parse_similar_limit():
+    """解析相似新闻数量参数，默认10，最多50"""
+    return max(1, min(int(request.args.get('limit', 10)), 50))
+
+@news_bp.route('/news/similar', methods=['GET'])
+def get_similar_news():
+    """
+    相似新闻：在本地向量索引中查找与指定新闻最相似的新闻
+    - id: 新闻ID
+    - limit: 返回数量，默认10，最多50
+    """
+    try:
+        news_id = int(request.args.get('id', '').strip())
+        limit = _parse_similar_limit()
+    except ValueError:
+        return jsonify({'code': 400, 'msg': '参数 id 或 limit 格式错误'}), 400
+
+    cache_key = f"news:similar:{news_id}:{limit}"
+    cached_result = get_cached_data(cache_key)
+    if cached_result is not None:
+        return jsonify(cached_result)
+
+    try:
+        index = get_news_index()
+        vector = index.vector_of(news_id)
+        if vector is None:
+            return jsonify({'code': 404, 'msg': '新闻不存在或尚未加入向量索引'}), 404
+        matches = index.query(vector, limit, exclude=news_id)
+    except NewsIndexUnavailable as e:
+        logger.warning(f"[news/similar] 向量索引不可用: {e}")
+        return jsonify({'code': 503, 'msg': '向量索引暂不可用'}), 503
+
+    result = {'code': 0, 'msg': 'success', 'data': {'news': _similar_news_data(matches)}}
+    # 索引随新闻抓取每10分钟更新，结果缓存10分钟
+    cache_data(cache_key, result, expire_seconds=600)
+    return jsonify(result)
+
+@news_bp.route('/news/search', methods=['GET'])
+def search_news():
+    """
+    语义搜索：把查询文本转换为嵌入向量后在本地向量索引中检索
+    - q: 查询文本
+    - limit: 返回数量，默认10，最多50
+    """
+    query_text = request.args.get('q', '').strip()
+    if not query_text:
+        return jsonify({'code': 400, 'msg': '缺少必要参数 q'}), 400
+    try:
+        limit = _parse_similar_limit()
+    except ValueError:
+        return jsonify({'code': 400, 'msg': '参数 limit 格式错误'}), 400
+
+    cache_key = f"news:search:{hashlib.sha256(query_text.encode('utf-8')).hexdigest()}:{limit}"
+    cached_result = get_cached_data(cache_key)
+    if cached_result is not None:
+        return jsonify(cached_result)
+
+    try:
+        index = get_news_index()
+        vector = embed_query(query_text)
+        matches = index.query(vector, limit)
+    except NewsIndexUnavailable as e:
+        logger.warning(f"[news/search] 向量索引不可用: {e}")
+        return jsonify({'code': 503, 'msg': '向量索引暂不可用'}), 503
+    except Exception as e:
+        logger.error(f"[news/search] 查询向量生成失败: {e}", exc_info=True)
+        return jsonify({'code': 500, 'msg': '语义搜索服务错误'}), 500
+
+    result = {'code': 0, 'msg': 'success', 'data': {'news': _similar_news_data(matches)}}
+    cache_data(cache_key, result, expire_seconds=300)
+    return jsonify(result)
+
 @news_bp.route('/news/pushnews', methods=['GET'])
 @jwt_required()
 def get_push_news():
@@ -454,118 +552,53 @@ def get_push_news():
             }
         }), 400
 
-    # 解析分页参数
+    # 解析分页参数：优先使用上一页返回的游标(cursor)，没有游标时按页码分页
     try:
         page = max(1, int(request.args.get('page', 1)))
         limit = max(1, min(int(request.args.get('limit', 20)), 100))
     except ValueError:
         return jsonify({"code": 400, "msg": "分页参数格式错误"}), 400
+    cursor = request.args.get('cursor', '').strip() or None
     
     try:
         # 查询用户相关的推送记录
-        from db.models import PushRecord, PushNewsRelation, News, NewsSummary
-        from sqlalchemy import desc, func, and_, text
+        from db.models import PushRecord, PushNewsRelation, News
         
-        # 查询该用户的所有推送消息ID
-        push_messages = db.session.query(PushRecord.msgid, PushRecord.content, PushRecord.push_time)\
+        # 用户收到推送的新闻，只保留6位数字code的新闻；分页、过滤和排序都在数据库中完成
+        push_news_query = db.session.query(News, PushRecord.msgid, PushRecord.content, PushRecord.push_time)\
+            .join(PushNewsRelation, PushNewsRelation.news_id == News.id)\
+            .join(PushRecord, PushRecord.msgid == PushNewsRelation.msgid)\
             .filter(PushRecord.user_id == user_id)\
-            .order_by(desc(PushRecord.push_time))\
-            .all()
-            
-        if not push_messages:
-            logger.debug(f"[news/pushnews] 用户ID={user_id}没有推送记录")
-            return jsonify({
-                "code": 0,
-                "msg": "success",
-                "data": {
-                    "news": [],
-                    "pagination": {
-                        "page": page,
-                        "limit": limit,
-                        "total": 0,
-                        "total_pages": 0,
-                        "has_more": False
-                    }
-                }
-            })
+            .filter(PushRecord.push_time.isnot(None))\
+            .filter(News.code.regexp_match('^[0-9]{6}$'))
         
-        # 创建msgid到content的映射
-        msgid_to_content = {msg.msgid: msg.content for msg in push_messages}
-        msgid_to_pushtime = {msg.msgid: msg.push_time for msg in push_messages}
+        # 按推送时间倒序，(msgid, news_id) 保证排序唯一；旧数据中推送时间为空的记录无法参与游标比较，已在上面排除
+        try:
+            rows, next_cursor = paginate_desc(
+                push_news_query,
+                (PushRecord.push_time, PushNewsRelation.msgid, PushNewsRelation.news_id),
+                limit,
+                cursor=cursor,
+                page=page,
+                cursor_of=lambda row: (row.push_time, row.msgid, row.News.id),
+            )
+        except ValueError as e:
+            logger.debug(f"[news/pushnews] {e}")
+            return jsonify({"code": 400, "msg": "分页游标无效"}), 400
         
-        # 获取这些消息相关的新闻ID
-        news_relations = db.session.query(PushNewsRelation.msgid, PushNewsRelation.news_id)\
-            .filter(PushNewsRelation.msgid.in_([msg.msgid for msg in push_messages]))\
-            .all()
-            
-        if not news_relations:
-            logger.debug(f"[news/pushnews] 没有找到与用户推送记录关联的新闻")
-            return jsonify({
-                "code": 0,
-                "msg": "success",
-                "data": {
-                    "news": [],
-                    "pagination": {
-                        "page": page,
-                        "limit": limit,
-                        "total": 0,
-                        "total_pages": 0,
-                        "has_more": False
-                    }
-                }
-            })
+        # 总数缓存1分钟
+        total_cache_key = f"push:news:{user_id}:total"
+        total = get_cached_data(total_cache_key, use_local=False)
+        if total is None:
+            total = push_news_query.with_entities(func.count()).scalar()
+            cache_data(total_cache_key, total, expire_seconds=60, use_local=False)
         
-        # 创建news_id到msgid的映射
-        news_id_to_msgid = {rel.news_id: rel.msgid for rel in news_relations}
-        
-        # 获取新闻IDs列表
-        news_ids = [rel.news_id for rel in news_relations]
-        
-        # 获取所有相关新闻
-        all_news = db.session.query(News)\
-            .filter(News.id.in_(news_ids))\
-            .all()
-        
-        # 过滤出6位代码的新闻
-        filtered_news = [
-            news for news in all_news 
-            if news.code and len(news.code) == 6 and news.code.isdigit()
-        ]
-        
-        # 创建新闻ID到新闻对象的映射
-        news_id_to_news = {news.id: news for news in filtered_news}
-        
-        # 按照推送时间排序新闻ID，只保留6位数字code的新闻
-        sorted_news_ids = []
-        for rel in sorted(news_relations, key=lambda x: msgid_to_pushtime.get(x.msgid, datetime.min), reverse=True):
-            if rel.news_id in news_id_to_news:
-                sorted_news_ids.append(rel.news_id)
-        
-        logger.debug(f"[news/pushnews] 筛选前新闻数量: {len(all_news)}, 筛选后(6位数字code): {len(sorted_news_ids)}")
-        
-        # 获取总数并分页
-        total = len(sorted_news_ids)
-        paginated_news_ids = sorted_news_ids[(page-1)*limit:page*limit]
-        
-        # 查询这些新闻的摘要
-        news_summaries = db.session.query(NewsSummary)\
-            .filter(NewsSummary.news_id.in_(paginated_news_ids))\
-            .all()
-            
-        # 创建news_id到summary的映射
-        news_id_to_summary = {summary.news_id: summary.summary for summary in news_summaries}
-        
-        # 只保留分页后的新闻项
-        paginated_news_items = [news_id_to_news[news_id] for news_id in paginated_news_ids]
+        # 批量查询这些新闻的摘要
+        news_id_to_summary = load_news_summaries([row.News.id for row in rows])
         
         # 构建新闻数据
         news_data = []
-        for news in paginated_news_items:
-            # 获取对应的msgid和推送内容
-            msgid = news_id_to_msgid.get(news.id)
-            push_content = msgid_to_content.get(msgid, {})
-            push_time = msgid_to_pushtime.get(msgid)
-            
+        for news, msgid, push_content, push_time in rows:
             # 从推送内容中提取标签信息
             tag = {"positive": [], "negative": []}
             try:
@@ -595,12 +628,10 @@ def get_push_news():
                 "tag": tag
             })
         
-        # 新闻已经按推送时间排序，无需再次排序
-        
         # 计算总页数
         total_pages = (total + limit - 1) // limit if limit > 0 else 0
         
-        logger.debug(f"[news/pushnews] 用户ID={user_id} 返回新闻数量: {len(news_data)}, 总数: {total}, page={page}, limit={limit}")
+        logger.debug(f"[news/pushnews] 用户ID={user_id} 返回新闻数量: {len(news_data)}, 总数: {total}, page={page}, cursor={cursor}, limit={limit}")
         
         return jsonify({
             "code": 0,
@@ -612,7 +643,8 @@ def get_push_news():
                     "limit": limit,
                     "total": total,
                     "total_pages": total_pages,
-                    "has_more": page < total_pages
+                    "has_more": next_cursor is not None,
+                    "next_cursor": next_cursor
                 }
             }
         })
@@ -5,6 +5,7 @@ from db.models import db, UserStock, Stocks, HotStock, StockRealtimeQuote, Stock
 from utils.ai_utils import extract_stocks_from_base64
 from datetime import datetime, timedelta
 from utils.redis_cache import redis_cache, get_cached_data, cache_data
+from utils.http_cache import get_or_compute_response
 
 # 创建蓝图
 stock_bp = Blueprint('stock', __name__, url_prefix='/api')
@@ -436,7 +437,7 @@ def search_stocks():
 
 ############################################################
 @stock_bp.route('/stocks/hot', methods=['GET'])
-@redis_cache("stock:hot", expire_seconds=600)  # 缓存10分钟
+@redis_cache("stock:hot", expire_seconds=600, vary_args=("symbol",))  # 缓存10分钟，按榜单区分
 def get_hot_stocks():
     """
     获取热门股票排行榜
@@ -496,6 +497,109 @@ def get_hot_stocks():
 
 
 ############################################################
+def _build_stock_history(clean_code, raw_code):
+    """
+    查询股票近3年历史价格，数据库没有时从 akshare 拉取并写入数据库
+
+    Returns:
+        tuple: (响应数据, HTTP状态码)
+    """
+    # 获取时间范围参数，默认为近3年
+    years = 3
+    end_date = datetime.now().strftime('%Y%m%d')
+    start_date = (datetime.now() - timedelta(days=years * 365)).strftime('%Y%m%d')
+    
+    app.logger.info(f"获取股票 {raw_code} (处理为 {clean_code}) 的历史价格走势，时间范围: {start_date} ~ {end_date}")
+    
+    # 优先从数据库中查询历史数据
+    history_records = StockHistory.query.filter(
+        StockHistory.code == clean_code,
+        StockHistory.date >= datetime.strptime(start_date, '%Y%m%d').date(),
+        StockHistory.date <= datetime.strptime(end_date, '%Y%m%d').date()
+    ).order_by(StockHistory.date.asc()).all()
+
+    if history_records:
+        app.logger.info(f"从数据库中获取到股票 {clean_code} 的历史记录，共 {len(history_records)} 条")
+        history_data = [
+            {
+                'date': record.date.strftime('%Y-%m-%d'),
+                'open_price': record.open_price,
+                'close_price': record.close_price,
+                'high': record.high,
+                'low': record.low,
+                'volume': record.volume,
+                'turnover': record.turnover,
+                'amplitude': record.amplitude,
+                'change_percent': record.change_percent,
+                'change_amount': record.change_amount,
+                'turnover_rate': record.turnover_rate
+            }
+            for record in history_records
+        ]
+    else:
+        app.logger.info(f"数据库中未找到股票 {clean_code} 的历史记录，调用 akshare 接口获取数据")
+        # 调用 akshare 接口获取历史数据
+        stock_history_df = ak.stock_zh_a_hist(
+            symbol=clean_code,
+            period="daily",
+            start_date=start_date,
+            end_date=end_date,
+            adjust="hfq"
+        )
+
+        if stock_history_df is None or stock_history_df.empty:
+            app.logger.warning(f"未获取到股票 {clean_code} 的历史价格数据")
+            return {'code': 404, 'msg': f'未找到股票 {raw_code} 的历史价格数据'}, 404
+
+        # 格式化数据并重命名字段
+        stock_history_df.rename(columns={
+            '日期': 'date',
+            '开盘': 'open_price',
+            '收盘': 'close_price',
+            '最高': 'high',
+            '最低': 'low',
+            '成交量': 'volume',
+            '成交额': 'turnover',
+            '振幅': 'amplitude',
+            '涨跌幅': 'change_percent',
+            '涨跌额': 'change_amount',
+            '换手率': 'turnover_rate'
+        }, inplace=True)
+        stock_history_df['date'] = stock_history_df['date'].astype(str)
+
+        # 移除多余字段（如 '股票代码'）
+        history_data = stock_history_df.drop(columns=['股票代码'], errors='ignore').to_dict(orient='records')
+
+        # 写入数据库
+        for row in history_data:
+            new_record = StockHistory(
+                code=clean_code,
+                date=datetime.strptime(row['date'], '%Y-%m-%d').date(),
+                open_price=row['open_price'],
+                close_price=row['close_price'],
+                high=row['high'],
+                low=row['low'],
+                volume=row['volume'],
+                turnover=row['turnover'],
+                amplitude=row['amplitude'],
+                change_percent=row['change_percent'],
+                change_amount=row['change_amount'],
+                turnover_rate=row['turnover_rate']
+            )
+            db.session.add(new_record)
+        db.session.commit()
+        app.logger.info(f"成功将股票 {clean_code} 的历史数据写入数据库，共 {len(history_data)} 条")
+
+    return {
+        'code': 0,
+        'msg': '获取历史价格数据成功',
+        'data': {
+            'code': raw_code,  # 返回原始代码，保持一致性
+            'history': history_data
+        }
+    }, 200
+
+
 @stock_bp.route('/stocks/history', methods=['GET'])
 def get_stock_history():
     """获取股票历史价格走势"""
@@ -510,119 +614,15 @@ def get_stock_history():
         # 生成缓存键，包含股票代码
         cache_key = f"stock:history:{clean_code}"
         
-        # 先尝试从缓存获取
-        cached_result = get_cached_data(cache_key)
-        if cached_result is not None:
-            app.logger.debug(f"[stocks/history] 缓存命中: {cache_key}")
-            return cached_result
-            
-        # 获取时间范围参数，默认为近3年
-        years = 3
-        end_date = datetime.now().strftime('%Y%m%d')
-        start_date = (datetime.now() - timedelta(days=years * 365)).strftime('%Y%m%d')
-        
-        app.logger.info(f"获取股票 {raw_code} (处理为 {clean_code}) 的历史价格走势，时间范围: {start_date} ~ {end_date}")
-        
-        # 优先从数据库中查询历史数据
-        history_records = StockHistory.query.filter(
-            StockHistory.code == clean_code,
-            StockHistory.date >= datetime.strptime(start_date, '%Y%m%d').date(),
-            StockHistory.date <= datetime.strptime(end_date, '%Y%m%d').date()
-        ).order_by(StockHistory.date.asc()).all()
-
-        if history_records:
-            app.logger.info(f"从数据库中获取到股票 {clean_code} 的历史记录，共 {len(history_records)} 条")
-            history_data = [
-                {
-                    'date': record.date.strftime('%Y-%m-%d'),
-                    'open_price': record.open_price,
-                    'close_price': record.close_price,
-                    'high': record.high,
-                    'low': record.low,
-                    'volume': record.volume,
-                    'turnover': record.turnover,
-                    'amplitude': record.amplitude,
-                    'change_percent': record.change_percent,
-                    'change_amount': record.change_amount,
-                    'turnover_rate': record.turnover_rate
-                }
-                for record in history_records
-            ]
-        else:
-            app.logger.info(f"数据库中未找到股票 {clean_code} 的历史记录，调用 akshare 接口获取数据")
-            # 调用 akshare 接口获取历史数据
-            stock_history_df = ak.stock_zh_a_hist(
-                symbol=clean_code,
-                period="daily",
-                start_date=start_date,
-                end_date=end_date,
-                adjust="hfq"
-            )
-
-            if stock_history_df is None or stock_history_df.empty:
-                app.logger.warning(f"未获取到股票 {clean_code} 的历史价格数据")
-                return jsonify({'code': 404, 'msg': f'未找到股票 {raw_code} 的历史价格数据'}), 404
-
-            # 格式化数据并重命名字段
-            stock_history_df.rename(columns={
-                '日期': 'date',
-                '开盘': 'open_price',
-                '收盘': 'close_price',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'volume',
-                '成交额': 'turnover',
-                '振幅': 'amplitude',
-                '涨跌幅': 'change_percent',
-                '涨跌额': 'change_amount',
-                '换手率': 'turnover_rate'
-            }, inplace=True)
-            stock_history_df['date'] = stock_history_df['date'].astype(str)
-
-            # 移除多余字段（如 '股票代码'）
-            history_data = stock_history_df.drop(columns=['股票代码'], errors='ignore').to_dict(orient='records')
-
-            # 写入数据库
-            for row in history_data:
-                new_record = StockHistory(
-                    code=clean_code,
-                    date=datetime.strptime(row['date'], '%Y-%m-%d').date(),
-                    open_price=row['open_price'],
-                    close_price=row['close_price'],
-                    high=row['high'],
-                    low=row['low'],
-                    volume=row['volume'],
-                    turnover=row['turnover'],
-                    amplitude=row['amplitude'],
-                    change_percent=row['change_percent'],
-                    change_amount=row['change_amount'],
-                    turnover_rate=row['turnover_rate']
-                )
-                db.session.add(new_record)
-            db.session.commit()
-            app.logger.info(f"成功将股票 {clean_code} 的历史数据写入数据库，共 {len(history_data)} 条")
-
-        # 构建返回结果
-        result = jsonify({
-            'code': 0,
-            'msg': '获取历史价格数据成功',
-            'data': {
-                'code': raw_code,  # 返回原始代码，保持一致性
-                'history': history_data
-            }
-        })
-        
-        # 缓存结果，设置12小时过期时间 (43200秒)
-        try:
-            cache_success = cache_data(cache_key, result.get_json(), expire_seconds=43200)
-            if cache_success:
-                app.logger.debug(f"[stocks/history] 结果已缓存: {cache_key}")
-            else:
-                app.logger.warning(f"[stocks/history] 结果缓存失败: {cache_key}")
-        except Exception as e:
-            app.logger.error(f"[stocks/history] 缓存操作异常: {e}")
-        
-        return result
+        # 缓存12小时(43200秒)，过期后1小时内返回旧数据并由单个worker后台刷新
+        return get_or_compute_response(
+            cache_key,
+            lambda: _build_stock_history(clean_code, raw_code),
+            expire_seconds=43200,
+            stale_seconds=3600,
+            lock_seconds=120,
+            wait_seconds=30,
+        )
             
     except Exception as e:
         db.session.rollback()
@@ -632,6 +632,131 @@ def get_stock_history():
 
 
 ############################################################
+def _build_stock_detail(clean_code, raw_code):
+    """
+    组装股票详细信息，交易时间内实时数据过期时从雪球刷新
+
+    Returns:
+        tuple: (响应数据, HTTP状态码)
+    """
+    app.logger.info(f"获取股票 {clean_code} 的详细信息")
+
+    # 从 StockInfo 表获取基本信息
+    stock_info = StockInfo.query.filter_by(code=clean_code).first()
+    if not stock_info:
+        app.logger.warning(f"未找到股票 {clean_code} 的基本信息")
+        return {'code': 404, 'msg': f'未找到股票 {clean_code} 的基本信息'}, 404
+
+    # 从 StockRealtimeQuote 表获取实时交易数据
+    stock_quote = StockRealtimeQuote.query.filter_by(code=clean_code).first()
+    if not stock_quote:
+        app.logger.warning(f"未找到股票 {clean_code} 的实时交易数据")
+        return {'code': 404, 'msg': f'未找到股票 {clean_code} 的实时交易数据'}, 404
+    
+    # 从 Stocks 表获取股票名称和市场代码
+    stock_record = Stocks.query.filter_by(code=clean_code).first()
+    if not stock_record:
+        app.logger.warning(f"未找到股票 {clean_code} 的基础记录")
+        return {'code': 404, 'msg': f'未找到股票 {clean_code} 的基础记录'}, 404
+    
+    # 检查数据是否过期(超过4分钟)且当前在交易时间内(9:30-16:30)
+    now = datetime.now()
+    data_age = now - stock_quote.updated_at
+    
+    # 计算当前时间分钟表示以便比较
+    current_hour = now.hour
+    current_minute = now.minute
+    current_time_minutes = current_hour * 60 + current_minute
+    trading_start_minutes = 9 * 60 + 30  # 9:30 转换为分钟数
+    trading_end_minutes = 16 * 60 + 30   # 16:30 转换为分钟数
+    
+    # 判断是否在交易时间内
+    is_trading_hours = (trading_start_minutes <= current_time_minutes <= trading_end_minutes)
+    
+    # 只有在交易时间内且数据过期时才更新
+    if data_age.total_seconds() > 240 and is_trading_hours:  # 4分钟 = 240秒，且在交易时间内
+        app.logger.info(f"股票 {clean_code} 的实时数据已过期，当前在交易时间内，最后更新时间: {stock_quote.updated_at}，获取最新数据")
+        
+        # 获取股票记录
+        stock_record = Stocks.query.filter_by(code=clean_code).first()
+        
+        # 只有当market字段有值时才尝试调用API
+        if stock_record and stock_record.market:
+            try:
+                # 直接使用数据库中的市场前缀并转为大写
+                market_prefix = stock_record.market.upper()
+                xq_symbol = f"{market_prefix}{clean_code}"
+                
+                # 调用雪球API获取最新数据
+                app.logger.debug(f"调用 akshare 接口获取股票 {xq_symbol} 的最新数据")
+                stock_data_df = ak.stock_individual_spot_xq(symbol=xq_symbol)
+                
+                if stock_data_df is not None and not stock_data_df.empty:
+                    # 将DataFrame转换为字典，方便访问数据
+                    stock_data = dict(zip(stock_data_df['item'], stock_data_df['value']))
+                    
+                    # 更新股票实时数据
+                    stock_quote.latest_price = float(stock_data.get('现价', stock_quote.latest_price))
+                    stock_quote.change_percent = float(stock_data.get('涨幅', stock_quote.change_percent))
+                    stock_quote.change_amount = float(stock_data.get('涨跌', stock_quote.change_amount))
+                    stock_quote.volume = float(stock_data.get('成交量', stock_quote.volume))
+                    stock_quote.turnover = float(stock_data.get('成交额', stock_quote.turnover))
+                    stock_quote.amplitude = float(stock_data.get('振幅', stock_quote.amplitude))
+                    stock_quote.high = float(stock_data.get('最高', stock_quote.high))
+                    stock_quote.low = float(stock_data.get('最低', stock_quote.low))
+                    stock_quote.open_price = float(stock_data.get('今开', stock_quote.open_price))
+                    stock_quote.previous_close = float(stock_data.get('昨收', stock_quote.previous_close))
+                    stock_quote.turnover_rate = float(stock_data.get('周转率', stock_quote.turnover_rate))
+                    stock_quote.pe_ratio_dynamic = float(stock_data.get('市盈率(动)', stock_quote.pe_ratio_dynamic))
+                    stock_quote.pb_ratio = float(stock_data.get('市净率', stock_quote.pb_ratio))
+                    stock_quote.total_market_value = float(stock_data.get('流通值', stock_quote.total_market_value))
+                    stock_quote.change_ytd = float(stock_data.get('今年以来涨幅', stock_quote.change_ytd))
+                    stock_quote.updated_at = now
+                    
+                    # 保存更新到数据库
+                    db.session.commit()
+                    app.logger.info(f"成功从雪球更新了股票 {clean_code} 的实时数据")
+                else:
+                    app.logger.warning(f"从雪球获取股票 {xq_symbol} 实时数据失败，使用数据库中的数据")
+            except Exception as api_e:
+                app.logger.error(f"调用雪球API失败: {str(api_e)}")
+                app.logger.exception(api_e)
+                # 出错时回滚，继续使用数据库中的数据
+                db.session.rollback()
+        else:
+            app.logger.warning(f"股票 {clean_code} 缺少市场信息，无法调用雪球API，使用数据库中的过期数据")
+
+    # 构建返回数据
+    detail = {
+        'code': raw_code,  # 返回原始代码，保持一致性
+        'name': stock_record.name,
+        'market': stock_record.market.upper(),  # 添加市场代码
+        'industry': stock_info.industry,
+        'listing_date': stock_info.listing_date.strftime('%Y-%m-%d') if stock_info.listing_date else None,
+        'total_shares': stock_info.total_shares,
+        'circulating_shares': stock_info.circulating_shares,
+        'trading': {
+            'current_price': stock_quote.latest_price,
+            'change_percent': stock_quote.change_percent,
+            'open': stock_quote.open_price,
+            'high': stock_quote.high,
+            'low': stock_quote.low,
+            'volume': stock_quote.volume,
+            'turnover': stock_quote.turnover,
+            'market_cap': stock_quote.total_market_value,
+            'change_5min': stock_quote.change_5min,
+            'last_updated': stock_quote.updated_at.strftime('%Y-%m-%d %H:%M:%S')  # 添加最后更新时间
+        }
+    }
+
+    app.logger.info(f"成功获取股票 {clean_code} 的详细信息")
+    return {
+        'code': 0,
+        'msg': '获取股票详细信息成功',
+        'data': detail
+    }, 200
+
+
 @stock_bp.route('/stocks/detail', methods=['GET'])
 def get_stock_detail():
     """获取股票详细信息，包括行业、地区、交易数据等"""
@@ -647,142 +772,14 @@ def get_stock_detail():
         # 生成缓存键，包含股票代码
         cache_key = f"stock:detail:{clean_code}"
         
-        # 先尝试从缓存获取
-        cached_result = get_cached_data(cache_key)
-        if cached_result is not None:
-            app.logger.debug(f"[stocks/detail] 缓存命中: {cache_key}")
-            return cached_result
-
-        app.logger.info(f"获取股票 {clean_code} 的详细信息")
-
-        # 从 StockInfo 表获取基本信息
-        stock_info = StockInfo.query.filter_by(code=clean_code).first()
-        if not stock_info:
-            app.logger.warning(f"未找到股票 {clean_code} 的基本信息")
-            return jsonify({'code': 404, 'msg': f'未找到股票 {clean_code} 的基本信息'}), 404
-
-        # 从 StockRealtimeQuote 表获取实时交易数据
-        stock_quote = StockRealtimeQuote.query.filter_by(code=clean_code).first()
-        if not stock_quote:
-            app.logger.warning(f"未找到股票 {clean_code} 的实时交易数据")
-            return jsonify({'code': 404, 'msg': f'未找到股票 {clean_code} 的实时交易数据'}), 404
-        
-        # 从 Stocks 表获取股票名称和市场代码
-        stock_record = Stocks.query.filter_by(code=clean_code).first()
-        if not stock_record:
-            app.logger.warning(f"未找到股票 {clean_code} 的基础记录")
-            return jsonify({'code': 404, 'msg': f'未找到股票 {clean_code} 的基础记录'}), 404
-        
-        # 检查数据是否过期(超过4分钟)且当前在交易时间内(9:30-16:30)
-        now = datetime.now()
-        data_age = now - stock_quote.updated_at
-        
-        # 计算当前时间分钟表示以便比较
-        current_hour = now.hour
-        current_minute = now.minute
-        current_time_minutes = current_hour * 60 + current_minute
-        trading_start_minutes = 9 * 60 + 30  # 9:30 转换为分钟数
-        trading_end_minutes = 16 * 60 + 30   # 16:30 转换为分钟数
-        
-        # 判断是否在交易时间内
-        is_trading_hours = (trading_start_minutes <= current_time_minutes <= trading_end_minutes)
-        
-        # 只有在交易时间内且数据过期时才更新
-        if data_age.total_seconds() > 240 and is_trading_hours:  # 4分钟 = 240秒，且在交易时间内
-            app.logger.info(f"股票 {clean_code} 的实时数据已过期，当前在交易时间内，最后更新时间: {stock_quote.updated_at}，获取最新数据")
-            
-            # 获取股票记录
-            stock_record = Stocks.query.filter_by(code=clean_code).first()
-            
-            # 只有当market字段有值时才尝试调用API
-            if stock_record and stock_record.market:
-                try:
-                    # 直接使用数据库中的市场前缀并转为大写
-                    market_prefix = stock_record.market.upper()
-                    xq_symbol = f"{market_prefix}{clean_code}"
-                    
-                    # 调用雪球API获取最新数据
-                    app.logger.debug(f"调用 akshare 接口获取股票 {xq_symbol} 的最新数据")
-                    stock_data_df = ak.stock_individual_spot_xq(symbol=xq_symbol)
-                    
-                    if stock_data_df is not None and not stock_data_df.empty:
-                        # 将DataFrame转换为字典，方便访问数据
-                        stock_data = dict(zip(stock_data_df['item'], stock_data_df['value']))
-                        
-                        # 更新股票实时数据
-                        stock_quote.latest_price = float(stock_data.get('现价', stock_quote.latest_price))
-                        stock_quote.change_percent = float(stock_data.get('涨幅', stock_quote.change_percent))
-                        stock_quote.change_amount = float(stock_data.get('涨跌', stock_quote.change_amount))
-                        stock_quote.volume = float(stock_data.get('成交量', stock_quote.volume))
-                        stock_quote.turnover = float(stock_data.get('成交额', stock_quote.turnover))
-                        stock_quote.amplitude = float(stock_data.get('振幅', stock_quote.amplitude))
-                        stock_quote.high = float(stock_data.get('最高', stock_quote.high))
-                        stock_quote.low = float(stock_data.get('最低', stock_quote.low))
-                        stock_quote.open_price = float(stock_data.get('今开', stock_quote.open_price))
-                        stock_quote.previous_close = float(stock_data.get('昨收', stock_quote.previous_close))
-                        stock_quote.turnover_rate = float(stock_data.get('周转率', stock_quote.turnover_rate))
-                        stock_quote.pe_ratio_dynamic = float(stock_data.get('市盈率(动)', stock_quote.pe_ratio_dynamic))
-                        stock_quote.pb_ratio = float(stock_data.get('市净率', stock_quote.pb_ratio))
-                        stock_quote.total_market_value = float(stock_data.get('流通值', stock_quote.total_market_value))
-                        stock_quote.change_ytd = float(stock_data.get('今年以来涨幅', stock_quote.change_ytd))
-                        stock_quote.updated_at = now
-                        
-                        # 保存更新到数据库
-                        db.session.commit()
-                        app.logger.info(f"成功从雪球更新了股票 {clean_code} 的实时数据")
-                    else:
-                        app.logger.warning(f"从雪球获取股票 {xq_symbol} 实时数据失败，使用数据库中的数据")
-                except Exception as api_e:
-                    app.logger.error(f"调用雪球API失败: {str(api_e)}")
-                    app.logger.exception(api_e)
-                    # 出错时回滚，继续使用数据库中的数据
-                    db.session.rollback()
-            else:
-                app.logger.warning(f"股票 {clean_code} 缺少市场信息，无法调用雪球API，使用数据库中的过期数据")
-
-        # 构建返回数据
-        detail = {
-            'code': raw_code,  # 返回原始代码，保持一致性
-            'name': stock_record.name,
-            'market': stock_record.market.upper(),  # 添加市场代码
-            'industry': stock_info.industry,
-            'listing_date': stock_info.listing_date.strftime('%Y-%m-%d') if stock_info.listing_date else None,
-            'total_shares': stock_info.total_shares,
-            'circulating_shares': stock_info.circulating_shares,
-            'trading': {
-                'current_price': stock_quote.latest_price,
-                'change_percent': stock_quote.change_percent,
-                'open': stock_quote.open_price,
-                'high': stock_quote.high,
-                'low': stock_quote.low,
-                'volume': stock_quote.volume,
-                'turnover': stock_quote.turnover,
-                'market_cap': stock_quote.total_market_value,
-                'change_5min': stock_quote.change_5min,
-                'last_updated': stock_quote.updated_at.strftime('%Y-%m-%d %H:%M:%S')  # 添加最后更新时间
-            }
-        }
-
-        app.logger.info(f"成功获取股票 {clean_code} 的详细信息")
-        
-        # 构建返回结果
-        result = jsonify({
-            'code': 0,
-            'msg': '获取股票详细信息成功',
-            'data': detail
-        })
-        
-        # 缓存结果，设置1小时过期时间 (3600秒)
-        try:
-            cache_success = cache_data(cache_key, result.get_json(), expire_seconds=3600)
-            if cache_success:
-                app.logger.debug(f"[stocks/detail] 结果已缓存: {cache_key}")
-            else:
-                app.logger.warning(f"[stocks/detail] 结果缓存失败: {cache_key}")
-        except Exception as e:
-            app.logger.error(f"[stocks/detail] 缓存操作异常: {e}")
-        
-        return result
+        # 缓存1小时(3600秒)，过期后的宽限期内返回旧数据并由单个worker后台刷新
+        return get_or_compute_response(
+            cache_key,
+            lambda: _build_stock_detail(clean_code, raw_code),
+            expire_seconds=3600,
+            stale_seconds=300,
+            lock_seconds=30,
+        )
 
     except Exception as e:
         app.logger.error(f"获取股票详情异常: {str(e)}")
@@ -1,15 +1,26 @@
 from flask import Blueprint, request, jsonify, current_app as app
 import logging
+import os
 from datetime import datetime, timedelta
-from db.models import db, News, Tag, NewsTagRelation, StockTagRelation, NewsSummary
+from db.models import db, News, Tag, NewsTagRelation, StockTagRelation, NewsSummary, Stocks, StockInfo, StockRealtimeQuote
 from sqlalchemy import func, select
 from utils.ai_utils import get_tag_leaders as fetch_tag_leaders
+from utils.llm_client import max_call_seconds
 from utils.redis_cache import redis_cache
+from utils.news_utils import load_news_tags, load_news_summaries
+from utils.job_queue import enqueue_job, get_job, job_view, JobQueueUnavailable
 
 tags_bp = Blueprint('tags', __name__, url_prefix='/api/tags')
 logger = logging.getLogger('app')
 
+# 标签龙头股发现任务队列，由 eva_worker.py 进程消费
+TAG_LEADERS_QUEUE = "tag_leaders"
+# 龙头股发现任务的最长执行时间(秒)：两次大模型调用按最大重试次数与退避时间估算，
+# 另留10分钟给网页搜索与抓取、等待并发名额和限流冷却
+TAG_LEADERS_JOB_TIMEOUT_SECONDS = int(os.getenv("TAG_LEADERS_JOB_TIMEOUT_SECONDS", 2 * max_call_seconds() + 600))
+
 @tags_bp.route('/', methods=['GET'])
+@redis_cache("tags:all", expire_seconds=300)  # 缓存5分钟
 def get_all_tags():
     """获取所有使用过的标签列表，分利好和利空两类"""
     try:
@@ -64,21 +75,13 @@ def get_tagged_news():
             .filter(News.ctime >= start_date)\
             .order_by(News.ctime.desc()).all()
         
+        # 所有新闻的标签一次查询批量获取
+        tags_by_news = load_news_tags([news.id for news in news_with_tag])
+        
         result = []
         for news in news_with_tag:
             # 获取新闻关联的所有标签
-            positive_tags_query = db.session.query(Tag.name)\
-                .join(NewsTagRelation, Tag.id == NewsTagRelation.tag_id)\
-                .filter(NewsTagRelation.news_id == news.id)\
-                .filter(Tag.tag_type == 1).all()
-            
-            negative_tags_query = db.session.query(Tag.name)\
-                .join(NewsTagRelation, Tag.id == NewsTagRelation.tag_id)\
-                .filter(NewsTagRelation.news_id == news.id)\
-                .filter(Tag.tag_type == 0).all()
-            
-            positive_tags = [tag[0] for tag in positive_tags_query]
-            negative_tags = [tag[0] for tag in negative_tags_query]
+            news_tags = tags_by_news[news.id]
             
             result.append({
                 "id": news.id,
@@ -87,8 +90,8 @@ def get_tagged_news():
                 "code": news.code,
                 "link": news.link,
                 "publish_time": news.ctime.strftime("%Y-%m-%d %H:%M:%S"),
-                "positive_tags": positive_tags,
-                "negative_tags": negative_tags,
+                "positive_tags": news_tags["positive"],
+                "negative_tags": news_tags["negative"],
                 "is_important": news.is_important == 1
             })
         
@@ -116,27 +119,18 @@ def get_important_news():
             .filter(News.ctime >= start_date)\
             .order_by(News.ctime.desc()).all()
         
+        # 所有新闻的标签和摘要各用一次查询批量获取
+        news_ids = [news.id for news in important_news]
+        tags_by_news = load_news_tags(news_ids)
+        summaries_by_news = load_news_summaries(news_ids)
+        
         result = []
         for news in important_news:
             # 获取新闻关联的所有标签
-            positive_tags_query = db.session.query(Tag.name)\
-                .join(NewsTagRelation, Tag.id == NewsTagRelation.tag_id)\
-                .filter(NewsTagRelation.news_id == news.id)\
-                .filter(Tag.tag_type == 1).all()
-            
-            negative_tags_query = db.session.query(Tag.name)\
-                .join(NewsTagRelation, Tag.id == NewsTagRelation.tag_id)\
-                .filter(NewsTagRelation.news_id == news.id)\
-                .filter(Tag.tag_type == 0).all()
-            
-            positive_tags = [tag[0] for tag in positive_tags_query]
-            negative_tags = [tag[0] for tag in negative_tags_query]
+            news_tags = tags_by_news[news.id]
             
             # 获取新闻摘要
-            summary = ""
-            summary_obj = db.session.query(NewsSummary).filter_by(news_id=news.id).first()
-            if summary_obj and summary_obj.summary:
-                summary = summary_obj.summary
+            summary = summaries_by_news.get(news.id) or ""
             
             result.append({
                 "id": news.id,
@@ -145,8 +139,8 @@ def get_important_news():
                 "code": news.code,
                 "link": news.link,
                 "publish_time": news.ctime.strftime("%Y-%m-%d %H:%M:%S"),
-                "positive_tags": positive_tags,
-                "negative_tags": negative_tags,
+                "positive_tags": news_tags["positive"],
+                "negative_tags": news_tags["negative"],
                 "summary": summary
             })
         
@@ -220,184 +214,162 @@ def get_tags_stats():
         logger.error(f"获取标签统计失败: {e}", exc_info=True)
         return jsonify({"code": 500, "msg": f"获取标签统计失败: {str(e)}"}), 500
 
+def _load_tag_leaders(tag):
+    """从 stock_tag_relations 读取标签的关联股票，附带行业与最新行情"""
+    rows = db.session.query(
+        Stocks.code,
+        Stocks.name,
+        Stocks.market,
+        StockInfo.industry,
+        StockRealtimeQuote.latest_price,
+        StockRealtimeQuote.change_percent,
+        StockTagRelation.reason
+    ).join(
+        StockTagRelation, Stocks.code == StockTagRelation.code
+    ).join(
+        StockInfo, Stocks.code == StockInfo.code, isouter=True
+    ).join(
+        StockRealtimeQuote, Stocks.code == StockRealtimeQuote.code, isouter=True
+    ).filter(
+        StockTagRelation.tag_id == tag.id
+    ).all()
+    return [{
+        'code': stock.code,
+        'name': stock.name,
+        'market': stock.market,
+        'industry': stock.industry,
+        'latest_price': stock.latest_price,
+        'change_percent': stock.change_percent,
+        'reason': stock.reason or f"与{tag.name}主题相关的股票"
+    } for stock in rows]
+
+
+def submit_tag_leaders_job(tag):
+    """
+    提交标签龙头股发现任务，同一标签已有未完成的任务时返回该任务
+
+    Returns:
+        dict: 任务句柄 {id, status, status_url}
+
+    Raises:
+        JobQueueUnavailable: Redis不可用
+    """
+    job_id, created = enqueue_job(TAG_LEADERS_QUEUE, {"tag_id": tag.id}, dedup_key=str(tag.id),
+                                  timeout=TAG_LEADERS_JOB_TIMEOUT_SECONDS)
+    if created:
+        logger.info(f"已提交标签 '{tag.name}' 的龙头股发现任务: {job_id}")
+        status = "pending"
+    else:
+        job = get_job(job_id)
+        status = job["status"] if job else "pending"
+    return {"id": job_id, "status": status, "status_url": f"/api/tags/leaders/jobs/{job_id}"}
+
+
+def run_tag_leaders_job(args):
+    """
+    标签龙头股发现任务处理函数（在 eva_worker.py 进程的应用上下文中执行）
+
+    搜索网页并由大模型提取龙头股，按名称匹配股票代码后替换该标签在 stock_tag_relations 中的关联；
+    没有匹配到任何股票时保留原有关联
+
+    Args:
+        args: {"tag_id": 标签ID}
+
+    Returns:
+        dict: {"tag": 标签名, "count": 写入的关联数}
+
+    Raises:
+        RuntimeError: 标签不存在或搜索失败
+    """
+    tag = db.session.get(Tag, args["tag_id"])
+    if tag is None:
+        raise RuntimeError(f"标签 {args['tag_id']} 不存在")
+
+    result = fetch_tag_leaders(tag.name)
+    if result.get("error"):
+        raise RuntimeError(result["error"])
+
+    leaders = [leader for leader in result.get('leaders', []) if leader.get('name')]
+    code_by_name = {}
+    if leaders:
+        valid_stocks = db.session.query(Stocks.code, Stocks.name).filter(
+            Stocks.name.in_([leader['name'] for leader in leaders]),
+            func.length(Stocks.code) == 6  # 确保股票代码是6位
+        ).all()
+        code_by_name = {stock.name: stock.code for stock in valid_stocks}
+
+    reasons = {}
+    for leader in leaders:
+        code = code_by_name.get(leader['name'])
+        if code and code not in reasons:
+            reasons[code] = leader.get('reason', '')
+
+    if not reasons:
+        logger.warning(f"未找到标签 '{tag.name}' 的有效龙头股票，保留原有关联")
+        return {"tag": tag.name, "count": 0}
+
+    try:
+        db.session.query(StockTagRelation).filter_by(tag_id=tag.id).delete()
+        now = datetime.now()
+        db.session.add_all([
+            StockTagRelation(code=code, tag_id=tag.id, created_at=now, reason=reason)
+            for code, reason in reasons.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info(f"标签 '{tag.name}' 的龙头股票已更新，数量: {len(reasons)}")
+    return {"tag": tag.name, "count": len(reasons)}
+
+
 @tags_bp.route('/leaders', methods=['GET'])
-# @redis_cache("tags:leaders", expire_seconds=3600)
 def get_tag_leaders():
-    """根据标签获取相关龙头股票"""
+    """
+    根据标签获取相关龙头股票
+
+    接口只读取数据库；数据库中没有关联股票或 refresh=true 时提交后台发现任务（eva_worker.py 执行），
+    结果写入 stock_tag_relations：
+    - 已有关联股票：直接返回，提交了任务时在 data.job 中附带任务句柄
+    - 没有任何关联股票：返回 HTTP 202，leaders 为空，data.job 为任务句柄
+    - 可通过 /api/tags/leaders/jobs/<job_id> 查询任务状态，完成后重新请求本接口
+    """
     tag_name = request.args.get('tag')
-    refresh = request.args.get('refresh', 'false').lower() == 'true'  # 添加强制刷新参数
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
     
     if not tag_name:
         return jsonify({"code": 400, "msg": "请提供标签参数"}), 400
     
     try:
-        logger.info(f"开始处理标签 '{tag_name}' 的龙头股票查询，强制刷新: {refresh}")
-        
-        # 先查找标签是否存在
         tag = db.session.query(Tag).filter_by(name=tag_name).first()
-        
-        # 如果标签不存在，返回错误
         if not tag:
             logger.warning(f"标签 '{tag_name}' 在数据库中不存在")
             return jsonify({"code": 404, "msg": f"标签 '{tag_name}' 不存在"}), 404
-        
-        verified_leaders = []
-        description = ""
-        
-        # 先查询数据库中的关联股票，无论是否强制刷新
-        from db.models import Stocks, StockInfo, StockRealtimeQuote, StockTagRelation
-        
-        db_leaders = db.session.query(
-            Stocks.code, 
-            Stocks.name, 
-            Stocks.market,
-            StockInfo.industry,
-            StockRealtimeQuote.latest_price,
-            StockRealtimeQuote.change_percent,
-            StockTagRelation.reason  # 添加 reason 字段到查询
-        ).join(
-            StockTagRelation, Stocks.code == StockTagRelation.code
-        ).join(
-            StockInfo, Stocks.code == StockInfo.code, isouter=True
-        ).join(
-            StockRealtimeQuote, Stocks.code == StockRealtimeQuote.code, isouter=True
-        ).filter(
-            StockTagRelation.tag_id == tag.id
-        ).all()
-        
-        # 只有当不是强制刷新且数据库中有足够的关联股票时，才直接返回数据库数据
-        if not refresh and len(db_leaders) >= 1:
-            logger.info(f"从数据库中找到标签 '{tag_name}' 的 {len(db_leaders)} 只关联股票")
-            
-            for stock in db_leaders:
-                verified_leaders.append({
-                    'code': stock.code,
-                    'name': stock.name,
-                    'market': stock.market,
-                    'industry': stock.industry,
-                    'latest_price': stock.latest_price,
-                    'change_percent': stock.change_percent,
-                    'reason': stock.reason or f"与{tag_name}主题相关的股票"  # 使用数据库中的reason，如果为空则使用默认值
-                })
-            
-            return jsonify({
-                "code": 0,
-                "msg": "success",
-                "data": {
-                    "leaders": verified_leaders,
-                    "description": f"{tag_name}概念股票"
-                }
-            })
-        
-        # 以下情况会调用API：1.强制刷新 2.数据库中没有足够信息
-        if refresh:
-            logger.info(f"强制刷新模式：将调用API获取最新的龙头股票数据")
-        else:
-            logger.info(f"数据库中关联股票不足，将调用API获取数据")
-            
-        # 调用AI工具获取股票
-        logger.debug(f"准备调用 fetch_tag_leaders 函数获取标签 '{tag_name}' 的龙头股票")
-        result = fetch_tag_leaders(tag_name)
-        logger.info(f"成功获取标签 '{tag_name}' 的龙头股票，找到 {len(result.get('leaders', []))} 只股票")
-        description = result.get("description", "")
-        
-        # 提取所有股票名称，用于查询股票代码
-        stock_names = []
-        for item in result.get('leaders', []):
-            if 'name' in item:
-                stock_names.append(item['name'])
-        
-        logger.debug(f"需要查询的股票名称: {stock_names}")
-        
-        if not stock_names:
-            logger.warning(f"未找到标签 '{tag_name}' 的有效龙头股票名称")
-            return jsonify({
-                "code": 0,
-                "msg": "success",
-                "data": {"leaders": [], "description": description}
-            })
-            
-        # 使用股票名称查询数据库获取股票代码和其他信息
-        from db.models import Stocks, StockInfo, StockRealtimeQuote
-        from sqlalchemy import func  # 添加这行导入func
-        
-        valid_stocks = db.session.query(
-            Stocks.code, 
-            Stocks.name, 
-            Stocks.market,
-            StockInfo.industry,
-            StockRealtimeQuote.latest_price,
-            StockRealtimeQuote.change_percent
-        ).join(
-            StockInfo, Stocks.code == StockInfo.code, isouter=True
-        ).join(
-            StockRealtimeQuote, Stocks.code == StockRealtimeQuote.code, isouter=True
-        ).filter(
-            Stocks.name.in_(stock_names),
-            func.length(Stocks.code) == 6  # 确保股票代码是6位
-        ).all()
-        
-        logger.debug(f"数据库中找到 {len(valid_stocks)} 只有效股票")
-        
-        # 创建名称到信息的映射（使用名称作为键）
-        stock_info_map = {stock.name: stock for stock in valid_stocks}
-        
-        # 如果强制刷新，先删除旧的关系
-        if refresh:
-            logger.info(f"强制刷新模式，删除标签 '{tag_name}' 的现有关联关系")
-            db.session.query(StockTagRelation).filter_by(tag_id=tag.id).delete()
-        
-        # 更新结果并保存到数据库
-        for leader in result.get('leaders', []):
-            stock_name = leader.get('name', '')
-            
-            if stock_name in stock_info_map:
-                stock_info = stock_info_map[stock_name]
-                code = stock_info.code
-                verified_leader = {
-                    'code': code,
-                    'name': stock_name,
-                    'market': stock_info.market,
-                    'industry': stock_info.industry,
-                    'latest_price': stock_info.latest_price,
-                    'change_percent': stock_info.change_percent,
-                    'reason': leader.get('reason', '')
-                }
-                verified_leaders.append(verified_leader)
-                
-                # 将股票与标签的关系保存到数据库
-                # 检查该关系是否已存在
-                relation = db.session.query(StockTagRelation).filter_by(
-                    code=code, tag_id=tag.id
-                ).first()
-                
-                if not relation:
-                    relation = StockTagRelation(
-                        code=code,
-                        tag_id=tag.id,
-                        created_at=datetime.now(),
-                        reason=leader.get('reason', '')
-                    )
-                    db.session.add(relation)
-                    logger.debug(f"添加标签 '{tag_name}' 与股票 {code} 的关联关系")
-                elif refresh:  # 如果是强制刷新模式，则更新原因
-                    relation.reason = leader.get('reason', '')
-                    logger.debug(f"更新标签 '{tag_name}' 与股票 {code} 的关联原因")
-        
-        # 提交所有数据库变更
-        db.session.commit()
-        logger.info(f"成功验证标签 '{tag_name}' 的龙头股票，最终数量: {len(verified_leaders)}，已保存到数据库")
-        
-        return jsonify({
-            "code": 0,
-            "msg": "success",
-            "data": {
-                "leaders": verified_leaders,
-                "description": description
-            }
-        })
+
+        leaders = _load_tag_leaders(tag)
+        data = {"leaders": leaders, "description": f"{tag_name}概念股票"}
+        if leaders and not refresh:
+            return jsonify({"code": 0, "msg": "success", "data": data})
+
+        try:
+            data["job"] = submit_tag_leaders_job(tag)
+        except JobQueueUnavailable as e:
+            logger.warning(f"任务队列不可用，无法刷新标签 '{tag_name}' 的龙头股票: {e}")
+            return jsonify({"code": 0, "msg": "success", "data": data})
+
+        return jsonify({"code": 0, "msg": "success", "data": data}), 200 if leaders else 202
     except Exception as e:
-        db.session.rollback()
         logger.error(f"获取标签龙头股票失败: {e}", exc_info=True)
         return jsonify({"code": 500, "msg": f"获取标签龙头股票失败: {str(e)}"}), 500
 
+
+@tags_bp.route('/leaders/jobs/<job_id>', methods=['GET'])
+def get_tag_leaders_job(job_id):
+    """查询标签龙头股发现任务状态"""
+    try:
+        job = get_job(job_id)
+    except JobQueueUnavailable:
+        return jsonify({"code": 503, "msg": "任务队列暂不可用"}), 503
+    if job is None or job.get("queue") != TAG_LEADERS_QUEUE:
+        return jsonify({"code": 404, "msg": "任务不存在或已过期"}), 404
+    return jsonify({"code": 0, "msg": "success", "data": job_view(job)})
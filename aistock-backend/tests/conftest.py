@@ -0,0 +1,72 @@
+"""
+测试公共配置
+
+- 数据库使用内存 SQLite，每个测试重新建表
+- 不配置 Redis：缓存读写全部未命中，每次请求都会查询数据库
+"""
+import os
+
+# 必须在导入 db.models 之前设置（模块导入时即创建引擎）
+os.environ["DATABASE_URI"] = "sqlite://"
+os.environ.pop("REDIS_BROKER_URL", None)
+# 路由模块导入时会创建大模型客户端，测试中不会真正调用
+for name in ("LLM_BASE_URL", "LLM_API_KEY", "LLM_MODEL"):
+    os.environ.setdefault(name, "test")
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from sqlalchemy import event
+from db.models import db
+
+
+@pytest.fixture
+def app():
+    """只注册被测蓝图的最小应用"""
+    from routes.news import news_bp
+    from routes.tags import tags_bp
+
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        JWT_SECRET_KEY="test",
+    )
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(news_bp)
+    app.register_blueprint(tags_bp)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def count_queries(app):
+    """
+    统计请求执行的SQL语句数
+
+    用法:
+        with count_queries() as statements:
+            client.get(...)
+        len(statements)
+    """
+    from contextlib import contextmanager
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
@@ -0,0 +1,84 @@
+"""
+推送新闻接口的游标分页测试
+
+按游标逐页翻完应不重不漏；旧数据中推送时间为空的记录不参与分页，也不会产生无法解析的游标
+"""
+from datetime import datetime, timedelta
+import pytest
+from flask_jwt_extended import create_access_token
+from db.models import db, News, PushRecord, PushNewsRelation, Stocks, User
+
+STOCK_CODE = "600000"
+
+
+def _seed_push_news(monkeypatch, count):
+    """
+    重建表并写入 count 条推送新闻，其中第一条的推送时间为空
+
+    Returns:
+        tuple: (访问令牌, 推送时间不为空的新闻ID，按推送时间倒序)
+    """
+    # 旧版本建的表 push_time 允许为空
+    monkeypatch.setattr(PushRecord.__table__.c.push_time, "nullable", True)
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    user = User(openid="openid")
+    db.session.add_all([user, Stocks(code=STOCK_CODE, name="浦发银行")])
+    db.session.flush()
+
+    now = datetime.now()
+    expected = []
+    for i in range(count):
+        news = News(
+            ctime=now - timedelta(minutes=i),
+            title=f"新闻{i}",
+            content=f"新闻正文{i}",
+            content_hash=f"{i:064d}",
+            link=f"https://example.com/news/{i}",
+            code=STOCK_CODE,
+            download_time=now,
+        )
+        db.session.add(news)
+        db.session.flush()
+        # 每两条新闻共用一次推送，推送时间相同时按 (msgid, news_id) 排序
+        msgid = f"msg{i // 2:03d}"
+        if i % 2 == 0:
+            db.session.add(PushRecord(msgid=msgid, user_id=user.id, push_time=now - timedelta(minutes=i),
+                                      content={}, result="ok"))
+            db.session.flush()
+        db.session.add(PushNewsRelation(msgid=msgid, news_id=news.id))
+        if i >= 2:
+            expected.append(news.id)
+    # 显式赋值 None 会被列默认值覆盖，写入后再置空
+    db.session.query(PushRecord).filter(PushRecord.msgid == "msg000").update({"push_time": None})
+    db.session.commit()
+    token = create_access_token(identity=str(user.id))
+    db.session.remove()
+    # 同一次推送内 news_id 倒序
+    expected = [news_id for pair in zip(expected[1::2], expected[0::2]) for news_id in pair]
+    return token, expected
+
+
+# limit=9 时第一页的最后一行（游标所在行）正是推送时间为空的记录（NULL 在倒序中排在最后）
+@pytest.mark.parametrize("limit", [3, 9])
+def test_push_news_cursor_pages_skip_null_push_time(app, monkeypatch, limit):
+    token, expected = _seed_push_news(monkeypatch, 10)
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    seen = []
+    cursor = ""
+    for _ in range(10):
+        response = client.get(f"/api/news/pushnews?limit={limit}&cursor={cursor}", headers=headers)
+        assert response.status_code == 200, response.get_json()
+        data = response.get_json()["data"]
+        seen.extend(item["id"] for item in data["news"])
+        assert all(item["push_time"] for item in data["news"])
+        cursor = data["pagination"]["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == expected
+    assert data["pagination"]["total"] == len(expected)
@@ -0,0 +1,74 @@
+"""
+新闻列表接口的查询次数回归测试
+
+整页新闻的标签和摘要应批量加载，查询次数与返回的条数无关
+"""
+from datetime import datetime, timedelta
+import pytest
+from db.models import db, News, Tag, NewsTagRelation, NewsSummary
+
+POSITIVE_TAG = "业绩增长"
+NEGATIVE_TAG = "减持"
+
+ENDPOINTS = [
+    "/api/news/get?code=cn&limit=20",
+    f"/api/tags/news?tag={POSITIVE_TAG}&type=positive",
+    "/api/tags/important",
+]
+
+
+def _seed_news(count):
+    """重建表并写入 count 条带两个标签和摘要的重要新闻"""
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    positive = Tag(name=POSITIVE_TAG, tag_type=1)
+    negative = Tag(name=NEGATIVE_TAG, tag_type=0)
+    db.session.add_all([positive, negative])
+    db.session.flush()
+
+    now = datetime.now()
+    for i in range(count):
+        news = News(
+            ctime=now - timedelta(minutes=i),
+            title=f"新闻{i}",
+            content=f"新闻正文{i}",
+            content_hash=f"{i:064d}",
+            link=f"https://example.com/news/{i}",
+            code="cn",
+            is_important=1,
+            download_time=now,
+        )
+        db.session.add(news)
+        db.session.flush()
+        db.session.add_all([
+            NewsTagRelation(news_id=news.id, tag_id=positive.id),
+            NewsTagRelation(news_id=news.id, tag_id=negative.id),
+            NewsSummary(news_id=news.id, summary=f"摘要{i}"),
+        ])
+    db.session.commit()
+    # 清空身份映射，请求中的对象都要从数据库加载
+    db.session.remove()
+
+
+def _query_count(app, count_queries, path, news_count):
+    _seed_news(news_count)
+    client = app.test_client()
+    with count_queries() as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    body = response.get_json()
+    items = body["data"]["news"] if "news" in body["data"] else body["data"]
+    assert len(items) == news_count
+    # /news/get 的标签在 tag 字段中，/tags/* 直接放在新闻条目上
+    assert all((item["tag"]["positive"] if "tag" in item else item["positive_tags"]) == [POSITIVE_TAG]
+               for item in items)
+    return len(statements)
+
+
+@pytest.mark.parametrize("path", ENDPOINTS)
+def test_query_count_independent_of_page_size(app, count_queries, path):
+    single = _query_count(app, count_queries, path, 1)
+    full_page = _query_count(app, count_queries, path, 20)
+    assert single == full_page, f"{path}: 1条新闻 {single} 次查询，20条新闻 {full_page} 次查询"
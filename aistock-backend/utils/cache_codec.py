@@ -0,0 +1,214 @@
+"""
+Redis缓存值的编解码
+
+存储格式：4字节头 + 负载
+    [0] 魔数 0xAC
+    [1] 格式版本 CODEC_FORMAT_VERSION
+    [2] 序列化器ID：0=原始字节, 1=json, 2=orjson, 3=msgpack
+    [3] 压缩算法ID：0=不压缩, 1=zstd, 2=lz4
+
+解码时按头部记录的序列化器/压缩算法还原，与当前配置无关，
+因此修改配置后旧条目仍可读取。头部不匹配（如旧版本写入的pickle数据）
+或格式版本不同时抛出 CacheFormatError，调用方应删除该键并按未命中处理。
+
+序列化器只支持JSON兼容的数据；datetime等类型会被转换为字符串。
+bytes类型的数据不经序列化和压缩直接存储（如预先编码好的HTTP响应，
+其中已含gzip版本，再压缩收益有限，且每次命中都要多解压一次）。
+"""
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_MAGIC = 0xAC
+CODEC_FORMAT_VERSION = 1
+HEADER_SIZE = 4
+
+SERIALIZER_RAW = 0
+SERIALIZER_JSON = 1
+SERIALIZER_ORJSON = 2
+SERIALIZER_MSGPACK = 3
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZSTD = 1
+COMPRESSION_LZ4 = 2
+
+_SERIALIZER_NAMES = {"json": SERIALIZER_JSON, "orjson": SERIALIZER_ORJSON, "msgpack": SERIALIZER_MSGPACK}
+_COMPRESSION_NAMES = {"none": COMPRESSION_NONE, "zstd": COMPRESSION_ZSTD, "lz4": COMPRESSION_LZ4}
+
+
+class CacheFormatError(ValueError):
+    """缓存数据不是当前版本的编码格式（旧格式或已损坏）"""
+
+
+def _json_dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _json_loads(payload):
+    return json.loads(payload)
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _orjson_loads(payload):
+    return orjson.loads(payload)
+
+
+def _msgpack_dumps(data):
+    return msgpack.packb(data, default=str, use_bin_type=True)
+
+
+def _msgpack_loads(payload):
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+def _serializers():
+    """当前环境可用的序列化器：ID -> (dumps, loads)"""
+    available = {SERIALIZER_JSON: (_json_dumps, _json_loads)}
+    if orjson is not None:
+        available[SERIALIZER_ORJSON] = (_orjson_dumps, _orjson_loads)
+    if msgpack is not None:
+        available[SERIALIZER_MSGPACK] = (_msgpack_dumps, _msgpack_loads)
+    return available
+
+
+def _compressors(level):
+    """当前环境可用的压缩算法：ID -> (compress, decompress)"""
+    available = {}
+    if zstandard is not None:
+        # zstd的压缩/解压上下文不是线程安全的，每次调用创建新的上下文
+        available[COMPRESSION_ZSTD] = (
+            lambda payload: zstandard.ZstdCompressor(level=level).compress(payload),
+            lambda payload: zstandard.ZstdDecompressor().decompress(payload),
+        )
+    if lz4_frame is not None:
+        available[COMPRESSION_LZ4] = (lz4_frame.compress, lz4_frame.decompress)
+    return available
+
+
+class CacheCodec:
+    """
+    缓存值编解码器
+
+    Args:
+        serializer: 序列化器名称(orjson/msgpack/json)，为空或不可用时优先使用orjson，其次json
+        compression: 压缩算法名称(zstd/lz4/none)，为空时优先使用zstd，其次lz4；不可用时不压缩
+        compress_min_bytes: 序列化结果达到该大小(字节)才压缩
+        compress_level: zstd压缩级别
+    """
+
+    def __init__(self, serializer=None, compression=None, compress_min_bytes=4096, compress_level=3):
+        self._serializers = _serializers()
+        self._compressors = _compressors(compress_level)
+        self.compress_min_bytes = compress_min_bytes
+
+        serializer_id = _SERIALIZER_NAMES.get((serializer or "").lower())
+        if serializer_id not in self._serializers:
+            if serializer:
+                logger.warning(f"缓存序列化器 {serializer} 不可用，使用默认序列化器")
+            serializer_id = SERIALIZER_ORJSON if SERIALIZER_ORJSON in self._serializers else SERIALIZER_JSON
+        self.serializer_id = serializer_id
+
+        if compression is None or compression == "":
+            compression_id = next(
+                (cid for cid in (COMPRESSION_ZSTD, COMPRESSION_LZ4) if cid in self._compressors),
+                COMPRESSION_NONE,
+            )
+        else:
+            compression_id = _COMPRESSION_NAMES.get(compression.lower(), COMPRESSION_NONE)
+            if compression_id != COMPRESSION_NONE and compression_id not in self._compressors:
+                logger.warning(f"缓存压缩算法 {compression} 不可用，不压缩")
+                compression_id = COMPRESSION_NONE
+        self.compression_id = compression_id
+
+    @property
+    def serializer_name(self):
+        return next(name for name, sid in _SERIALIZER_NAMES.items() if sid == self.serializer_id)
+
+    @property
+    def compression_name(self):
+        return next(name for name, cid in _COMPRESSION_NAMES.items() if cid == self.compression_id)
+
+    def encode(self, data):
+        """
+        编码数据
+
+        Args:
+            data: JSON兼容的数据或bytes（bytes不压缩）
+
+        Returns:
+            bytes: 带格式头的编码结果
+        """
+        if isinstance(data, (bytes, bytearray)):
+            serializer_id, payload = SERIALIZER_RAW, bytes(data)
+        else:
+            serializer_id = self.serializer_id
+            dumps, _ = self._serializers[serializer_id]
+            payload = dumps(data)
+        compression_id = COMPRESSION_NONE
+        if (serializer_id != SERIALIZER_RAW and self.compression_id != COMPRESSION_NONE
+                and len(payload) >= self.compress_min_bytes):
+            compress, _ = self._compressors[self.compression_id]
+            compressed = compress(payload)
+            # 压缩无收益时保留原始数据，避免解码时白白解压
+            if len(compressed) < len(payload):
+                payload = compressed
+                compression_id = self.compression_id
+        header = bytes((CODEC_MAGIC, CODEC_FORMAT_VERSION, serializer_id, compression_id))
+        return header + payload
+
+    def decode(self, raw):
+        """
+        解码数据
+
+        Args:
+            raw: encode的输出
+
+        Returns:
+            解码后的数据
+
+        Raises:
+            CacheFormatError: 格式头不匹配、版本不同，或编码方式在当前环境不可用
+        """
+        if len(raw) < HEADER_SIZE or raw[0] != CODEC_MAGIC:
+            raise CacheFormatError("缓存数据缺少格式头")
+        version, serializer_id, compression_id = raw[1], raw[2], raw[3]
+        if version != CODEC_FORMAT_VERSION:
+            raise CacheFormatError(f"缓存格式版本不匹配: {version}")
+        if serializer_id != SERIALIZER_RAW and serializer_id not in self._serializers:
+            raise CacheFormatError(f"不支持的序列化器: {serializer_id}")
+
+        payload = raw[HEADER_SIZE:]
+        if compression_id != COMPRESSION_NONE:
+            if compression_id not in self._compressors:
+                raise CacheFormatError(f"不支持的压缩算法: {compression_id}")
+            _, decompress = self._compressors[compression_id]
+            payload = decompress(payload)
+
+        if serializer_id == SERIALIZER_RAW:
+            return payload
+        _, loads = self._serializers[serializer_id]
+        return loads(payload)
@@ -0,0 +1,149 @@
+"""
+HTTP响应缓存：缓存编码好的JSON响应体及其gzip版本，命中时直接返回字节，
+并支持 ETag / If-None-Match 协商返回304
+"""
+import gzip
+import hashlib
+import logging
+import os
+import struct
+from flask import current_app as app, jsonify, request, Response
+from utils.redis_cache import cache_data, get_cached_data, get_or_compute
+
+logger = logging.getLogger(__name__)
+
+# 响应体达到该大小(字节)时才预先生成gzip版本
+HTTP_CACHE_GZIP_MIN_BYTES = int(os.getenv("HTTP_CACHE_GZIP_MIN_BYTES", 1024))
+HTTP_CACHE_GZIP_LEVEL = int(os.getenv("HTTP_CACHE_GZIP_LEVEL", 6))
+
+# 缓存帧格式：软过期时间戳(double)、ETag长度、响应体长度、gzip响应体长度，之后依次为三段数据
+_FRAME_HEADER = struct.Struct("!dHII")
+
+
+class CachedResponse:
+    """编码好的JSON响应：响应体、gzip响应体(可能为空)、ETag及软过期时间戳"""
+
+    __slots__ = ("body", "gzip_body", "etag", "fresh_until")
+
+    def __init__(self, body, gzip_body, etag, fresh_until=0.0):
+        self.body = body
+        self.gzip_body = gzip_body
+        self.etag = etag
+        self.fresh_until = fresh_until
+
+    @classmethod
+    def from_payload(cls, payload, fresh_until=0.0):
+        """按 jsonify 的格式编码响应数据，并计算ETag和gzip版本"""
+        body = f"{app.json.dumps(payload)}\n".encode("utf-8")
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        gzip_body = b""
+        if len(body) >= HTTP_CACHE_GZIP_MIN_BYTES:
+            # mtime=0 保证相同内容得到相同的压缩结果
+            gzip_body = gzip.compress(body, compresslevel=HTTP_CACHE_GZIP_LEVEL, mtime=0)
+        return cls(body, gzip_body, etag, fresh_until)
+
+    def to_bytes(self):
+        """编码为缓存帧；写入Redis时按原始字节存储，不再经过缓存压缩"""
+        etag = self.etag.encode("ascii")
+        header = _FRAME_HEADER.pack(self.fresh_until, len(etag), len(self.body), len(self.gzip_body))
+        return b"".join((header, etag, self.body, self.gzip_body))
+
+    @classmethod
+    def from_bytes(cls, raw):
+        """
+        解析 to_bytes 的输出
+
+        Raises:
+            ValueError: 数据不是有效的缓存帧
+        """
+        try:
+            fresh_until, etag_len, body_len, gzip_len = _FRAME_HEADER.unpack_from(raw)
+        except struct.error as e:
+            raise ValueError(f"无效的响应缓存帧: {e}")
+        offset = _FRAME_HEADER.size
+        if len(raw) != offset + etag_len + body_len + gzip_len:
+            raise ValueError("响应缓存帧长度不匹配")
+        etag = raw[offset:offset + etag_len].decode("ascii")
+        offset += etag_len
+        body = raw[offset:offset + body_len]
+        offset += body_len
+        gzip_body = raw[offset:offset + gzip_len]
+        return cls(body, gzip_body, etag, fresh_until)
+
+    def to_response(self):
+        """
+        生成Flask响应：If-None-Match匹配时返回304，客户端接受gzip时返回预压缩的响应体
+
+        ETag为弱校验值，同一内容的原始版本和gzip版本共用一个ETag
+        """
+        if request.if_none_match.contains_weak(self.etag):
+            response = Response(status=304)
+        elif self.gzip_body and request.accept_encodings.quality("gzip") > 0:
+            response = Response(self.gzip_body, mimetype="application/json")
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = Response(self.body, mimetype="application/json")
+        response.set_etag(self.etag, weak=True)
+        response.headers["Vary"] = "Accept-Encoding"
+        # 允许客户端保存响应，但每次使用前需携带ETag重新验证
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+def pack_response(payload, fresh_until):
+    """get_or_compute 的 pack 函数：把响应数据编码为缓存帧"""
+    return CachedResponse.from_payload(payload, fresh_until).to_bytes()
+
+
+def unpack_response(entry):
+    """get_or_compute 的 unpack 函数：缓存帧无效（如旧格式数据）时返回None"""
+    if not isinstance(entry, bytes):
+        return None
+    try:
+        cached = CachedResponse.from_bytes(entry)
+    except ValueError as e:
+        logger.info(f"忽略无效的响应缓存: {str(e)}")
+        return None
+    return cached, cached.fresh_until
+
+
+def cache_response(key, payload, expire_seconds=3600):
+    """
+    编码响应数据并缓存
+
+    Args:
+        key: Redis键
+        payload: 响应数据
+        expire_seconds: 过期时间(秒)
+
+    Returns:
+        CachedResponse: 编码后的响应，缓存失败时同样返回
+    """
+    cached = CachedResponse.from_payload(payload)
+    if not cache_data(key, cached.to_bytes(), expire_seconds):
+        logger.warning(f"响应缓存失败: {key}")
+    return cached
+
+
+def get_cached_response(key):
+    """
+    获取缓存的响应
+
+    Returns:
+        CachedResponse: 未命中或缓存格式不符时返回None
+    """
+    unpacked = unpack_response(get_cached_data(key))
+    return unpacked[0] if unpacked else None
+
+
+def get_or_compute_response(key, compute, **kwargs):
+    """
+    带防击穿保护的响应缓存，参数同 get_or_compute
+
+    Returns:
+        Response: 成功时返回缓存的响应字节（支持304与gzip），失败时返回计算得到的错误响应
+    """
+    result, status = get_or_compute(key, compute, pack=pack_response, unpack=unpack_response, **kwargs)
+    if status == 200:
+        return result.to_response()
+    return jsonify(result), status
@@ -0,0 +1,347 @@
+"""
+基于Redis的后台任务队列
+
+- 提交任务时写入任务状态（Hash）并推入队列（List），由独立的worker进程取出执行
+- 同一去重键（如股票代码）同时只保留一个未完成的任务，重复提交返回已有任务
+- worker取任务时原子地移入处理中列表，进程崩溃后由其他worker把超时任务重新入队；
+  超时按本次执行的开始时间计算，排队时间不计入，各队列的超时时间可以不同
+- 任务状态变化通过Pub/Sub广播，供SSE接口推送给客户端
+
+键结构:
+    jobs:{queue}              待执行任务ID列表
+    jobs:{queue}:processing   执行中任务ID列表
+    jobs:job:{id}             任务状态 Hash: queue/args/status/result/error/attempts/时间戳
+    jobs:inflight:{queue}:{dedup_key}  未完成任务的去重键，值为任务ID
+    jobs:events:{id}          任务状态变化频道
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from utils.redis_cache import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# 任务完成后状态保留时间(秒)
+JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", 86400))
+# 单个任务默认的最长执行时间(秒)，超过后视为worker已崩溃，任务重新入队；可按队列单独设置
+JOB_TIMEOUT_SECONDS = int(os.getenv("JOB_TIMEOUT_SECONDS", 300))
+# 任务最多执行次数（含崩溃后的重试）
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 2))
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+
+class JobQueueUnavailable(Exception):
+    """Redis不可用，无法提交或查询任务"""
+
+
+def _redis():
+    redis_conn = get_redis_connection()
+    if not redis_conn:
+        raise JobQueueUnavailable("Redis连接失败")
+    return redis_conn
+
+
+def _job_key(job_id):
+    return f"jobs:job:{job_id}"
+
+
+def _inflight_key(queue, dedup_key):
+    return f"jobs:inflight:{queue}:{dedup_key}"
+
+
+def _events_channel(job_id):
+    return f"jobs:events:{job_id}"
+
+
+def _decode_job(raw):
+    """把Redis Hash解码为任务字典"""
+    if not raw:
+        return None
+    job = {k.decode(): v.decode() for k, v in raw.items()}
+    for field in ("args", "result"):
+        if job.get(field):
+            job[field] = json.loads(job[field])
+    for field in ("created_at", "started_at", "finished_at"):
+        if job.get(field):
+            job[field] = float(job[field])
+    job["attempts"] = int(job.get("attempts", 0))
+    return job
+
+
+def _publish(redis_conn, job_id, status):
+    redis_conn.publish(_events_channel(job_id), json.dumps({"id": job_id, "status": status}))
+
+
+def enqueue_job(queue, args, dedup_key=None, timeout=JOB_TIMEOUT_SECONDS):
+    """
+    提交任务
+
+    Args:
+        queue: 队列名称
+        args: 任务参数（JSON兼容）
+        dedup_key: 去重键，已有同一去重键的未完成任务时不再提交
+        timeout: 任务的最长执行时间(秒)，决定去重键的有效期，应与消费该队列的 JobWorker 一致
+
+    Returns:
+        tuple: (任务ID, 是否为新提交的任务)
+
+    Raises:
+        JobQueueUnavailable: Redis不可用
+    """
+    redis_conn = _redis()
+    job_id = uuid.uuid4().hex
+    try:
+        if dedup_key is not None:
+            inflight_key = _inflight_key(queue, dedup_key)
+            # 去重键的有效期覆盖排队与重试的最长时间，worker异常退出时也能自动释放
+            if not redis_conn.set(inflight_key, job_id, nx=True, ex=timeout * (JOB_MAX_ATTEMPTS + 1)):
+                existing = redis_conn.get(inflight_key)
+                if existing and redis_conn.exists(_job_key(existing.decode())):
+                    return existing.decode(), False
+                # 去重键指向的任务已不存在，覆盖为新任务
+                redis_conn.set(inflight_key, job_id, ex=timeout * (JOB_MAX_ATTEMPTS + 1))
+
+        pipe = redis_conn.pipeline()
+        pipe.hset(_job_key(job_id), mapping={
+            "id": job_id,
+            "queue": queue,
+            "args": json.dumps(args, ensure_ascii=False),
+            "dedup_key": "" if dedup_key is None else str(dedup_key),
+            "status": JOB_PENDING,
+            "attempts": 0,
+            "created_at": time.time(),
+        })
+        pipe.expire(_job_key(job_id), JOB_RESULT_TTL_SECONDS)
+        pipe.lpush(f"jobs:{queue}", job_id)
+        pipe.execute()
+        logger.debug(f"任务已提交: {queue} {job_id}")
+        return job_id, True
+    except JobQueueUnavailable:
+        raise
+    except Exception as e:
+        raise JobQueueUnavailable(str(e)) from e
+
+
+def get_job(job_id):
+    """
+    查询任务状态
+
+    Returns:
+        dict: 任务状态，不存在或已过期时返回None
+
+    Raises:
+        JobQueueUnavailable: Redis不可用
+    """
+    try:
+        return _decode_job(_redis().hgetall(_job_key(job_id)))
+    except JobQueueUnavailable:
+        raise
+    except Exception as e:
+        raise JobQueueUnavailable(str(e)) from e
+
+
+def job_view(job):
+    """任务状态的对外格式"""
+    view = {"id": job["id"], "status": job["status"], "created_at": job.get("created_at"),
+            "finished_at": job.get("finished_at")}
+    if job["status"] == JOB_DONE:
+        view["result"] = job.get("result")
+    elif job["status"] == JOB_FAILED:
+        view["error"] = job.get("error")
+    return view
+
+
+def iter_job_events(job_id, timeout=120, heartbeat=15):
+    """
+    订阅任务状态变化，先返回当前状态，任务结束或超时后停止
+
+    Args:
+        job_id: 任务ID
+        timeout: 最长等待时间(秒)
+        heartbeat: 无状态变化时返回None的间隔(秒)，供SSE发送心跳
+
+    Yields:
+        dict | None: 任务状态，None表示心跳
+    """
+    redis_conn = _redis()
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(_events_channel(job_id))
+    try:
+        # 订阅之后再读取当前状态，避免漏掉两者之间发生的变化
+        job = get_job(job_id)
+        yield job
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return
+        deadline = time.monotonic() + timeout
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=1.0)
+            if message is not None:
+                job = get_job(job_id)
+                yield job
+                last_sent = time.monotonic()
+                if job is None or job["status"] in FINISHED_STATUSES:
+                    return
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield None
+                last_sent = time.monotonic()
+    finally:
+        pubsub.close()
+
+
+class JobWorker:
+    """
+    从队列中取出任务并执行的worker
+
+    Args:
+        queue: 队列名称
+        handler: 任务处理函数，接收任务参数，返回JSON兼容的结果；抛出异常时任务失败
+        concurrency: 并发执行任务的线程数
+        wrap: 可选，包装每次处理的上下文管理器工厂（如Flask应用上下文）
+        timeout: 单个任务的最长执行时间(秒)，应大于处理函数最坏情况下的耗时（含大模型重试）
+    """
+
+    def __init__(self, queue, handler, concurrency=1, wrap=None, timeout=JOB_TIMEOUT_SECONDS):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.wrap = wrap
+        self.timeout = timeout
+        self.stop_event = threading.Event()
+        self.stats = {"done": 0, "failed": 0, "requeued": 0}
+        self._stats_lock = threading.Lock()
+        # 上次检查时已在处理中列表、但还没有开始时间的任务
+        self._unclaimed = set()
+
+    @property
+    def _queue_key(self):
+        return f"jobs:{self.queue}"
+
+    @property
+    def _processing_key(self):
+        return f"jobs:{self.queue}:processing"
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def recover_stalled(self):
+        """
+        把执行超时（worker崩溃）的任务重新入队，超过最大次数的标记为失败
+
+        超时从本次执行的开始时间（started_at）算起。任务移入处理中列表后才写入开始时间，
+        没有开始时间的任务正在被领取，不按超时处理；连续两次检查都没有开始时间，
+        说明worker在领取后、开始执行前崩溃，直接重新入队
+        """
+        redis_conn = _redis()
+        now = time.time()
+        unclaimed = set()
+        for raw_id in redis_conn.lrange(self._processing_key, 0, -1):
+            job_id = raw_id.decode()
+            job = _decode_job(redis_conn.hgetall(_job_key(job_id)))
+            if job is None:
+                redis_conn.lrem(self._processing_key, 0, job_id)
+                continue
+            started_at = job.get("started_at")
+            if started_at is None:
+                if job_id not in self._unclaimed:
+                    unclaimed.add(job_id)
+                    continue
+            elif now - started_at < self.timeout:
+                continue
+            if redis_conn.lrem(self._processing_key, 0, job_id) == 0:
+                # 已被其他worker处理
+                continue
+            if job["attempts"] >= JOB_MAX_ATTEMPTS:
+                self._finish(redis_conn, job, JOB_FAILED, error="任务执行超时")
+            else:
+                # 清除上次执行的开始时间，重新领取时再写入
+                pipe = redis_conn.pipeline()
+                pipe.hset(_job_key(job_id), "status", JOB_PENDING)
+                pipe.hdel(_job_key(job_id), "started_at")
+                pipe.rpush(self._queue_key, job_id)
+                pipe.execute()
+                self._count("requeued")
+                logger.warning(f"任务执行超时，重新入队: {self.queue} {job_id}")
+        self._unclaimed = unclaimed
+
+    def _finish(self, redis_conn, job, status, result=None, error=None):
+        mapping = {"status": status, "finished_at": time.time()}
+        if result is not None:
+            mapping["result"] = json.dumps(result, ensure_ascii=False, default=str)
+        if error is not None:
+            mapping["error"] = error
+        pipe = redis_conn.pipeline()
+        pipe.hset(_job_key(job["id"]), mapping=mapping)
+        pipe.expire(_job_key(job["id"]), JOB_RESULT_TTL_SECONDS)
+        pipe.lrem(self._processing_key, 0, job["id"])
+        pipe.execute()
+        if job.get("dedup_key"):
+            # 只删除仍指向本任务的去重键
+            inflight_key = _inflight_key(self.queue, job["dedup_key"])
+            if redis_conn.get(inflight_key) == job["id"].encode():
+                redis_conn.delete(inflight_key)
+        _publish(redis_conn, job["id"], status)
+        self._count("done" if status == JOB_DONE else "failed")
+
+    def _run_one(self, redis_conn, job_id):
+        job = _decode_job(redis_conn.hgetall(_job_key(job_id)))
+        if job is None:
+            redis_conn.lrem(self._processing_key, 0, job_id)
+            return
+        redis_conn.hset(_job_key(job_id), mapping={
+            "status": JOB_RUNNING, "started_at": time.time(), "attempts": job["attempts"] + 1,
+        })
+        _publish(redis_conn, job_id, JOB_RUNNING)
+        start = time.time()
+        try:
+            if self.wrap is not None:
+                with self.wrap():
+                    result = self.handler(job["args"])
+            else:
+                result = self.handler(job["args"])
+            self._finish(redis_conn, job, JOB_DONE, result=result)
+            logger.info(f"任务完成: {self.queue} {job_id}，耗时 {time.time() - start:.2f} 秒")
+        except Exception as e:
+            logger.error(f"任务失败: {self.queue} {job_id}: {e}", exc_info=True)
+            self._finish(redis_conn, job, JOB_FAILED, error=str(e))
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            try:
+                redis_conn = _redis()
+                # 原子地移入处理中列表，进程崩溃时任务不会丢失
+                raw_id = redis_conn.brpoplpush(self._queue_key, self._processing_key, timeout=1)
+                if raw_id is None:
+                    continue
+                self._run_one(redis_conn, raw_id.decode())
+            except Exception as e:
+                logger.error(f"worker处理队列 {self.queue} 出错: {e}")
+                self.stop_event.wait(1)
+
+    def run(self):
+        """启动工作线程并阻塞，直到 stop_event 被设置；启动时及之后每分钟检查一次超时任务"""
+        self.recover_stalled()
+        threads = [
+            threading.Thread(target=self._loop, name=f"{self.queue}-worker-{n}", daemon=True)
+            for n in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info(f"队列 {self.queue} 的worker已启动，并发数: {self.concurrency}，任务超时: {self.timeout} 秒")
+        while not self.stop_event.wait(60):
+            try:
+                self.recover_stalled()
+            except Exception as e:
+                logger.error(f"检查超时任务失败: {e}")
+            logger.info(f"队列 {self.queue} 统计: {self.stats}")
+        for thread in threads:
+            thread.join()
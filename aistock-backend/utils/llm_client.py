@@ -0,0 +1,401 @@
+"""
+大模型（OpenAI 兼容接口）客户端
+
+后端 utils/llm_client.py 与定时任务 utils/llm_client.py 是同一份代码，修改时需两边同步。
+
+- 同步 chat() / chat_stream() 与异步 achat()；同一接口地址在进程内共用一个 SDK 客户端及其连接池，
+  异步客户端按事件循环各建一个
+- 进程内所有调用共用并发上限 LLM_MAX_CONCURRENCY，线程和协程一起计数，批量任务可以直接并发提交
+- 429、5xx、超时和连接错误按指数退避重试（带随机抖动，有 Retry-After 时以其为准）；
+  收到 429 后整个进程在冷却结束前不再发出新请求，避免并发调用一起撞限流
+- 每次调用记录耗时、token 用量和重试次数，按模型累计，见 get_llm_stats()
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# 进程内同时进行的大模型请求数上限
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+# 默认最大尝试次数（含首次请求）
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", 5))
+# 退避的初始等待与最长等待(秒)
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 1))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 60))
+
+
+def max_call_seconds(timeout: float = 180, max_retries: int | None = None) -> float:
+    """
+    一次调用（含全部重试与退避等待）最坏情况下的耗时(秒)，用于设置后台任务的超时和锁的有效期
+
+    不含等待并发名额与 429 冷却的时间，使用时应另留余量
+    """
+    attempts = max_retries or LLM_MAX_ATTEMPTS
+    return attempts * timeout + (attempts - 1) * LLM_BACKOFF_MAX
+
+
+class LLMError(RuntimeError):
+    """请求失败（不可重试的错误或重试次数用尽）"""
+
+
+# --------------------------------------------------------------------------- #
+# 并发与限流
+# --------------------------------------------------------------------------- #
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+
+async def _acquire_slot_async():
+    # 与同步调用共用同一个信号量；轮询而不是在线程中阻塞等待，协程被取消时不会占住名额
+    while not _slots.acquire(blocking=False):
+        await asyncio.sleep(0.05)
+
+
+class _Cooldown:
+    """收到 429 后的全局冷却时间"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.until = 0.0
+
+    def extend(self, seconds: float):
+        with self.lock:
+            self.until = max(self.until, time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.until - time.monotonic())
+
+
+_cooldown = _Cooldown()
+
+
+def _status_of(error: Exception) -> int | None:
+    return getattr(error, "status_code", None) if isinstance(error, openai.APIStatusError) else None
+
+
+def _is_retryable(error: Exception) -> bool:
+    # APITimeoutError 是 APIConnectionError 的子类
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    status = _status_of(error)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """第 attempt 次（从0开始）失败后的等待时间(秒)"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(LLM_BACKOFF_MAX, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+# --------------------------------------------------------------------------- #
+# 调用统计
+# --------------------------------------------------------------------------- #
+@dataclass
+class CallMetrics:
+    """单次调用的统计"""
+    model: str
+    latency: float = 0.0  # 秒，含排队与重试等待
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0
+    ok: bool = True
+    error: str | None = None
+
+    def as_usage(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency": round(self.latency, 3),
+            "retries": self.retries,
+        }
+
+
+class LLMStats:
+    """按模型累计的调用统计（多线程更新，需要加锁）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.models: Dict[str, Dict[str, float]] = {}
+
+    def record(self, metrics: CallMetrics):
+        with self.lock:
+            stats = self.models.setdefault(metrics.model, {
+                "calls": 0, "failures": 0, "retries": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "latency_total": 0.0, "latency_max": 0.0,
+            })
+            stats["calls"] += 1
+            stats["failures"] += 0 if metrics.ok else 1
+            stats["retries"] += metrics.retries
+            stats["prompt_tokens"] += metrics.prompt_tokens
+            stats["completion_tokens"] += metrics.completion_tokens
+            stats["latency_total"] += metrics.latency
+            stats["latency_max"] = max(stats["latency_max"], metrics.latency)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            models = {model: dict(stats) for model, stats in self.models.items()}
+        for stats in models.values():
+            stats["latency_avg"] = round(stats.pop("latency_total") / stats["calls"], 3) if stats["calls"] else 0.0
+            stats["latency_max"] = round(stats["latency_max"], 3)
+        return models
+
+    def summary(self) -> str:
+        models = self.snapshot()
+        if not models:
+            return "本次没有调用大模型"
+        return "；".join(
+            f"{model}: 调用 {s['calls']} 次（失败 {s['failures']}，重试 {s['retries']}），"
+            f"tokens {s['prompt_tokens']}+{s['completion_tokens']}，平均耗时 {s['latency_avg']:.2f} 秒"
+            for model, s in models.items()
+        )
+
+
+llm_stats = LLMStats()
+
+
+def get_llm_stats() -> Dict[str, Dict[str, float]]:
+    """本进程按模型累计的调用次数、失败与重试次数、token 用量和耗时"""
+    return llm_stats.snapshot()
+
+
+# --------------------------------------------------------------------------- #
+# SDK 客户端（按接口地址共享连接池）
+# --------------------------------------------------------------------------- #
+_clients_lock = threading.Lock()
+_sync_clients: Dict[tuple, openai.OpenAI] = {}
+# 异步客户端绑定事件循环，循环结束后随之回收
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, openai.AsyncOpenAI]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _sync_client(base_url: str, api_key: str, timeout: float) -> openai.OpenAI:
+    key = (base_url, api_key, timeout)
+    with _clients_lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            # 重试由本模块负责，关闭 SDK 自带的重试
+            client = _sync_clients[key] = openai.OpenAI(
+                api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0
+            )
+        return client
+
+
+def _async_client(base_url: str, api_key: str, timeout: float) -> openai.AsyncOpenAI:
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key, timeout)
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = openai.AsyncOpenAI(
+                api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0
+            )
+        return client
+
+
+# --------------------------------------------------------------------------- #
+# 对话客户端
+# --------------------------------------------------------------------------- #
+class ChatClient:
+    """
+    OpenAI 兼容的对话客户端
+
+    Args:
+        base_url / api_key / default_model: 默认读取 LLM_BASE_URL、LLM_API_KEY、LLM_MODEL
+        timeout: 单次请求超时(秒)
+        max_content_length: 单条消息的最大长度，超出部分截断
+    """
+
+    def __init__(self, base_url: str | None = None, api_key: str | None = None,
+                 default_model: str | None = None, timeout: float = 180,
+                 max_content_length: int = 40960):
+        self.base_url = base_url or os.getenv("LLM_BASE_URL")
+        self.api_key = api_key or os.getenv("LLM_API_KEY")
+        self.default_model = default_model or os.getenv("LLM_MODEL")
+        if not (self.base_url and self.api_key and self.default_model):
+            raise RuntimeError("请设置环境变量 LLM_BASE_URL, LLM_API_KEY, LLM_MODEL")
+        self.base_url = self.base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_content_length = max_content_length
+
+    @property
+    def client(self) -> openai.OpenAI:
+        return _sync_client(self.base_url, self.api_key, self.timeout)
+
+    def _prepare(self, messages: List[Dict[str, str]], model: str | None, temperature: float,
+                 extra: Dict[str, Any]) -> Dict[str, Any]:
+        # 确保消息内容不超过最大长度
+        processed_messages: List[Dict[str, str]] = []
+        for msg in messages:
+            content = msg.get("content", "")
+            if len(content) > self.max_content_length:
+                content = (
+                    content[: self.max_content_length]
+                    + f"\n...(内容已截断，原长度:{len(content)}字符)"
+                )
+            processed_messages.append({"role": msg.get("role", "user"), "content": content})
+        return {"model": model or self.default_model, "messages": processed_messages,
+                "temperature": temperature, **extra}
+
+    def _retry_or_raise(self, error: Exception, attempt: int, attempts: int, metrics: CallMetrics) -> float:
+        """记录一次失败；可以重试时返回等待时间，否则抛出 LLMError"""
+        metrics.error = f"{type(error).__name__}: {error}"
+        if not _is_retryable(error) or attempt + 1 >= attempts:
+            metrics.ok = False
+            logger.error(f"[ChatClient] 请求失败，已尝试 {attempt + 1} 次: {metrics.error}")
+            raise LLMError(f"请求失败，已尝试 {attempt + 1} 次: {error}") from error
+        delay = _retry_delay(error, attempt)
+        if _status_of(error) == 429:
+            _cooldown.extend(delay)
+        metrics.retries += 1
+        logger.warning(f"[ChatClient] 请求失败，{delay:.1f} 秒后重试 {attempt + 1}/{attempts - 1}: {metrics.error}")
+        return delay
+
+    @staticmethod
+    def _reply(response, metrics: CallMetrics) -> str:
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+            metrics.completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        return (response.choices[0].message.content or "").strip()
+
+    @staticmethod
+    def _record(metrics: CallMetrics, start: float):
+        metrics.latency = time.monotonic() - start
+        llm_stats.record(metrics)
+        logger.debug(f"[ChatClient] {metrics}")
+
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str | None = None,
+        temperature: float = 0.3,
+        max_retries: int | None = None,  # 最大尝试次数，默认 LLM_MAX_ATTEMPTS
+        with_usage: bool = False,  # 为True时返回 (回复, 用量)
+        **extra: Any,  # 透传给接口的其他参数，如 max_tokens、response_format
+    ) -> str | tuple[str, Dict[str, Any]]:
+        """
+        同步对话
+
+        Returns:
+            回复文本；with_usage=True 时返回 (回复, {prompt_tokens, completion_tokens, latency, retries})
+
+        Raises:
+            LLMError: 不可重试的错误或重试次数用尽
+        """
+        params = self._prepare(messages, model, temperature, extra)
+        metrics = CallMetrics(model=params["model"])
+        attempts = max(1, max_retries or LLM_MAX_ATTEMPTS)
+        start = time.monotonic()
+        try:
+            for attempt in range(attempts):
+                time.sleep(_cooldown.remaining())
+                _slots.acquire()
+                try:
+                    response = self.client.chat.completions.create(**params)
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+                finally:
+                    _slots.release()
+                if error is None:
+                    reply = self._reply(response, metrics)
+                    metrics.latency = time.monotonic() - start
+                    return (reply, metrics.as_usage()) if with_usage else reply
+                time.sleep(self._retry_or_raise(error, attempt, attempts, metrics))
+        finally:
+            self._record(metrics, start)
+
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str | None = None,
+        temperature: float = 0.3,
+        max_retries: int | None = None,
+        with_usage: bool = False,
+        **extra: Any,
+    ) -> str | tuple[str, Dict[str, Any]]:
+        """异步对话，参数与返回值同 chat()"""
+        params = self._prepare(messages, model, temperature, extra)
+        metrics = CallMetrics(model=params["model"])
+        attempts = max(1, max_retries or LLM_MAX_ATTEMPTS)
+        client = _async_client(self.base_url, self.api_key, self.timeout)
+        start = time.monotonic()
+        try:
+            for attempt in range(attempts):
+                await asyncio.sleep(_cooldown.remaining())
+                await _acquire_slot_async()
+                try:
+                    response = await client.chat.completions.create(**params)
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+                finally:
+                    _slots.release()
+                if error is None:
+                    reply = self._reply(response, metrics)
+                    metrics.latency = time.monotonic() - start
+                    return (reply, metrics.as_usage()) if with_usage else reply
+                await asyncio.sleep(self._retry_or_raise(error, attempt, attempts, metrics))
+        finally:
+            self._record(metrics, start)
+
+    def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str | None = None,
+        temperature: float = 0.3,
+    ) -> Iterator[str]:
+        """
+        流式对话，逐段返回回复文本；只在收到第一段之前重试，失败时返回 "Error: ..."
+        """
+        params = self._prepare(messages, model, temperature, {"stream": True})
+        metrics = CallMetrics(model=params["model"])
+        start = time.monotonic()
+        received = False
+        try:
+            for attempt in range(LLM_MAX_ATTEMPTS):
+                time.sleep(_cooldown.remaining())
+                _slots.acquire()
+                try:
+                    stream = self.client.chat.completions.create(**params)
+                    for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content is not None:
+                            received = True
+                            yield chunk.choices[0].delta.content
+                    return
+                except Exception as e:
+                    error = e
+                finally:
+                    _slots.release()
+                try:
+                    # 已经输出过内容时不再重试，避免重复
+                    if received:
+                        raise LLMError(str(error))
+                    delay = self._retry_or_raise(error, attempt, LLM_MAX_ATTEMPTS, metrics)
+                except LLMError:
+                    metrics.ok = False
+                    logger.error(f"[ChatClient] 流式请求失败: {error}")
+                    yield f"Error: {str(error)}"
+                    return
+                time.sleep(delay)
+        finally:
+            self._record(metrics, start)
@@ -0,0 +1,137 @@
+"""
+大模型调用结果的持久化记忆（memo）
+
+- 键: (提示词模板版本, 模型, 规范化输入的 SHA-256)，输入相同则直接返回上次的原始回复
+- 提示词模板修改后递增版本号（如 financial_news:v1 -> v2），旧记录自然失效
+- 每条记录有过期时间（LLM_MEMO_TTL_HOURS），过期记录视为未命中，由定时任务 cleanup_old_news.py 删除
+- 只有解析成功的回复才写入，调用失败或格式错误不会被记住
+- 与定时任务 utils/llm_memo.py 共用 llm_memo 表，规范化与哈希方式必须保持一致
+- 使用独立的 SessionLocal 会话，不会提交调用方 db.session 中未提交的修改
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy.exc import SQLAlchemyError
+from db.models import LLMMemo, SessionLocal
+
+load_dotenv(override=True)
+
+logger = logging.getLogger('app')
+
+LLM_MEMO_ENABLED = os.getenv("LLM_MEMO_ENABLED", "1") == "1"
+# 记录的有效期(小时)
+LLM_MEMO_TTL_HOURS = float(os.getenv("LLM_MEMO_TTL_HOURS", 168))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_input(value) -> str:
+    """字符串去掉首尾空白并把连续空白合并为一个空格；其他类型按键排序序列化为 JSON"""
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return _WHITESPACE.sub(" ", value.strip())
+
+
+def input_hash(value) -> str:
+    return hashlib.sha256(normalize_input(value).encode("utf-8")).hexdigest()
+
+
+def _usage_tokens(usage) -> int:
+    usage = usage or {}
+    return (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "calls": 0, "tokens_used": 0, "tokens_saved": 0}
+
+
+def get_memo_stats() -> dict:
+    """
+    本进程的记忆统计
+
+    Returns:
+        dict: 命中次数（即避免的调用次数）、实际调用次数、命中率、实际消耗与节省的token数
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["hits"] + stats["calls"]
+    stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+    return stats
+
+
+def lookup(prompt_version: str, model_name: str, input_value) -> str | None:
+    """
+    查找未过期的记忆
+
+    Args:
+        prompt_version: 提示词模板及版本，如 financial_news:v1
+        model_name: 大模型
+        input_value: 会填入提示词的输入（字符串或可JSON序列化的对象）
+
+    Returns:
+        上次的原始回复；未命中、已禁用或查询失败时返回None
+    """
+    if not LLM_MEMO_ENABLED:
+        return None
+    key = (prompt_version, model_name or "", input_hash(input_value))
+    session = SessionLocal()
+    try:
+        memo = session.get(LLMMemo, key)
+        if memo is None or memo.expires_at <= datetime.now():
+            return None
+        session.query(LLMMemo).filter(
+            LLMMemo.prompt_version == key[0], LLMMemo.model_name == key[1], LLMMemo.input_hash == key[2]
+        ).update({LLMMemo.hit_count: LLMMemo.hit_count + 1}, synchronize_session=False)
+        session.commit()
+        with _stats_lock:
+            _stats["hits"] += 1
+            _stats["tokens_saved"] += (memo.prompt_tokens or 0) + (memo.completion_tokens or 0)
+        return memo.output
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.warning(f"查询大模型记忆失败: {e}")
+        return None
+    finally:
+        session.close()
+
+
+def store(prompt_version: str, model_name: str, input_value, output: str, usage: dict | None = None,
+          ttl_hours: float | None = None) -> None:
+    """
+    记录一次成功调用的原始回复，同时计入本进程的调用统计
+
+    Args:
+        usage: 接口返回的用量 {prompt_tokens, completion_tokens}，没有时为None
+        ttl_hours: 有效期(小时)，默认 LLM_MEMO_TTL_HOURS
+    """
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["tokens_used"] += _usage_tokens(usage)
+    if not LLM_MEMO_ENABLED or not output:
+        return
+    now = datetime.now()
+    usage = usage or {}
+    session = SessionLocal()
+    try:
+        session.merge(LLMMemo(
+            prompt_version=prompt_version,
+            model_name=model_name or "",
+            input_hash=input_hash(input_value),
+            output=output,
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            hit_count=0,
+            created_at=now,
+            expires_at=now + timedelta(hours=ttl_hours or LLM_MEMO_TTL_HOURS),
+        ))
+        session.commit()
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.warning(f"保存大模型记忆失败: {e}")
+    finally:
+        session.close()
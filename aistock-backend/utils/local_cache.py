@@ -0,0 +1,112 @@
+"""
+进程内LRU缓存（L1），位于Redis缓存（L2）之前
+"""
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+
+
+class LocalLRUCache:
+    """
+    线程安全的进程内LRU缓存
+
+    - 按条目数和估算字节数双重限制容量，超出时淘汰最久未使用的条目
+    - 每个条目有独立的过期时间，由调用方保证不超过对应Redis键的剩余TTL
+    - 记录命中/未命中次数，供监控使用
+
+    注意：get返回的是缓存对象本身，调用方不应修改它。
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """获取未过期的缓存值，未命中返回None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl, size=0):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 过期时间(秒)，<=0 时不缓存
+            size: 条目估算大小(字节)，超过总容量时不缓存
+        """
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        """删除指定键，返回删除数量"""
+        deleted = 0
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._remove(key)
+                    deleted += 1
+        return deleted
+
+    def delete_pattern(self, pattern):
+        """删除匹配glob模式（与Redis KEYS/SCAN语义一致）的键，返回删除数量"""
+        with self._lock:
+            matched = [key for key in self._data if fnmatchcase(key, pattern)]
+            for key in matched:
+                self._remove(key)
+        return len(matched)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """返回命中率和容量统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
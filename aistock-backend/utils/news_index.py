@@ -0,0 +1,173 @@
+"""
+新闻向量索引（只读）
+
+- 索引文件由定时任务 build_news_index.py / get_news.py 维护，通过共享数据卷挂载到 NEWS_INDEX_DIR
+- 每个进程加载一份索引到内存；定时任务替换索引后，按元数据中的文件名变化重新加载
+- 相似新闻直接取索引中保存的向量查询，语义搜索先调用嵌入接口把查询文本转换为向量
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+from openai import OpenAI
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+load_dotenv(override=True)
+
+logger = logging.getLogger('app')
+
+NEWS_INDEX_DIR = os.getenv("NEWS_INDEX_DIR", "/app/data/news_index")
+# 查询时的候选集大小，越大召回率越高、耗时越长
+NEWS_INDEX_EF_SEARCH = int(os.getenv("NEWS_INDEX_EF_SEARCH", 64))
+# 检查索引文件是否更新的最短间隔(秒)
+NEWS_INDEX_RELOAD_SECONDS = float(os.getenv("NEWS_INDEX_RELOAD_SECONDS", 30))
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL")
+EMBEDDING_API_KEY = os.getenv("EMBEDDING_API_KEY")
+# 查询文本的最大长度（字符）
+EMBEDDING_QUERY_MAX_CHARS = 2000
+
+
+class NewsIndexUnavailable(Exception):
+    """向量索引不可用（未安装 hnswlib、未配置嵌入模型或索引文件尚未生成）"""
+
+
+class NewsIndex:
+    """
+    按需加载并自动刷新的只读 HNSW 索引
+
+    Args:
+        model_name: 嵌入模型名称，与定时任务生成索引时使用的模型一致
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._index = None
+        self._file = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def _meta_path(self):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.model_name)
+        return os.path.join(NEWS_INDEX_DIR, f"{slug}.meta.json")
+
+    def _refresh(self):
+        """元数据指向新的索引文件时重新加载"""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < NEWS_INDEX_RELOAD_SECONDS:
+            return self._index
+        with self._lock:
+            if self._index is not None and now - self._checked_at < NEWS_INDEX_RELOAD_SECONDS:
+                return self._index
+            self._checked_at = now
+            try:
+                with open(self._meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                if self._index is None:
+                    raise NewsIndexUnavailable(f"索引元数据不可读: {e}") from e
+                return self._index
+            if meta.get("file") == self._file:
+                return self._index
+            try:
+                index = hnswlib.Index(space="cosine", dim=meta["dim"])
+                index.load_index(os.path.join(NEWS_INDEX_DIR, meta["file"]), max_elements=meta["max_elements"])
+                index.set_ef(NEWS_INDEX_EF_SEARCH)
+                index.set_num_threads(1)
+            except (OSError, RuntimeError, KeyError) as e:
+                logger.warning(f"[news_index] 加载索引失败: {e}")
+                if self._index is None:
+                    raise NewsIndexUnavailable(f"索引文件不可读: {e}") from e
+                return self._index
+            self._index, self._file = index, meta["file"]
+            logger.info(f"[news_index] 已加载索引 {meta['file']}，共 {meta.get('count')} 条")
+            return index
+
+    def query(self, vector, k, exclude=None):
+        """
+        查询最相似的新闻
+
+        Args:
+            vector: 查询向量
+            k: 返回数量
+            exclude: 需要排除的新闻ID（如相似新闻查询中的自身）
+
+        Returns:
+            list: [(新闻ID, 余弦相似度)]，按相似度从高到低排列
+        """
+        index = self._refresh()
+        count = index.get_current_count()
+        if not count:
+            return []
+        k_query = min(k + (1 if exclude is not None else 0), count)
+        try:
+            labels, distances = index.knn_query(np.asarray(vector, dtype=np.float32), k=k_query)
+        except RuntimeError:
+            # 已删除的条目较多时可能凑不满 k 条
+            return []
+        results = [(int(label), float(1 - distance)) for label, distance in zip(labels[0], distances[0])
+                   if int(label) != exclude]
+        return results[:k]
+
+    def vector_of(self, news_id):
+        """取索引中保存的新闻向量，不在索引中时返回None"""
+        try:
+            return self._refresh().get_items([news_id], return_type="numpy")[0]
+        except RuntimeError:
+            return None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_embedding_client = None
+
+
+def get_news_index(model_name=None):
+    """
+    获取指定模型的索引实例
+
+    Raises:
+        NewsIndexUnavailable: 未安装 hnswlib 或未配置嵌入模型
+    """
+    if hnswlib is None:
+        raise NewsIndexUnavailable("未安装 hnswlib")
+    model_name = model_name or EMBEDDING_MODEL
+    if not model_name:
+        raise NewsIndexUnavailable("未配置 EMBEDDING_MODEL")
+    with _indexes_lock:
+        if model_name not in _indexes:
+            _indexes[model_name] = NewsIndex(model_name)
+        return _indexes[model_name]
+
+
+def embed_query(text):
+    """
+    把查询文本转换为嵌入向量
+
+    Returns:
+        np.ndarray: 查询向量
+
+    Raises:
+        NewsIndexUnavailable: 未配置嵌入接口
+    """
+    global _embedding_client
+    if not (EMBEDDING_MODEL and EMBEDDING_API_KEY):
+        raise NewsIndexUnavailable("未配置嵌入接口")
+    if _embedding_client is None:
+        _embedding_client = OpenAI(api_key=EMBEDDING_API_KEY, base_url=EMBEDDING_BASE_URL)
+    response = _embedding_client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=text[:EMBEDDING_QUERY_MAX_CHARS],
+        encoding_format="float"
+    )
+    return np.asarray(response.data[0].embedding, dtype=np.float32)
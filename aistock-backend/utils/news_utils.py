@@ -0,0 +1,136 @@
+"""
+新闻列表的分页与关联数据加载
+
+- 游标（keyset）分页：按排序键定位下一页，翻页深度不影响查询耗时
+- 按一页新闻的ID一次性查询标签和摘要，避免在循环中逐条查询
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_, DateTime
+from db.models import db, Tag, NewsTagRelation, NewsSummary
+
+
+def encode_cursor(values):
+    """
+    把排序键编码为不透明的游标字符串
+
+    Args:
+        values: 排序键的值序列，datetime按ISO格式编码
+
+    Returns:
+        str: URL安全的游标
+    """
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    """
+    解析游标
+
+    Args:
+        cursor: encode_cursor 生成的游标
+        columns: 排序列，DateTime类型的列会把对应的值还原为datetime
+
+    Returns:
+        list: 排序键的值
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("排序键数量不匹配")
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+def paginate_desc(query, columns, limit, cursor=None, page=1, cursor_of=None):
+    """
+    按多列倒序分页
+
+    cursor 不为空时使用游标分页，只扫描游标之后的行；
+    否则按页码做 OFFSET 分页，兼容按页码翻页的旧客户端
+
+    Args:
+        query: 未排序的查询
+        columns: 排序列，最后一列应能唯一确定一行（如主键）；值为NULL的行无法用游标比较，应先在 query 中过滤掉
+        limit: 每页数量
+        cursor: 上一页返回的游标
+        page: 页码，cursor 为空时使用
+        cursor_of: 从查询结果行中取出排序键值的函数
+
+    Returns:
+        tuple: (当前页的行, 下一页的游标)，没有下一页时游标为None
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    query = query.order_by(*[column.desc() for column in columns])
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        # (c1, c2, ...) < (v1, v2, ...) 展开为OR条件，便于数据库使用复合索引做范围扫描
+        query = query.filter(or_(*[
+            and_(*[columns[j] == values[j] for j in range(i)], columns[i] < values[i])
+            for i in range(len(columns))
+        ]))
+    else:
+        query = query.offset((page - 1) * limit)
+
+    # 多取一行判断是否还有下一页
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(cursor_of(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def load_news_tags(news_ids):
+    """
+    批量查询新闻标签，按标签类型分组（一次查询）
+
+    Args:
+        news_ids: 新闻ID列表
+
+    Returns:
+        dict: {新闻ID: {"positive": [标签名], "negative": [标签名]}}，每个传入的ID都有对应条目
+    """
+    tags = {news_id: {"positive": [], "negative": []} for news_id in news_ids}
+    if not tags:
+        return tags
+
+    rows = db.session.query(NewsTagRelation.news_id, Tag.name, Tag.tag_type)\
+        .join(Tag, Tag.id == NewsTagRelation.tag_id)\
+        .filter(NewsTagRelation.news_id.in_(list(tags)))\
+        .filter(Tag.tag_type.in_((0, 1)))\
+        .order_by(Tag.id)\
+        .all()
+    for news_id, name, tag_type in rows:
+        tags[news_id]["positive" if tag_type == 1 else "negative"].append(name)
+    return tags
+
+
+def load_news_summaries(news_ids):
+    """
+    批量查询新闻摘要（一次查询）
+
+    Args:
+        news_ids: 新闻ID列表
+
+    Returns:
+        dict: {新闻ID: 摘要}，只包含有摘要的新闻
+    """
+    news_ids = list(news_ids)
+    if not news_ids:
+        return {}
+
+    rows = db.session.query(NewsSummary.news_id, NewsSummary.summary)\
+        .filter(NewsSummary.news_id.in_(news_ids))\
+        .all()
+    return {news_id: summary for news_id, summary in rows}
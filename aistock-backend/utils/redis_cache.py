@@ -1,42 +1,225 @@
 import redis
 import logging
 import os
-from flask import current_app as app
-import pickle
+import json
+import socket
+import threading
+import time
+from flask import current_app as app, has_request_context, request, Response
+from contextlib import nullcontext
 from functools import wraps
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+from utils.local_cache import LocalLRUCache
+from utils.cache_codec import CacheCodec, CacheFormatError
 
 logger = logging.getLogger(__name__)
 
+# 连接池配置
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+
+# 进程内L1缓存配置：L1条目的TTL取 LOCAL_CACHE_MAX_TTL 与Redis剩余TTL中的较小值
+LOCAL_CACHE_ENABLED = os.getenv("LOCAL_CACHE_ENABLED", "1") == "1"
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", 1024))
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_MB", 64)) * 1024 * 1024
+LOCAL_CACHE_MAX_TTL = int(os.getenv("LOCAL_CACHE_MAX_TTL", 60))
+
+# 缓存失效广播频道，各worker进程订阅后同步清除自己的L1缓存
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+# 缓存值编解码配置：序列化器(orjson/msgpack/json)与压缩算法(zstd/lz4/none)，
+# 为空时自动选择已安装的最优实现；序列化结果达到 CACHE_COMPRESS_MIN_BYTES 才压缩
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "")
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "")
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", 4096))
+
+# 扫码登录状态ID的索引集合，用于列出所有状态而无需扫描键空间
+SCAN_LOGIN_INDEX_KEY = "scan_login_index"
+
+# 防击穿：缓存软过期后仍可返回旧值的默认宽限期(秒)
+CACHE_STALE_GRACE_SECONDS = int(os.getenv("CACHE_STALE_GRACE_SECONDS", 600))
+
+# 进程内共享的Redis客户端，首次使用时创建
+_redis_client = None
+_redis_client_lock = threading.Lock()
+
+# 进程内L1缓存及Redis(L2)命中统计
+_local_cache = LocalLRUCache(max_entries=LOCAL_CACHE_MAX_ENTRIES, max_bytes=LOCAL_CACHE_MAX_BYTES)
+_redis_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+_codec = CacheCodec(
+    serializer=CACHE_SERIALIZER,
+    compression=CACHE_COMPRESSION,
+    compress_min_bytes=CACHE_COMPRESS_MIN_BYTES,
+)
+
+# 失效监听线程所属的进程ID，fork后需要在子进程中重新启动
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+def _get_redis_url():
+    """从Flask配置或环境变量获取Redis连接URL"""
+    try:
+        redis_url = app.config.get("REDIS_BROKER_URL")
+    except RuntimeError:
+        # 不在应用上下文中（如后台线程），退回到环境变量
+        redis_url = None
+    return redis_url or os.getenv("REDIS_BROKER_URL")
+
 def get_redis_connection():
     """
-    获取Redis连接，如果失败则返回None
+    获取进程内共享的Redis客户端，如果失败则返回None
+
+    客户端基于连接池，首次调用时创建，之后所有调用复用同一个连接池。
+    不再在每次调用时发送PING：连接空闲超过 REDIS_HEALTH_CHECK_INTERVAL 秒后
+    才会在下次使用前做健康检查，命令遇到连接错误时按指数退避自动重连重试。
     """
-    try:
-        # 从环境变量或配置获取Redis连接URL
-        redis_url = app.config.get("REDIS_BROKER_URL") or os.getenv("REDIS_BROKER_URL")
-        if not redis_url:
-            logger.error("Redis连接配置缺失")
+    global _redis_client
+    if _redis_client is not None:
+        return _redis_client
+
+    with _redis_client_lock:
+        if _redis_client is not None:
+            return _redis_client
+        try:
+            redis_url = _get_redis_url()
+            if not redis_url:
+                logger.error("Redis连接配置缺失")
+                return None
+
+            pool = redis.ConnectionPool.from_url(
+                redis_url,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_keepalive=True,
+                retry=Retry(ExponentialBackoff(cap=1, base=0.05), 2),
+                retry_on_error=[redis.ConnectionError, redis.TimeoutError],
+            )
+            _redis_client = redis.Redis(connection_pool=pool)
+            logger.info(f"Redis连接池已创建，最大连接数: {REDIS_MAX_CONNECTIONS}")
+            return _redis_client
+        except Exception as e:
+            logger.error(f"Redis连接池创建失败: {str(e)}")
             return None
-            
-        # 创建Redis连接并测试
-        redis_conn = redis.Redis.from_url(redis_url)
-        redis_conn.ping()  # 测试连接是否正常
-        return redis_conn
-    except redis.ConnectionError as e:
-        logger.error(f"无法连接到Redis: {str(e)}")
-        return None
-    except Exception as e:
-        logger.error(f"Redis连接异常: {str(e)}")
-        return None
 
-def cache_data(key, data, expire_seconds=3600):
+def get_redis_pool_stats():
     """
-    将数据缓存到Redis
+    获取Redis连接池统计信息
+
+    Returns:
+        dict: in_use(使用中)、idle(空闲)、created(已创建)、max(上限)连接数；连接池未创建时各项为0，
+        redis-py 内部属性不存在（版本变化）时对应项为None
+    """
+    client = _redis_client
+    if client is None:
+        return {"in_use": 0, "idle": 0, "created": 0, "max": REDIS_MAX_CONNECTIONS}
+
+    # 以下均为 redis-py 的私有属性，升级后可能改名，取不到时不影响接口
+    pool = client.connection_pool
+    with getattr(pool, "_lock", None) or nullcontext():
+        in_use = getattr(pool, "_in_use_connections", None)
+        idle = getattr(pool, "_available_connections", None)
+        created = getattr(pool, "_created_connections", None)
+        return {
+            "in_use": len(in_use) if in_use is not None else None,
+            "idle": len(idle) if idle is not None else None,
+            "created": created,
+            "max": getattr(pool, "max_connections", REDIS_MAX_CONNECTIONS),
+        }
+
+def _instance_id():
+    """当前worker进程的唯一标识，用于忽略自己发出的失效消息"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _local_ttl(redis_ttl_seconds):
+    """L1条目的TTL不超过Redis中对应键的剩余TTL"""
+    return min(LOCAL_CACHE_MAX_TTL, redis_ttl_seconds)
+
+def _publish_invalidation(redis_conn, keys=None, pattern=None):
+    """通知所有worker清除L1中的指定键或匹配模式的键"""
+    message = json.dumps({"origin": _instance_id(), "keys": keys or [], "pattern": pattern})
+    redis_conn.publish(CACHE_INVALIDATION_CHANNEL, message)
+
+def _apply_invalidation(raw_message):
+    """处理收到的失效消息"""
+    try:
+        message = json.loads(raw_message)
+    except (TypeError, ValueError):
+        logger.warning(f"无法解析缓存失效消息: {raw_message!r}")
+        return
+    if message.get("origin") == _instance_id():
+        return
+    if message.get("keys"):
+        _local_cache.delete(*message["keys"])
+    if message.get("pattern"):
+        _local_cache.delete_pattern(message["pattern"])
+
+def _invalidation_listener_loop():
+    """后台订阅缓存失效频道，断线后自动重连"""
+    while True:
+        pubsub = None
+        try:
+            redis_conn = get_redis_connection()
+            if not redis_conn:
+                time.sleep(5)
+                continue
+            pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            # 订阅建立之前可能错过了失效消息，清空L1保证一致
+            _local_cache.clear()
+            logger.info(f"已订阅缓存失效频道: {CACHE_INVALIDATION_CHANNEL}")
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    _apply_invalidation(message["data"])
+        except Exception as e:
+            logger.warning(f"缓存失效订阅中断，稍后重连: {str(e)}")
+            _local_cache.clear()
+            time.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+def _ensure_invalidation_listener():
+    """在当前进程中启动失效监听线程（每个进程只启动一次）"""
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _listener_lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+        # fork得到的子进程不能沿用父进程的L1数据
+        _local_cache.clear()
+        threading.Thread(
+            target=_invalidation_listener_loop,
+            name="cache-invalidation-listener",
+            daemon=True,
+        ).start()
+
+def _use_local(use_local):
+    if use_local and LOCAL_CACHE_ENABLED:
+        _ensure_invalidation_listener()
+        return True
+    return False
+
+def cache_data(key, data, expire_seconds=3600, use_local=True):
+    """
+    将数据缓存到Redis，并同步写入当前进程的L1缓存
     
     Args:
         key: Redis键
-        data: 要缓存的数据(将被pickle序列化)
+        data: 要缓存的数据(JSON兼容，由缓存编解码器序列化)
         expire_seconds: 过期时间(秒)
+        use_local: 是否使用进程内L1缓存；频繁变化、需要跨进程强一致的数据应设为False
         
     Returns:
         bool: 缓存是否成功
@@ -47,92 +230,335 @@ def cache_data(key, data, expire_seconds=3600):
             logger.warning("Redis连接失败，无法缓存数据")
             return False
             
-        # 使用pickle序列化数据(支持任意Python对象)
-        pickled_data = pickle.dumps(data)
-        redis_conn.setex(key, expire_seconds, pickled_data)
+        use_local = _use_local(use_local)
+        encoded_data = _codec.encode(data)
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.setex(key, expire_seconds, encoded_data)
+        if use_local:
+            # 与写入同一次往返，通知其他worker丢弃旧的L1副本
+            _publish_invalidation(pipe, keys=[key])
+        replies = pipe.execute()
         
-        # 新增：验证缓存是否成功写入
-        verify_data = redis_conn.get(key)
-        if not verify_data:
-            logger.warning(f"数据缓存看似成功但立即检索失败: {key}")
+        # SETEX成功时服务器应答OK，以应答作为写入确认，无需再回读整个值
+        if not replies[0]:
+            logger.warning(f"Redis未确认缓存写入: {key}")
             return False
         
-        logger.debug(f"数据成功缓存到Redis: {key}, 过期时间{expire_seconds}秒, 数据大小约{len(pickled_data)/1024:.2f}KB")
+        if use_local:
+            _local_cache.set(key, data, _local_ttl(expire_seconds), len(encoded_data))
+        
+        logger.debug(f"数据成功缓存到Redis: {key}, 过期时间{expire_seconds}秒, 数据大小约{len(encoded_data)/1024:.2f}KB")
         return True
     except Exception as e:
         logger.error(f"缓存数据失败: {str(e)}")
         return False
 
-def get_cached_data(key):
+def get_cached_data(key, use_local=True):
     """
-    从Redis获取缓存的数据
+    获取缓存的数据，依次查询进程内L1缓存和Redis
     
     Args:
         key: Redis键
+        use_local: 是否使用进程内L1缓存
         
     Returns:
-        data: 缓存的数据，如果没有找到或出错则返回None
+        data: 缓存的数据，如果没有找到或出错则返回None。
+              L1命中时返回的是共享对象，调用方不应修改
     """
+    use_local = _use_local(use_local)
+    if use_local:
+        data = _local_cache.get(key)
+        if data is not None:
+            logger.debug(f"L1缓存命中: {key}")
+            return data
+    
     try:
         redis_conn = get_redis_connection()
         if not redis_conn:
             logger.warning("Redis连接失败，无法获取缓存数据")
             return None
             
-        cached_data = redis_conn.get(key)
+        if use_local:
+            # 同一次往返取回剩余TTL，保证L1条目不会比Redis中的活得更久
+            pipe = redis_conn.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            cached_data, ttl_ms = pipe.execute()
+        else:
+            cached_data, ttl_ms = redis_conn.get(key), None
+            
         if cached_data:
             try:
-                # 反序列化
-                data = pickle.loads(cached_data)
-                logger.debug(f"缓存命中: {key}, 数据大小约{len(cached_data)/1024:.2f}KB")
-                return data
-            except Exception as unpickle_error:
-                logger.error(f"反序列化缓存数据失败: {str(unpickle_error)}")
+                data = _codec.decode(cached_data)
+            except CacheFormatError as format_error:
+                # 旧格式(如pickle)或不支持的编码，删除后按未命中处理
+                logger.info(f"丢弃不兼容格式的缓存: {key}, {str(format_error)}")
+                redis_conn.delete(key)
+                _redis_stats["misses"] += 1
+                return None
+            except Exception as decode_error:
+                logger.error(f"反序列化缓存数据失败: {str(decode_error)}")
                 # 数据可能已损坏，删除它
                 redis_conn.delete(key)
+                _redis_stats["misses"] += 1
                 return None
+            _redis_stats["hits"] += 1
+            if use_local and ttl_ms and ttl_ms > 0:
+                _local_cache.set(key, data, _local_ttl(ttl_ms / 1000), len(cached_data))
+            logger.debug(f"缓存命中: {key}, 数据大小约{len(cached_data)/1024:.2f}KB")
+            return data
         else:
+            _redis_stats["misses"] += 1
             logger.debug(f"缓存未命中: {key}")
             return None
     except Exception as e:
+        _redis_stats["errors"] += 1
         logger.error(f"获取缓存数据失败: {str(e)}")
         return None
 
-def clear_cache_pattern(pattern):
+def cache_many(items, expire_seconds=3600, use_local=True):
     """
-    清除匹配指定模式的所有缓存
+    使用pipeline批量缓存多个键，一次往返完成写入
     
     Args:
-        pattern: 键模式，例如"stock:*"
+        items: {Redis键: 数据} 字典，数据由缓存编解码器序列化
+        expire_seconds: 过期时间(秒)，对所有键生效
+        use_local: 是否同步写入进程内L1缓存
         
     Returns:
-        int: 删除的键数量
+        int: 写入成功的键数量
     """
+    if not items:
+        return 0
     try:
         redis_conn = get_redis_connection()
         if not redis_conn:
+            logger.warning("Redis连接失败，无法批量缓存数据")
             return 0
             
-        # 获取匹配的键
-        keys = redis_conn.keys(pattern)
+        use_local = _use_local(use_local)
+        encoded_items = {key: _codec.encode(data) for key, data in items.items()}
+        pipe = redis_conn.pipeline(transaction=False)
+        for key, encoded_data in encoded_items.items():
+            pipe.setex(key, expire_seconds, encoded_data)
+        if use_local:
+            _publish_invalidation(pipe, keys=list(items))
+        replies = pipe.execute(raise_on_error=False)[:len(items)]
+        
+        # 以每条SETEX的应答作为写入确认
+        success = 0
+        for (key, data), reply in zip(items.items(), replies):
+            if reply is True:
+                success += 1
+                if use_local:
+                    _local_cache.set(key, data, _local_ttl(expire_seconds), len(encoded_items[key]))
+        if success < len(items):
+            logger.warning(f"批量缓存部分失败: 成功{success}/{len(items)}")
+        else:
+            logger.debug(f"批量缓存成功: {success}个键, 过期时间{expire_seconds}秒")
+        return success
+    except Exception as e:
+        logger.error(f"批量缓存数据失败: {str(e)}")
+        return 0
+
+def get_many(keys, use_local=True):
+    """
+    批量获取多个缓存键：先查L1，剩余的键用一次MGET从Redis读取
+    
+    Args:
+        keys: Redis键列表
+        use_local: 是否使用进程内L1缓存
+        
+    Returns:
+        dict: {Redis键: 数据}，只包含命中的键；出错时返回已命中的部分
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+        
+    use_local = _use_local(use_local)
+    result = {}
+    if use_local:
+        for key in keys:
+            data = _local_cache.get(key)
+            if data is not None:
+                result[key] = data
+        keys = [key for key in keys if key not in result]
         if not keys:
+            return result
+    
+    try:
+        redis_conn = get_redis_connection()
+        if not redis_conn:
+            logger.warning("Redis连接失败，无法批量获取缓存数据")
+            return result
+            
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.mget(keys)
+        if use_local:
+            for key in keys:
+                pipe.pttl(key)
+        replies = pipe.execute()
+        values, ttls = replies[0], replies[1:] or [None] * len(keys)
+        
+        corrupted = []
+        for key, cached_data, ttl_ms in zip(keys, values, ttls):
+            if cached_data is None:
+                _redis_stats["misses"] += 1
+                continue
+            try:
+                data = _codec.decode(cached_data)
+            except Exception as decode_error:
+                # 旧格式或已损坏的数据，稍后统一删除
+                logger.info(f"丢弃无法解码的缓存: {key}, {str(decode_error)}")
+                corrupted.append(key)
+                _redis_stats["misses"] += 1
+                continue
+            _redis_stats["hits"] += 1
+            result[key] = data
+            if use_local and ttl_ms and ttl_ms > 0:
+                _local_cache.set(key, data, _local_ttl(ttl_ms / 1000), len(cached_data))
+                
+        if corrupted:
+            redis_conn.delete(*corrupted)
+            
+        logger.debug(f"批量获取缓存: 命中{len(result)}/{len(keys)}")
+        return result
+    except Exception as e:
+        _redis_stats["errors"] += 1
+        logger.error(f"批量获取缓存数据失败: {str(e)}")
+        return result
+
+def _namespace_version_key(namespace):
+    return f"ns:{namespace}:ver"
+
+def get_namespace_version(namespace):
+    """
+    获取缓存命名空间的当前版本号
+    
+    版本号嵌入该命名空间下的缓存键中，递增版本号即可让所有旧键失效（旧键随TTL自然过期），
+    无需扫描键空间。版本号同样缓存在L1中，递增时通过失效广播通知所有worker。
+    
+    Args:
+        namespace: 命名空间，例如"stock:news:600000"
+        
+    Returns:
+        int: 版本号，从未递增过或出错时返回0
+    """
+    version_key = _namespace_version_key(namespace)
+    use_local = _use_local(True)
+    if use_local:
+        version = _local_cache.get(version_key)
+        if version is not None:
+            return version
+    try:
+        redis_conn = get_redis_connection()
+        if not redis_conn:
+            return 0
+        raw_version = redis_conn.get(version_key)
+        version = int(raw_version) if raw_version else 0
+        if use_local:
+            _local_cache.set(version_key, version, LOCAL_CACHE_MAX_TTL, len(version_key))
+        return version
+    except Exception as e:
+        logger.error(f"获取命名空间'{namespace}'版本号失败: {str(e)}")
+        return 0
+
+def bump_namespace_version(namespace):
+    """
+    递增缓存命名空间的版本号，使该命名空间下的所有缓存键失效，复杂度O(1)
+    
+    Args:
+        namespace: 命名空间
+        
+    Returns:
+        int: 新的版本号，出错时返回None
+    """
+    version_key = _namespace_version_key(namespace)
+    _local_cache.delete(version_key)
+    try:
+        redis_conn = get_redis_connection()
+        if not redis_conn:
+            return None
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.incr(version_key)
+        if LOCAL_CACHE_ENABLED:
+            _publish_invalidation(pipe, keys=[version_key])
+        version = pipe.execute()[0]
+        logger.debug(f"命名空间'{namespace}'版本号已递增至{version}")
+        return version
+    except Exception as e:
+        logger.error(f"递增命名空间'{namespace}'版本号失败: {str(e)}")
+        return None
+
+def clear_cache_pattern(pattern):
+    """
+    清除匹配指定模式的所有缓存，并通知所有worker清除L1中的对应条目
+    
+    使用SCAN分批遍历，不会像KEYS一样阻塞Redis，但仍需遍历整个键空间，
+    只适合运维等低频操作；热路径上的失效请使用 bump_namespace_version
+    
+    Args:
+        pattern: 键模式，例如"stock:*"
+        
+    Returns:
+        int: 删除的Redis键数量
+    """
+    if LOCAL_CACHE_ENABLED:
+        _local_cache.delete_pattern(pattern)
+    try:
+        redis_conn = get_redis_connection()
+        if not redis_conn:
             return 0
             
-        # 删除这些键
-        deleted = redis_conn.delete(*keys)
+        if LOCAL_CACHE_ENABLED:
+            _publish_invalidation(redis_conn, pattern=pattern)
+            
+        deleted = 0
+        batch = []
+        for key in redis_conn.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += redis_conn.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += redis_conn.unlink(*batch)
         logger.info(f"已清除{deleted}个匹配'{pattern}'的缓存键")
         return deleted
     except Exception as e:
         logger.error(f"清除缓存模式'{pattern}'失败: {str(e)}")
         return 0
 
-def redis_cache(prefix, expire_seconds=3600):
+def get_cache_stats():
     """
-    Redis缓存装饰器
+    获取两级缓存的统计信息
+    
+    Returns:
+        dict: l1(进程内缓存)和l2(Redis)各自的命中/未命中次数与命中率，以及连接池状态和编解码配置
+    """
+    l2_total = _redis_stats["hits"] + _redis_stats["misses"]
+    return {
+        "l1": dict(_local_cache.stats(), enabled=LOCAL_CACHE_ENABLED),
+        "l2": dict(
+            _redis_stats,
+            hit_ratio=round(_redis_stats["hits"] / l2_total, 4) if l2_total else 0.0,
+        ),
+        "redis_pool": get_redis_pool_stats(),
+        "codec": {"serializer": _codec.serializer_name, "compression": _codec.compression_name},
+    }
+
+def redis_cache(prefix, expire_seconds=3600, vary_args=()):
+    """
+    Redis缓存装饰器（带进程内L1缓存）
+    
+    在Flask视图上使用时，只有 vary_args 中列出的查询参数会加入缓存键，
+    其他参数（如 ?_=时间戳 之类的防缓存参数）被忽略，不会产生新的缓存键；
+    返回Response时只缓存状态码为200的JSON响应体，命中时返回该JSON数据。
     
     Args:
         prefix: 缓存键前缀
         expire_seconds: 缓存过期时间(秒)
+        vary_args: 视图实际读取、会影响结果的查询参数名
     
     Returns:
         装饰器函数
@@ -159,6 +585,12 @@ def redis_cache(prefix, expire_seconds=3600):
                 else:
                     # 复杂对象使用其ID或哈希
                     key_parts.append(f"{k}={id(v)}")
+                    
+            # 添加视图读取的查询参数(按字母排序确保一致性)，避免不同参数共用一份缓存
+            if has_request_context():
+                for k in sorted(vary_args):
+                    if k in request.args:
+                        key_parts.append(f"{k}={request.args.get(k)}")
                 
             cache_key = ":".join(key_parts)
             
@@ -172,9 +604,17 @@ def redis_cache(prefix, expire_seconds=3600):
             logger.debug(f"缓存未命中，执行原始函数: {cache_key}")
             result = func(*args, **kwargs)
             
+            # 确定需要缓存的数据：Response只缓存成功的JSON响应体，错误响应(含状态码元组)不缓存
+            if isinstance(result, Response):
+                to_cache = result.get_json() if result.status_code == 200 and result.is_json else None
+            elif isinstance(result, tuple):
+                to_cache = None
+            else:
+                to_cache = result
+            
             # 缓存结果
-            if result is not None:  # 只缓存非None结果
-                success = cache_data(cache_key, result, expire_seconds)
+            if to_cache is not None:  # 只缓存非None结果
+                success = cache_data(cache_key, to_cache, expire_seconds)
                 if success:
                     logger.debug(f"结果已缓存: {cache_key}, 过期时间: {expire_seconds}秒")
                 else:
@@ -184,6 +624,157 @@ def redis_cache(prefix, expire_seconds=3600):
         return wrapper
     return decorator
 
+def _acquire_compute_lock(redis_conn, key, lock_seconds):
+    """
+    获取重算锁(SET NX PX)，同一时刻只有一个worker重算某个键
+
+    Returns:
+        Lock: 获取成功返回锁对象，否则返回None
+    """
+    # thread_local=False: 锁可能在后台刷新线程中释放
+    lock = redis_conn.lock(f"lock:{key}", timeout=lock_seconds, blocking=False, thread_local=False)
+    try:
+        return lock if lock.acquire() else None
+    except Exception as e:
+        logger.warning(f"获取重算锁失败: {key}, {str(e)}")
+        return None
+
+def _release_compute_lock(lock, key):
+    if lock is None:
+        return
+    try:
+        lock.release()
+    except Exception as e:
+        # 锁已超时被他人持有或已过期，忽略
+        logger.debug(f"释放重算锁失败: {key}, {str(e)}")
+
+def _pack_entry(payload, fresh_until):
+    """默认的缓存条目格式：数据与软过期时间"""
+    return {"data": payload, "fresh_until": fresh_until}
+
+def _unpack_entry(entry):
+    """解析缓存条目，未命中或格式不符（如旧格式数据）时返回None"""
+    if isinstance(entry, dict) and "fresh_until" in entry:
+        return entry["data"], entry["fresh_until"]
+    return None
+
+def _compute_and_store(key, compute, expire_seconds, stale_seconds, pack, unpack):
+    """
+    执行计算，成功(状态码200)时写入带软过期时间的缓存
+
+    成功时返回的数据与命中缓存时一致（经过pack/unpack），失败时原样返回计算结果
+    """
+    result = compute()
+    payload, status = result[:2]
+    if len(result) > 2:
+        # 计算函数可以按结果指定过期时间
+        expire_seconds = result[2]
+    if status == 200 and payload is not None:
+        entry = pack(payload, time.time() + expire_seconds)
+        cache_data(key, entry, expire_seconds + stale_seconds)
+        payload = unpack(entry)[0]
+    return payload, status
+
+def _refresh_in_background(key, compute, expire_seconds, stale_seconds, pack, unpack, lock):
+    """在后台线程中重算并释放锁，计算在应用上下文中执行"""
+    flask_app = app._get_current_object()
+
+    def run():
+        try:
+            with flask_app.app_context():
+                _compute_and_store(key, compute, expire_seconds, stale_seconds, pack, unpack)
+            logger.debug(f"后台刷新完成: {key}")
+        except Exception as e:
+            logger.error(f"后台刷新失败: {key}, {str(e)}", exc_info=True)
+        finally:
+            _release_compute_lock(lock, key)
+
+    threading.Thread(target=run, name=f"cache-refresh:{key}", daemon=True).start()
+
+def get_cached_entry(key, unpack=_unpack_entry):
+    """
+    读取 get_or_compute 写入的缓存条目，不触发计算
+
+    Args:
+        key: Redis键
+        unpack: 与写入时使用的pack对应的解析函数
+
+    Returns:
+        tuple: (数据, 是否未过软过期时间)，未命中时返回None
+    """
+    cached = unpack(get_cached_data(key))
+    if cached is None:
+        return None
+    payload, fresh_until = cached
+    return payload, time.time() < fresh_until
+
+def get_or_compute(key, compute, expire_seconds=3600, stale_seconds=CACHE_STALE_GRACE_SECONDS,
+                   lock_seconds=60, wait_seconds=10, force=False, pack=_pack_entry, unpack=_unpack_entry):
+    """
+    带防击穿保护的缓存读取（single-flight + stale-while-revalidate）
+
+    缓存值带有软过期时间，Redis中的硬过期时间再延长 stale_seconds 的宽限期：
+    - 未过软过期时间：直接返回缓存
+    - 处于宽限期内：立即返回旧值，由抢到重算锁的一个worker在后台重算
+    - 完全未命中：抢到锁的worker同步计算，其他worker等待其结果，
+      最多等待 wait_seconds 秒，超时后自行计算
+
+    Args:
+        key: Redis键
+        compute: 无参函数，返回 (数据, HTTP状态码) 或 (数据, HTTP状态码, 过期时间)，
+                 只有状态码为200时写入缓存。可能在后台线程中执行（只有应用上下文，没有请求上下文）
+        expire_seconds: 软过期时间(秒)
+        stale_seconds: 软过期后仍可返回旧值的宽限期(秒)
+        lock_seconds: 重算锁的超时时间(秒)，应大于一次计算的最长耗时
+        wait_seconds: 未命中且未抢到锁时等待其他worker结果的最长时间(秒)
+        force: 为True时跳过缓存读取，直接计算并更新缓存
+        pack: 将(数据, 软过期时间戳)打包为缓存值的函数
+        unpack: pack的逆操作，返回(数据, 软过期时间戳)，缓存值格式不符时返回None
+
+    Returns:
+        tuple: (数据, HTTP状态码)
+    """
+    redis_conn = get_redis_connection()
+    if not redis_conn:
+        payload, status = compute()[:2]
+        if status == 200 and payload is not None:
+            payload = unpack(pack(payload, time.time() + expire_seconds))[0]
+        return payload, status
+
+    if force:
+        lock = _acquire_compute_lock(redis_conn, key, lock_seconds)
+        try:
+            return _compute_and_store(key, compute, expire_seconds, stale_seconds, pack, unpack)
+        finally:
+            _release_compute_lock(lock, key)
+
+    cached = unpack(get_cached_data(key))
+    if cached is not None:
+        payload, fresh_until = cached
+        if time.time() < fresh_until:
+            return payload, 200
+        # 已过软过期时间但仍在宽限期内：返回旧值，只有抢到锁的worker触发后台重算
+        lock = _acquire_compute_lock(redis_conn, key, lock_seconds)
+        if lock is not None:
+            logger.debug(f"缓存已过期，后台刷新并返回旧值: {key}")
+            _refresh_in_background(key, compute, expire_seconds, stale_seconds, pack, unpack, lock)
+        return payload, 200
+
+    lock = _acquire_compute_lock(redis_conn, key, lock_seconds)
+    if lock is None:
+        # 其他worker正在计算，等待其写入结果
+        deadline = time.monotonic() + wait_seconds
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            cached = unpack(get_cached_data(key, use_local=False))
+            if cached is not None:
+                return cached[0], 200
+        logger.warning(f"等待其他worker计算超时，自行计算: {key}")
+    try:
+        return _compute_and_store(key, compute, expire_seconds, stale_seconds, pack, unpack)
+    finally:
+        _release_compute_lock(lock, key)
+
 def save_scan_login_state(scan_id, state_data, expire_seconds=300):
     """
     保存扫码登录状态到Redis
@@ -198,7 +789,16 @@ def save_scan_login_state(scan_id, state_data, expire_seconds=300):
     """
     try:
         key = f"scan_login:{scan_id}"
-        return cache_data(key, state_data, expire_seconds)
+        # 扫码状态会被不同worker轮询和更新，不使用进程内L1缓存
+        if not cache_data(key, state_data, expire_seconds, use_local=False):
+            return False
+        # 记录到索引集合，集合本身的过期时间随最新写入的状态顺延
+        redis_conn = get_redis_connection()
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.sadd(SCAN_LOGIN_INDEX_KEY, scan_id)
+        pipe.expire(SCAN_LOGIN_INDEX_KEY, expire_seconds)
+        pipe.execute()
+        return True
     except Exception as e:
         logger.error(f"保存扫码登录状态失败: {str(e)}")
         return False
@@ -215,7 +815,7 @@ def get_scan_login_state(scan_id):
     """
     try:
         key = f"scan_login:{scan_id}"
-        return get_cached_data(key)
+        return get_cached_data(key, use_local=False)
     except Exception as e:
         logger.error(f"获取扫码登录状态失败: {str(e)}")
         return None
@@ -250,7 +850,10 @@ def delete_scan_login_state(scan_id):
             return False
             
         key = f"scan_login:{scan_id}"
-        deleted = redis_conn.delete(key)
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.srem(SCAN_LOGIN_INDEX_KEY, scan_id)
+        deleted = pipe.execute()[0]
         return deleted > 0
     except Exception as e:
         logger.error(f"删除扫码登录状态失败: {str(e)}")
@@ -268,15 +871,24 @@ def list_all_scan_states():
         if not redis_conn:
             return {}
             
-        pattern = "scan_login:*"
-        keys = redis_conn.keys(pattern)
+        # 从索引集合取出扫码ID，一次MGET取回所有状态
+        scan_ids = [scan_id.decode('utf-8') for scan_id in redis_conn.smembers(SCAN_LOGIN_INDEX_KEY)]
+        if not scan_ids:
+            return {}
+        states = get_many([f"scan_login:{scan_id}" for scan_id in scan_ids], use_local=False)
         
         result = {}
-        for key in keys:
-            scan_id = key.decode('utf-8').split(':', 1)[1]
-            state = get_scan_login_state(scan_id)
+        expired_ids = []
+        for scan_id in scan_ids:
+            state = states.get(f"scan_login:{scan_id}")
             if state:
                 result[scan_id] = state
+            else:
+                expired_ids.append(scan_id)
+                
+        # 状态键已过期的ID从索引中移除
+        if expired_ids:
+            redis_conn.srem(SCAN_LOGIN_INDEX_KEY, *expired_ids)
                 
         return result
     except Exception as e:
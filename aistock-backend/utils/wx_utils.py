@@ -2,10 +2,10 @@ from flask import current_app as app
 import requests
 import time
 import json
-import redis
 import os
 import urllib.parse
 from datetime import datetime
+from utils.redis_cache import get_redis_connection
 
 # 获取带缓存的微信 access_token
 def get_wechat_access_token(force_refresh=True):
@@ -19,13 +19,11 @@ def get_wechat_access_token(force_refresh=True):
         access_token: 微信 access_token
     """
     try:
-        # 获取 Redis 连接
-        redis_url = app.config.get("REDIS_BROKER_URL") or os.getenv("REDIS_BROKER_URL")
-        if not redis_url:
-            app.logger.error("[WECHAT] Redis连接配置未找到，无法缓存access_token")
+        # 获取共享的 Redis 连接
+        redis_conn = get_redis_connection()
+        if not redis_conn:
+            app.logger.error("[WECHAT] Redis连接不可用，无法缓存access_token")
             return _request_new_access_token()  # 无法缓存时直接请求
-            
-        redis_conn = redis.Redis.from_url(redis_url)
         
         # 定义Redis中存储 access_token 的键名
         access_token_key = "wechat:access_token"
@@ -193,13 +191,11 @@ def get_wechat_jsapi_ticket(force_refresh=False):
         jsapi_ticket: 微信 jsapi_ticket
     """
     try:
-        # 获取 Redis 连接
-        redis_url = app.config.get("REDIS_BROKER_URL") or os.getenv("REDIS_BROKER_URL")
-        if not redis_url:
-            app.logger.error("[WECHAT] Redis连接配置未找到，无法缓存jsapi_ticket")
+        # 获取共享的 Redis 连接
+        redis_conn = get_redis_connection()
+        if not redis_conn:
+            app.logger.error("[WECHAT] Redis连接不可用，无法缓存jsapi_ticket")
             return _request_new_jsapi_ticket()  # 无法缓存时直接请求
-            
-        redis_conn = redis.Redis.from_url(redis_url)
         
         # 定义Redis中存储 jsapi_ticket 的键名
         jsapi_ticket_key = "wechat:jsapi_ticket"
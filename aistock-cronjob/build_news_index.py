@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+新闻向量索引构建任务
+功能：把 news_embeddings 表中的嵌入同步到本地 HNSW 索引（NEWS_INDEX_DIR），供后端相似新闻与语义搜索使用
+
+用法:
+    python build_news_index.py              # 增量同步（get_news.py 每轮结束时也会执行）
+    python build_news_index.py --rebuild    # 全量重建，回收已删除新闻占用的位置
+    python build_news_index.py --model xxx  # 指定嵌入模型，默认 EMBEDDING_MODEL
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from dotenv import load_dotenv
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# 加载环境变量
+load_dotenv(override=True)
+
+from utils.news_index import sync_news_index, NEWS_INDEX_DIR
+
+
+def main():
+    """主函数：同步或重建新闻向量索引"""
+    parser = argparse.ArgumentParser(description="构建新闻嵌入的本地向量索引")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有索引，全量重建")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL"), help="嵌入模型，默认取 EMBEDDING_MODEL")
+    args = parser.parse_args()
+
+    if not args.model:
+        print("❌ 未指定嵌入模型（--model 或 EMBEDDING_MODEL）")
+        return 1
+
+    print(f"🧭 新闻向量索引{'重建' if args.rebuild else '同步'}开始: 模型 {args.model}，目录 {NEWS_INDEX_DIR}")
+    print("=" * 50)
+    start_time = datetime.now()
+
+    try:
+        result = sync_news_index(args.model, rebuild=args.rebuild)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    if result is None:
+        return 1
+
+    print(f"{'=' * 50}")
+    print(f"🎉 完成，耗时 {(datetime.now() - start_time).total_seconds():.2f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    """脚本入口点"""
+    sys.exit(main())
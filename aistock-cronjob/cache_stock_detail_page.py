@@ -17,6 +17,7 @@ from utils.db import get_db_session
 from utils.model import UserStock, Stocks, News
 import utils.db as db
 from utils.save import save_news
+from utils.fetch_scheduler import FetchScheduler
 
 # 配置日志
 logging.basicConfig(
@@ -69,46 +70,44 @@ def fetch_stock_news():
         'Content-Type': 'application/json'
     }
     
-    # 循环遍历每个股票代码
-    for stock_code in watched_stocks:
-        stock_success = 0
-        stock_fail = 0
-        
-        # 访问每个API接口
-        for api_template in api_urls:
-            try:
-                url = api_template.format(code=stock_code)
-                logger.info(f"正在访问股票 {stock_code} 的API: {url}")
-                
-                response = requests.get(url, headers=headers, timeout=10)
-                
-                if response.status_code == 200:
-                    logger.info(f"成功访问股票 {stock_code} API，状态码: {response.status_code}")
-                    stock_success += 1
-                else:
-                    logger.warning(f"访问股票 {stock_code} API失败，状态码: {response.status_code}")
-                    stock_fail += 1
-                    
-            except requests.exceptions.RequestException as e:
-                logger.error(f"访问股票 {stock_code} API时发生错误: {str(e)}")
-                stock_fail += 1
-            except Exception as e:
-                logger.error(f"处理股票 {stock_code} API时发生未知错误: {str(e)}")
-                stock_fail += 1
-                
-            # API之间的小延时
-            time.sleep(0.2)
-        
-        # 统计该股票的结果
-        if stock_success == len(api_urls):
+    session = requests.Session()
+    session.headers.update(headers)
+
+    def warm_up(task):
+        """访问一个API，5xx 视为失败由调度器重试，其他状态码直接返回"""
+        stock_code, url = task
+        logger.info(f"正在访问股票 {stock_code} 的API: {url}")
+        response = session.get(url, timeout=10)
+        if response.status_code >= 500:
+            raise requests.exceptions.HTTPError(f"状态码: {response.status_code}")
+        return response.status_code
+
+    tasks = [
+        (stock_code, api_template.format(code=stock_code))
+        for stock_code in watched_stocks
+        for api_template in api_urls
+    ]
+    stock_success = {stock_code: 0 for stock_code in watched_stocks}
+
+    # 并发访问所有接口，按后端API的限速放行请求
+    with FetchScheduler() as scheduler:
+        for (stock_code, url), status_code, error in scheduler.map("aistock", warm_up, tasks):
+            if error:
+                logger.error(f"访问股票 {stock_code} API时发生错误: {str(error)}")
+            elif status_code == 200:
+                logger.info(f"成功访问股票 {stock_code} API，状态码: {status_code}")
+                stock_success[stock_code] += 1
+            else:
+                logger.warning(f"访问股票 {stock_code} API失败，状态码: {status_code}")
+    session.close()
+
+    # 统计每个股票的结果
+    for stock_code, count in stock_success.items():
+        if count == len(api_urls):
             success_count += 1
         else:
             fail_count += 1
-            
-        logger.info(f"股票 {stock_code} 完成: 成功 {stock_success}/{len(api_urls)} 个API")
-        
-        # 添加延时，避免请求过于频繁
-        time.sleep(random.uniform(1, 2))
+        logger.info(f"股票 {stock_code} 完成: 成功 {count}/{len(api_urls)} 个API")
 
     print(f"股票API请求完成：成功 {success_count} 个股票，失败 {fail_count} 个股票")
     return success_count, fail_count
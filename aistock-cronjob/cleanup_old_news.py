@@ -17,6 +17,8 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from utils.db import SessionLocal
 from utils.model import News, NewsEmbedding, NewsTagRelation, NewsSummary, PushNewsRelation
+from utils.news_index import remove_from_news_index
+from utils.llm_memo import cleanup_expired_memos, get_memo_totals
 
 # 加载环境变量
 load_dotenv(override=True)
@@ -119,6 +121,11 @@ def cleanup_old_news(days_to_keep=30):
         
         # 提交所有删除操作
         session.commit()
+
+        # 4. 从向量索引中删除已清理的新闻
+        index_removed = remove_from_news_index(old_news_ids)
+        if index_removed:
+            print(f"🗑️  清理向量索引: {index_removed} 条")
         
         # 输出清理结果统计
         total_deleted = sum(result["deleted_counts"].values())
@@ -160,10 +167,11 @@ def cleanup_orphaned_data():
         
         orphaned_counts = {}
         
-        # 1. 清理孤立的嵌入向量
-        orphaned_embeddings = session.query(NewsEmbedding).filter(
+        # 1. 清理孤立的嵌入向量（同时从向量索引中删除）
+        orphaned_embedding_ids = [row.news_id for row in session.query(NewsEmbedding.news_id).filter(
             ~NewsEmbedding.news_id.in_(session.query(News.id))
-        ).count()
+        ).all()]
+        orphaned_embeddings = len(orphaned_embedding_ids)
         if orphaned_embeddings > 0:
             session.query(NewsEmbedding).filter(
                 ~NewsEmbedding.news_id.in_(session.query(News.id))
@@ -205,6 +213,7 @@ def cleanup_orphaned_data():
         orphaned_counts["push_relations"] = orphaned_push_relations
         
         session.commit()
+        remove_from_news_index(orphaned_embedding_ids)
         
         total_orphaned = sum(orphaned_counts.values())
         if total_orphaned > 0:
@@ -303,11 +312,19 @@ def main():
     # 4. 清理孤立数据
     orphaned_result = cleanup_orphaned_data()
     
-    # 5. 显示清理后的统计信息
+    # 5. 清理过期的大模型记忆
+    memo_deleted = cleanup_expired_memos()
+    print(f"🗑️  清理过期大模型记忆: {memo_deleted} 条")
+    memo_totals = get_memo_totals()
+    if memo_totals:
+        print(f"🧠 大模型记忆: {memo_totals['entries']:,} 条，累计避免调用 {memo_totals['calls_avoided']:,} 次，"
+              f"节省 {memo_totals['tokens_saved']:,} tokens")
+    
+    # 6. 显示清理后的统计信息
     print("\n📊 清理后数据统计:")
     get_news_statistics()
     
-    # 6. 输出任务总结
+    # 7. 输出任务总结
     end_time = datetime.now()
     duration = (end_time - start_time).total_seconds()
     
@@ -20,6 +20,13 @@ MAX_RETRIES = 3
 TIMEOUT = 10
 CONCURRENT_THREADS = 3
 
+# 复用HTTP连接，常驻进程（quote_daemon）中每次抓取不必重新建立连接
+_session = requests.Session()
+
+def close_session():
+    """关闭复用的HTTP会话（进程退出时调用）"""
+    _session.close()
+
 def get_market_indices():
     """获取市场指数数据并保存到数据库"""
     try:
@@ -272,7 +279,7 @@ def get_index_data(index_key):
             if attempt > 0:
                 time.sleep(random.uniform(1, 3))
             
-            response = requests.get(url, params=params, headers=headers, timeout=TIMEOUT)
+            response = _session.get(url, params=params, headers=headers, timeout=TIMEOUT)
             response.raise_for_status()
             
             json_data = response.json()
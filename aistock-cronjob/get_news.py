@@ -1,15 +1,21 @@
 # cronjob/get_hk_news.py
-# 爬取港美股新闻定时任务，顺序执行版本
+# 爬取港美股新闻定时任务，快讯按 爬取->标题->嵌入->去重->分析 流水线并发处理
 
 import os
 import re
+import json
 import time
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
 import requests
 import openai
 import numpy as np
-from utils.save import save_news, initialize_database, save_news_embeddings, get_recent_news_with_embeddings, check_content_hashes, save_news_tags
+from utils.save import save_news, initialize_database, save_news_embeddings, check_content_hashes, save_news_tags, get_cached_embeddings, save_cached_embeddings, get_recent_embeddings
+from utils.pipeline import StagedPipeline, Stage
+from utils.embedding_window import EmbeddingWindow
+from utils.news_index import sync_news_index
+from utils import llm_memo
+from utils.llm_client import ChatClient, LLMError, llm_stats
 from dotenv import load_dotenv
 import sys
 from bs4 import BeautifulSoup
@@ -25,18 +31,40 @@ load_dotenv(override=True)
 CREATE_TITLE_MODEL = os.getenv("CREATE_TITLE_MODEL")
 CREATE_TITLE_BASE_URL = os.getenv("CREATE_TITLE_BASE_URL")
 CREATE_TITLE_API_KEY = os.getenv("CREATE_TITLE_API_KEY")
+# 新闻分析提示词的版本（llm_memo 的键之一），修改 analyze_news_content 的提示词时需要递增
+NEWS_CONTENT_PROMPT_VERSION = "news_content:v1"
 
 # 嵌入API配置
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
 EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL")
 EMBEDDING_API_KEY = os.getenv("EMBEDDING_API_KEY")
+# 单条文本的token上限（超出时截断）
+EMBEDDING_MAX_TOKENS = 8192
+# 每次嵌入请求最多包含的文本条数与估算token总数
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 10))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 32000))
+# 流水线中嵌入阶段凑批的最长等待时间(秒)
+EMBEDDING_BATCH_WAIT = float(os.getenv("EMBEDDING_BATCH_WAIT", 0.3))
 
 # 去重参数
 SIM_THRESHOLD = float(os.getenv("SIM_THRESHOLD", 0.9))
-WINDOW_SIZE = int(os.getenv("WINDOW_SIZE", 5))
+# 去重窗口：同类别最近 WINDOW_SIZE 条、且在最近 WINDOW_HOURS 小时内的新闻（WINDOW_HOURS 为0时不限时间）
+WINDOW_SIZE = int(os.getenv("WINDOW_SIZE", 2000))
+WINDOW_HOURS = float(os.getenv("WINDOW_HOURS", 72))
+
+# 快讯处理流水线各阶段的并发数
+NEWS_CRAWL_WORKERS = int(os.getenv("NEWS_CRAWL_WORKERS", 8))
+NEWS_TITLE_WORKERS = int(os.getenv("NEWS_TITLE_WORKERS", 4))
+NEWS_EMBED_WORKERS = int(os.getenv("NEWS_EMBED_WORKERS", 4))
+NEWS_ANALYZE_WORKERS = int(os.getenv("NEWS_ANALYZE_WORKERS", 4))
+# 每次最多处理的快讯条数（接口单次返回20条）
+NEWS_ROLL_LIMIT = int(os.getenv("NEWS_ROLL_LIMIT", 5))
+# 每处理完成多少条新闻保存一次
+NEWS_COMMIT_BATCH = int(os.getenv("NEWS_COMMIT_BATCH", 10))
 
 # 初始化OpenAI客户端
-title_client = openai.OpenAI(api_key=CREATE_TITLE_API_KEY, base_url=CREATE_TITLE_BASE_URL)
+# 标题与内容分析走共享的大模型客户端（并发上限、退避重试、调用统计），嵌入仍直接使用SDK
+title_client = ChatClient(base_url=CREATE_TITLE_BASE_URL, api_key=CREATE_TITLE_API_KEY, default_model=CREATE_TITLE_MODEL)
 embedding_client = openai.OpenAI(api_key=EMBEDDING_API_KEY, base_url=EMBEDDING_BASE_URL)
 
 def generate_sign(ts: int, category: str) -> str:
@@ -47,52 +75,139 @@ def generate_sign(ts: int, category: str) -> str:
 def format_ts(ts: int) -> str:
     return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
 
-# 使用API进行嵌入函数
-def create_embedding(content: str, model: str = None):
+class EmbeddingStats:
+    """本次运行的嵌入缓存命中与token消耗统计（多个类别并行处理，需要加锁）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_used = 0
+        self.tokens_saved = 0
+
+    def record(self, hits=0, misses=0, tokens_saved=0, requests=0, tokens_used=0):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            self.tokens_saved += tokens_saved
+            self.requests += requests
+            self.tokens_used += tokens_used
+
+    def summary(self) -> str:
+        with self.lock:
+            total = self.hits + self.misses
+            hit_rate = self.hits / total * 100 if total else 0.0
+            return (f"嵌入缓存命中 {self.hits}/{total} ({hit_rate:.1f}%)，API请求 {self.requests} 次，"
+                    f"消耗约 {self.tokens_used} tokens，节省约 {self.tokens_saved} tokens")
+
+embedding_stats = EmbeddingStats()
+
+def _truncate_for_embedding(content: str) -> str:
+    """处理文本长度，避免超过模型限制"""
+    if len(content) > EMBEDDING_MAX_TOKENS * 3:  # 粗略估计：1个字符约占0.33个token
+        content = content[:int(EMBEDDING_MAX_TOKENS * 2.8)]  # 截断至约2.8倍token限制
+        print(f"⚠️ 文本过长，已截断至约{len(content)}字符")
+    return content
+
+def _estimate_tokens(text: str) -> int:
+    """估算文本的token数，中文约1字1token，按字符数保守估计"""
+    return max(1, len(text))
+
+def _request_embeddings(texts: List[str], model: str) -> List[Optional[np.ndarray]]:
     """
-    使用OpenAI API生成文本嵌入向量
+    一次请求为多条文本生成嵌入；批量请求失败时逐条重试，单条失败返回None
     """
-    if model is None:
-        model = EMBEDDING_MODEL
-        
     try:
-        # 处理文本长度，避免超过模型限制
-        max_tokens = 8192  # 设置一个保守的限制，低于8192的上限
-        
-        # 文本过长时进行截断处理
-        if len(content) > max_tokens * 3:  # 粗略估计：1个字符约占0.33个token           
-            content = content[:max_tokens*2.8]  # 截断至约2.5倍token限制
-            print(f"⚠️ 文本过长，已截断至约{len(content)}字符")
-        
-        # 直接调用同步API
-        response = embedding_client.embeddings.create(
-            input=content,
-            model=model
-        )
-        # 获取嵌入向量
-        embedding_vector = np.array(response.data[0].embedding)
-        return embedding_vector
+        response = embedding_client.embeddings.create(input=texts, model=model)
+        usage = getattr(response, 'usage', None)
+        tokens = getattr(usage, 'total_tokens', None) or sum(_estimate_tokens(t) for t in texts)
+        embedding_stats.record(requests=1, tokens_used=tokens)
+        # 按 index 对应回输入顺序
+        vectors = [None] * len(texts)
+        for item in response.data:
+            vectors[item.index] = np.array(item.embedding)
+        return vectors
     except Exception as e:
-        print(f"❗嵌入生成失败: {e}")
-        return None
+        embedding_stats.record(requests=1)
+        if len(texts) == 1:
+            print(f"❗嵌入生成失败: {e}")
+            return [None]
+        print(f"❗批量嵌入生成失败 ({len(texts)} 条): {e}，改为逐条请求")
+        return [_request_embeddings([text], model)[0] for text in texts]
+
+def _embedding_batches(texts: List[str]):
+    """按条数和估算token数把文本打包成批"""
+    batch, batch_tokens = [], 0
+    for text in texts:
+        tokens = _estimate_tokens(text)
+        if batch and (len(batch) >= EMBEDDING_BATCH_SIZE or batch_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        yield batch
 
-# 使用numpy计算余弦相似度
-def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
+def create_embeddings(contents: List[str], model: str = None) -> List[Optional[np.ndarray]]:
     """
-    计算两个向量之间的余弦相似度
+    批量生成文本嵌入向量
+    
+    - 先按 (模型, 内容哈希) 查询嵌入缓存，内容相同的文本不重复请求
+    - 未命中的文本按 EMBEDDING_BATCH_SIZE / EMBEDDING_BATCH_MAX_TOKENS 打包请求
+    - 新生成的向量写入缓存
+    
+    参数:
+    - contents: 文本列表
+    - model: 嵌入模型，默认 EMBEDDING_MODEL
+    
+    返回:
+    - 与 contents 一一对应的嵌入向量列表，失败的位置为None
     """
-    if a is None or b is None:
-        return 0.0
+    if model is None:
+        model = EMBEDDING_MODEL
+    if not contents:
+        return []
     
-    # 计算余弦相似度：点积 / (向量a的模 * 向量b的模)
-    dot_product = np.dot(a, b)
-    norm_a = np.linalg.norm(a)
-    norm_b = np.linalg.norm(b)
+    texts = [_truncate_for_embedding(content) for content in contents]
+    hashes = [content_hash(text) for text in texts]
+    cached = get_cached_embeddings(model, hashes)
     
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-        
-    return dot_product / (norm_a * norm_b)
+    # 未命中的文本，同一批内相同内容只请求一次
+    pending = {}
+    for text, hash_value in zip(texts, hashes):
+        if hash_value not in cached and hash_value not in pending:
+            pending[hash_value] = text
+    hits = len(texts) - sum(1 for hash_value in hashes if hash_value not in cached)
+    embedding_stats.record(
+        hits=hits,
+        misses=len(texts) - hits,
+        tokens_saved=sum(cached[hash_value][1] for hash_value in hashes if hash_value in cached)
+    )
+    
+    created = {}
+    pending_hashes = list(pending)
+    offset = 0
+    for batch in _embedding_batches(list(pending.values())):
+        for hash_value, vector in zip(pending_hashes[offset:offset + len(batch)], _request_embeddings(batch, model)):
+            if vector is not None:
+                created[hash_value] = vector
+        offset += len(batch)
+    
+    if created:
+        save_cached_embeddings(model, [
+            {'content_hash': hash_value, 'embedding_vector': vector, 'token_count': _estimate_tokens(pending[hash_value])}
+            for hash_value, vector in created.items()
+        ])
+    
+    return [cached[hash_value][0] if hash_value in cached else created.get(hash_value) for hash_value in hashes]
+
+# 使用API进行嵌入函数
+def create_embedding(content: str, model: str = None):
+    """
+    使用OpenAI API生成文本嵌入向量（单条，经过嵌入缓存）
+    """
+    return create_embeddings([content], model)[0]
 
 def extract_news_link(url_or_schema):
     """从各种格式的URL或schema中提取新闻链接"""
@@ -219,14 +334,11 @@ def create_title(content: str) -> tuple:
     # 使用AI生成标题
     prompt = f"你是一个财经新闻标题生成器，我将给你一条财经新闻的内容，请你生成一个简洁、有信息量的中文标题，突出金融要点，不超过25个汉字。注意只需要输出标题内容，无需其他任何多余信息，不需要使用任何符号包裹。以下是新闻内容\n{cleaned_content}"
     try:
-        # 直接调用同步API
-        resp = title_client.chat.completions.create(
-            model=CREATE_TITLE_MODEL,
-            messages=[{"role": "user", "content": prompt}],
+        title = title_client.chat(
+            [{"role": "user", "content": prompt}],
             temperature=0.2,
             max_tokens=64
         )
-        title = resp.choices[0].message.content.strip()
     except Exception as e:
         print(f"❗标题生成失败: {e}")
         traceback.print_exc()
@@ -262,26 +374,38 @@ def analyze_news_content(content, title=None, max_retries=3):
 无需使用```json```包裹，直接返回JSON
 positive_tags与negative_tags是互斥的，如果有positive_tags那negative_tags就应该为空"""
 
+    # 内容相同的新闻（如多个来源转载）直接复用上次的分析结果
+    memo = llm_memo.lookup(NEWS_CONTENT_PROMPT_VERSION, CREATE_TITLE_MODEL, full_text)
+    if memo is not None:
+        try:
+            result = json.loads(memo)
+            return {
+                'positive_tags': result.get('positive_tags', []),
+                'negative_tags': result.get('negative_tags', []),
+                'is_important': result.get('is_important', False),
+                'summary': result.get('summary', '')
+            }
+        except json.JSONDecodeError:
+            pass
+
     retries = 0
     while retries <= max_retries:
         try:
             # 每次重试时稍微调整温度参数
             temperature = 0.2 + (retries * 0.1)
             
-            # 直接调用同步API
-            resp = title_client.chat.completions.create(
-                model=CREATE_TITLE_MODEL,
-                messages=[{"role": "user", "content": prompt}],
+            result_text, usage = title_client.chat(
+                [{"role": "user", "content": prompt}],
                 temperature=temperature,
                 max_tokens=256,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                with_usage=True
             )
             
             # 解析JSON响应
-            result_text = resp.choices[0].message.content.strip()
             try:
-                import json
                 result = json.loads(result_text)
+                llm_memo.store(NEWS_CONTENT_PROMPT_VERSION, CREATE_TITLE_MODEL, full_text, result_text, usage)
                 # 确保所有字段存在
                 return {
                     'positive_tags': result.get('positive_tags', []),
@@ -299,6 +423,7 @@ positive_tags与negative_tags是互斥的，如果有positive_tags那negative_ta
                         json_str = match.group(1).strip()
                         print(f"🔍 从代码块中提取JSON: {json_str[:100]}...")
                         result = json.loads(json_str)
+                        llm_memo.store(NEWS_CONTENT_PROMPT_VERSION, CREATE_TITLE_MODEL, full_text, json_str, usage)
                         # 确保所有字段存在
                         return {
                             'positive_tags': result.get('positive_tags', []),
@@ -325,6 +450,15 @@ positive_tags与negative_tags是互斥的，如果有positive_tags那negative_ta
                         'is_important': False,
                         'summary': content[:50] + ('...' if len(content) > 50 else '')
                     }
+        except LLMError as e:
+            # 请求层面已经按退避策略重试过，不再重复
+            print(f"❗ 新闻内容分析失败: {e}")
+            return {
+                'positive_tags': [],
+                'negative_tags': [],
+                'is_important': False,
+                'summary': content[:50] + ('...' if len(content) > 50 else '')
+            }
         except Exception as e:
             if retries < max_retries:
                 retries += 1
@@ -342,6 +476,84 @@ positive_tags与negative_tags是互斥的，如果有positive_tags那negative_ta
                     'summary': content[:50] + ('...' if len(content) > 50 else '')
                 }
 
+def load_embedding_window(code: str) -> EmbeddingWindow:
+    """
+    加载同类别近期新闻的嵌入窗口，窗口内缺少嵌入的新闻先补算并保存
+    """
+    since = datetime.now() - timedelta(hours=WINDOW_HOURS) if WINDOW_HOURS > 0 else None
+    print(f"🔍 正在加载 {code} 类别的最近 {WINDOW_SIZE} 条新闻" + (f"（{WINDOW_HOURS:g} 小时内）" if since else ""))
+    embedded, news_without_embeddings = get_recent_embeddings(EMBEDDING_MODEL, code, limit=WINDOW_SIZE, since=since)
+    print(f"📊 已找到 {len(embedded)} 条带嵌入的新闻和 {len(news_without_embeddings)} 条无嵌入的新闻")
+    
+    # 为没有嵌入的新闻批量计算嵌入
+    if news_without_embeddings:
+        print(f"🔄 正在为 {len(news_without_embeddings)} 条新闻计算嵌入")
+        
+        embeddings_to_save = []
+        embs = create_embeddings([news['content'] for news in news_without_embeddings], EMBEDDING_MODEL)
+        for news, emb in zip(news_without_embeddings, embs):
+            if emb is not None:
+                embedded.append((news['id'], emb))
+                embeddings_to_save.append({
+                    'news_id': news['id'],
+                    'embedding_vector': emb,
+                    'model_name': EMBEDDING_MODEL
+                })
+        
+        # 保存新计算的嵌入
+        if embeddings_to_save:
+            save_news_embeddings(embeddings_to_save)
+    
+    return EmbeddingWindow([news_id for news_id, _ in embedded], [emb for _, emb in embedded])
+
+def save_news_batch(batch: List[Dict]):
+    """
+    保存一批流水线处理完成的新闻，以及对应的嵌入和标签
+    
+    参数:
+    - batch: 流水线输出，包含 record（待保存的新闻）、emb（嵌入）、duplicate_of（重复的旧新闻ID）、tag_info（AI分析结果）
+    """
+    # 保存新闻内容并获取结果（包含新闻ID）
+    saved_results = save_news([task['record'] for task in batch])
+    if not saved_results:
+        return
+    
+    # 新增新闻按内容对应到新闻ID
+    new_ids = {
+        info['content']: news_id for news_id, info in saved_results.items()
+        if info.get('is_new') and not info.get('skipped') and not info.get('existing')
+    }
+    
+    news_embeddings = []
+    news_tags = []
+    for task in batch:
+        if task.get('duplicate_of') is not None:
+            # 更新的新闻：跳过的记录不更新嵌入
+            news_id = task['duplicate_of']
+            if saved_results.get(news_id, {}).get('skipped'):
+                continue
+        else:
+            news_id = new_ids.get(task['record']['content'])
+            if news_id is None:
+                continue
+            if task.get('tag_info'):
+                news_tags.append({**task['tag_info'], 'news_id': news_id})
+        news_embeddings.append({
+            'news_id': news_id,
+            'embedding_vector': task['emb'],
+            'model_name': EMBEDDING_MODEL
+        })
+    
+    # 保存所有嵌入（新增和更新）
+    if news_embeddings:
+        print(f"🔄 正在保存 {len(news_embeddings)} 条新闻嵌入")
+        save_news_embeddings(news_embeddings)
+    
+    # 保存标签信息
+    if news_tags:
+        print(f"🔖 正在为 {len(news_tags)} 条新闻保存标签和摘要")
+        save_news_tags(news_tags)
+
 def fetch_and_process(category: str = "hk_us"):
     ts = int(time.time())
     sign = generate_sign(ts, category)
@@ -385,7 +597,7 @@ def fetch_and_process(category: str = "hk_us"):
             return
 
         raw_list = data["data"]["roll_data"]
-        raw_list = raw_list[:5]  # 限制为20条新闻
+        raw_list = raw_list[:NEWS_ROLL_LIMIT]  # 每次最多处理的快讯条数
 
         # 确定当前新闻类别
         code = "cn" if category == "watch" else category
@@ -419,164 +631,111 @@ def fetch_and_process(category: str = "hk_us"):
         
         log_verbose(f"处理 {len(items_to_process)} 条新闻...")
         
-        # 仅获取相同类别的最近新闻用于比较
-        window_size = int(os.getenv("WINDOW_SIZE", 5))  # 从环境变量读取窗口大小，默认为5
-        print(f"🔍 正在加载 {code} 类别的最近 {window_size} 条新闻")
-        
-        existing_news = get_recent_news_with_embeddings(EMBEDDING_MODEL, code, limit=window_size)
-        
-        # 提取已有的嵌入向量
-        existing_embeddings = []
-        news_without_embeddings = []
-        
-        for news in existing_news:
-            if news['embedding'] is not None:
-                existing_embeddings.append((news['id'], news['embedding']))
-            else:
-                news_without_embeddings.append(news)
-        
-        print(f"📊 已找到 {len(existing_embeddings)} 条带嵌入的新闻和 {len(news_without_embeddings)} 条无嵌入的新闻")
-        
-        # 为没有嵌入的新闻顺序计算嵌入
-        if news_without_embeddings:
-            print(f"🔄 正在为 {len(news_without_embeddings)} 条新闻顺序计算嵌入")
-            
-            embeddings_to_save = []
-            for news in news_without_embeddings:
-                emb = create_embedding(news['content'], EMBEDDING_MODEL)
-                if emb is not None:
-                    existing_embeddings.append((news['id'], emb))
-                    embeddings_to_save.append({
-                        'news_id': news['id'],
-                        'embedding_vector': emb,
-                        'model_name': EMBEDDING_MODEL
-                    })
-            
-            # 保存新计算的嵌入
-            if embeddings_to_save:
-                save_news_embeddings(embeddings_to_save)
+        # 仅获取相同类别的近期新闻用于比较
+        window = load_embedding_window(code)
 
-        # 顺序爬取内容和生成标题
-        formatted_news = []
-        embeddings_to_save = []
         new_count = 0
         duplicate_count = 0
-        
-        for idx, (news, cleaned) in enumerate(items_to_process, 1):
-            # 爬取内容
-            link = extract_news_link(news.get("shareurl", ""))
-            if link:
-                summary, full_content = crawl_content(link)
+
+        # 流水线各阶段：爬取 -> 标题 -> 嵌入 -> 去重 -> AI分析，各阶段并发且同时进行
+        def crawl_stage(task):
+            task['link'] = extract_news_link(task['news'].get("shareurl", ""))
+            if task['link']:
+                summary, full_content = crawl_content(task['link'])
                 if full_content:
-                    cleaned = full_content
-            
-            # 生成标题
-            title, cleaned_content = create_title(cleaned)
-            
-            # 计算嵌入
-            print(f"🔄 正在为第 {idx} 条新闻计算嵌入")
-            emb = create_embedding(cleaned_content, EMBEDDING_MODEL)
-            
-            if emb is None:
-                continue
+                    task['cleaned'] = full_content
+            return task
 
-            # 检查是否与最近的新闻重复
-            is_duplicate = False
-            for news_id, old_emb in existing_embeddings:
-                if cosine_sim(emb, old_emb) >= SIM_THRESHOLD:
-                    print(f"🔄 发现重复新闻 (ID: {news_id}): {title}")
-                    print(f"   📎 链接: {link}")
-                    # 找到对应新闻对象
-                    old_news = next((n for n in existing_news if n['id'] == news_id), None)
-                    if old_news:
-                        # 更新旧新闻
-                        old_news["title"] = title
-                        old_news["content"] = cleaned_content
-                        old_news["ctime"] = format_ts(news.get("ctime", 0))
-                        old_news["link"] = link
-                        formatted_news.append(old_news)
-                        
-                        # 更新嵌入
-                        embeddings_to_save.append({
-                            'news_id': news_id,
-                            'embedding_vector': emb,
-                            'model_name': EMBEDDING_MODEL
-                        })
-                    is_duplicate = True
+        def title_stage(task):
+            task['title'], task['content'] = create_title(task['cleaned'])
+            return task
+
+        def embed_stage(batch):
+            # 多条新闻合并为一次嵌入请求
+            print(f"🔄 正在为第 {', '.join(str(task['idx']) for task in batch)} 条新闻计算嵌入")
+            embs = create_embeddings([task['content'] for task in batch], EMBEDDING_MODEL)
+            for task, emb in zip(batch, embs):
+                task['emb'] = emb
+            # 嵌入失败的新闻丢弃
+            return [task if task['emb'] is not None else None for task in batch]
+
+        def dedup_stage(batch):
+            # 单线程执行，new_count/duplicate_count 不需要加锁；
+            # 一批新闻与窗口及彼此之间的相似度由一次矩阵乘法得到，不重复的新闻加入窗口
+            nonlocal new_count, duplicate_count
+            matches = window.find_duplicates([task['emb'] for task in batch], SIM_THRESHOLD)
+            results = []
+            for task, match in zip(batch, matches):
+                news, title, link = task['news'], task['title'], task['link']
+                ctime = format_ts(news.get("ctime", 0))
+                
+                if match is not None:
+                    news_id, score = match
                     duplicate_count += 1
-                    break
+                    if news_id is None:
+                        # 与本次抓取中先处理的新闻重复，直接丢弃
+                        print(f"🔄 发现本批次内的重复新闻 (相似度 {score:.3f}): {title}")
+                        results.append(None)
+                        continue
+                    print(f"🔄 发现重复新闻 (ID: {news_id}, 相似度 {score:.3f}): {title}")
+                    print(f"   📎 链接: {link}")
+                    # 更新旧新闻
+                    task['record'] = {
+                        "id": news_id,
+                        "ctime": ctime,
+                        "title": title,
+                        "content": task['content'],
+                        "link": link,
+                        "code": code
+                    }
+                    task['duplicate_of'] = news_id
+                    results.append(task)
+                    continue
 
-            if not is_duplicate:
-                formatted_news.append({
-                    "ctime": format_ts(news.get("ctime", 0)),
+                task['record'] = {
+                    "ctime": ctime,
                     "title": title,
-                    "content": cleaned_content,
+                    "content": task['content'],
                     "link": link,
                     "code": code
-                })
-                print(f"📌 新增 第{idx}条 | 🕒 {format_ts(news.get('ctime', 0))}")
+                }
+                print(f"📌 新增 第{task['idx']}条 | 🕒 {ctime}")
                 print(f"   📰 {title}")
                 print(f"   📎 {link}")
                 new_count += 1
+                results.append(task)
+            return results
+
+        def analyze_stage(task):
+            # 只为新增的新闻生成标签
+            if task.get('duplicate_of') is None:
+                task['tag_info'] = analyze_news_content(task['content'], task['title'])
+            return task
+
+        pipeline = StagedPipeline([
+            Stage("crawl", crawl_stage, NEWS_CRAWL_WORKERS),
+            Stage("title", title_stage, NEWS_TITLE_WORKERS),
+            Stage("embed", embed_stage, NEWS_EMBED_WORKERS, batch_size=EMBEDDING_BATCH_SIZE, batch_wait=EMBEDDING_BATCH_WAIT),
+            Stage("dedup", dedup_stage, 1, batch_size=NEWS_COMMIT_BATCH),
+            Stage("analyze", analyze_stage, NEWS_ANALYZE_WORKERS),
+        ])
+        tasks = (
+            {'idx': idx, 'news': news, 'cleaned': cleaned, 'link': ""}
+            for idx, (news, cleaned) in enumerate(items_to_process, 1)
+        )
+
+        # 处理完成的新闻按批次保存，不等待全部处理结束
+        batch = []
+        for task in pipeline.run(tasks):
+            batch.append(task)
+            if len(batch) >= NEWS_COMMIT_BATCH:
+                save_news_batch(batch)
+                batch = []
+        if batch:
+            save_news_batch(batch)
 
         print(f"📊 处理结果: 新增 {new_count} 条新闻, 更新 {duplicate_count} 条重复新闻")
         
-        # 保存新闻内容并获取结果（包含新闻ID）
-        saved_results = save_news(formatted_news)
-        
-        if saved_results:
-            # 为新增和更新的新闻准备嵌入数据
-            news_embeddings = []
-            
-            # 处理更新的新闻嵌入
-            for data in embeddings_to_save:
-                # 检查此记录是否被跳过
-                news_id = data['news_id']
-                if news_id in saved_results and saved_results[news_id].get('skipped'):
-                    continue
-                news_embeddings.append(data)
-            
-            # 处理新增新闻的嵌入
-            for news_item in formatted_news:
-                for news_id, info in saved_results.items():
-                    if info.get('is_new') and info['content'] == news_item['content'] and not info.get('skipped') and not info.get('existing'):
-                        # 为新新闻重新计算嵌入
-                        emb = create_embedding(news_item['content'], EMBEDDING_MODEL)
-                        if emb is not None:
-                            news_embeddings.append({
-                                'news_id': news_id,
-                                'embedding_vector': emb,
-                                'model_name': EMBEDDING_MODEL
-                            })
-                        break
-            
-            # 保存所有嵌入（新增和更新）
-            if news_embeddings:
-                print(f"🔄 正在保存 {len(news_embeddings)} 条新闻嵌入")
-                save_news_embeddings(news_embeddings)
-                
-            # 为新增的新闻生成并保存标签
-            news_tags = []
-            
-            for news_id, info in saved_results.items():
-                if info.get('is_new'):  # 只为新增的新闻生成标签
-                    # 找到对应的新闻内容和标题
-                    for news_item in formatted_news:
-                        if news_item['content'] == info['content']:
-                            # 分析新闻内容
-                            print(f"🏷️ 正在分析新闻 {news_id} 的内容以生成标签...")
-                            tag_info = analyze_news_content(news_item['content'], news_item['title'])
-                            
-                            # 添加新闻ID
-                            tag_info['news_id'] = news_id
-                            news_tags.append(tag_info)
-                            break
-
-            # 保存标签信息
-            if news_tags:
-                print(f"🔖 正在为 {len(news_tags)} 条新闻保存标签和摘要")
-                save_news_tags(news_tags)
-        
         # 更新返回值中的统计信息
         result["new_count"] = new_count
         result["duplicate_count"] = duplicate_count
@@ -684,47 +843,27 @@ def fetch_tops():
         
         print(f"⏳ 处理 {len(news_to_process)} 条头条新闻...")
         
-        # 获取"top"类别的最近新闻用于比较
-        window_size = int(os.getenv("WINDOW_SIZE", 5))
-        existing_news = get_recent_news_with_embeddings(EMBEDDING_MODEL, "top", limit=window_size)
+        # 获取"top"类别的近期新闻用于比较
+        window = load_embedding_window("top")
         
-        # 提取已有的嵌入向量
-        existing_embeddings = []
-        for news in existing_news:
-            if news['embedding'] is not None:
-                existing_embeddings.append((news['id'], news['embedding']))
+        # 为新新闻批量计算嵌入，与窗口及彼此之间一次完成相似度检查
+        embs = create_embeddings([news['content'] for news in news_to_process], EMBEDDING_MODEL)
+        embedded = [(news, emb) for news, emb in zip(news_to_process, embs) if emb is not None]
+        # 如果嵌入失败，还是保留这条新闻
+        unique_news = [news for news, emb in zip(news_to_process, embs) if emb is None]
+        matches = window.find_duplicates([emb for _, emb in embedded], SIM_THRESHOLD) if embedded else []
         
-        if existing_embeddings:
-            print(f"📊 为头条新闻进行嵌入相似度检查，已加载 {len(existing_embeddings)} 条现有嵌入")
-            
-            # 为新新闻顺序计算嵌入
-            unique_news = []
-            sim_duplicates = 0
-            
-            for news in news_to_process:
-                emb = create_embedding(news['content'], EMBEDDING_MODEL)
-                if emb is None:
-                    # 如果嵌入失败，还是保留这条新闻
-                    unique_news.append(news)
-                    continue
-                    
-                # 检查是否与现有新闻相似
-                is_similar = False
-                for news_id, old_emb in existing_embeddings:
-                    if cosine_sim(emb, old_emb) >= SIM_THRESHOLD:
-                        print(f"🔄 发现相似头条新闻 (ID: {news_id}): {news['title']}")
-                        is_similar = True
-                        sim_duplicates += 1
-                        break
-                
-                if not is_similar:
-                    unique_news.append(news)
-            
-            duplicate_count += sim_duplicates
-            print(f"📊 嵌入相似度检查: 发现 {sim_duplicates} 条相似新闻")
-        else:
-            # 如果没有可比较的嵌入，则所有通过哈希检查的新闻都视为唯一
-            unique_news = news_to_process
+        sim_duplicates = 0
+        for (news, _), match in zip(embedded, matches):
+            if match is None:
+                unique_news.append(news)
+            else:
+                news_id, score = match
+                print(f"🔄 发现相似头条新闻 (ID: {news_id if news_id is not None else '本批次'}, 相似度 {score:.3f}): {news['title']}")
+                sim_duplicates += 1
+        
+        duplicate_count += sim_duplicates
+        print(f"📊 嵌入相似度检查: 发现 {sim_duplicates} 条相似新闻")
         
         # 保存新闻到数据库
         if unique_news:
@@ -735,32 +874,32 @@ def fetch_tops():
                 news_embeddings = []
                 news_tags = []
                 
-                # 为每条新保存的新闻计算嵌入和标签
-                for news_id, info in saved_results.items():
-                    if info.get('is_new'):
-                        # 计算并保存嵌入
-                        emb = create_embedding(info['content'], EMBEDDING_MODEL)
-                        if emb is not None:
-                            news_embeddings.append({
-                                'news_id': news_id,
-                                'embedding_vector': emb,
-                                'model_name': EMBEDDING_MODEL
-                            })
+                # 为每条新保存的新闻计算嵌入和标签（相似度检查时已计算过的嵌入直接命中缓存）
+                new_items = [(news_id, info) for news_id, info in saved_results.items() if info.get('is_new')]
+                embs = create_embeddings([info['content'] for _, info in new_items], EMBEDDING_MODEL)
+                for (news_id, info), emb in zip(new_items, embs):
+                    # 计算并保存嵌入
+                    if emb is not None:
+                        news_embeddings.append({
+                            'news_id': news_id,
+                            'embedding_vector': emb,
+                            'model_name': EMBEDDING_MODEL
+                        })
+                    
+                    # 计算并保存标签
+                    # 找到原始新闻数据以获取标题
+                    news_item = next((news for news in unique_news if news['content'] == info['content']), None)
+                    if news_item:
+                        print(f"🏷️ 正在分析头条新闻 {news_id} 的内容以生成标签...")
+                        tag_info = analyze_news_content(info['content'], news_item.get('title'))
+                        
+                        # 查找已经爬取的摘要
+                        summary = news_item.get('_summary')
+                        if summary:
+                            tag_info['summary'] = summary
                         
-                        # 计算并保存标签
-                        # 找到原始新闻数据以获取标题
-                        news_item = next((news for news in unique_news if news['content'] == info['content']), None)
-                        if news_item:
-                            print(f"🏷️ 正在分析头条新闻 {news_id} 的内容以生成标签...")
-                            tag_info = analyze_news_content(info['content'], news_item.get('title'))
-                            
-                            # 查找已经爬取的摘要
-                            summary = news_item.get('_summary')
-                            if summary:
-                                tag_info['summary'] = summary
-                            
-                            tag_info['news_id'] = news_id
-                            news_tags.append(tag_info)
+                        tag_info['news_id'] = news_id
+                        news_tags.append(tag_info)
                 
                 # 保存所有嵌入
                 if news_embeddings:
@@ -889,6 +1028,15 @@ def main():
     print("\n" + "="*30)
     print(f"✅ 并行任务完成 (耗时: {(datetime.now() - start_time).total_seconds():.1f}秒)")
     print(f"📊 总计: 新增{total_new}条，已存在{total_duplicate}条")
+    print(f"🧮 {embedding_stats.summary()}")
+    print(f"🧠 {llm_memo.memo_stats.summary()}")
+    print(f"🤖 {llm_stats.summary()}")
+    # 把本轮新写入的嵌入同步到向量索引，供后端相似新闻与语义搜索使用
+    if EMBEDDING_MODEL:
+        try:
+            sync_news_index(EMBEDDING_MODEL)
+        except RuntimeError as e:
+            print(f"⚠️ 跳过新闻向量索引同步: {e}")
     if errors:
         print(f"❌ 错误: {len(errors)}个")
     print("="*30)
@@ -6,6 +6,7 @@ import logging
 from typing import Dict, List
 from datetime import datetime
 from utils.save import save_realtime_quotes, initialize_database
+from utils.fetch_scheduler import FetchScheduler
 from dotenv import load_dotenv
 
 # 禁用不安全请求的警告
@@ -18,75 +19,105 @@ logger = logging.getLogger(__name__)
 
 load_dotenv(override=True)
 
-def get_tqdm():
-    """获取 tqdm 进度条"""
-    try:
-        from tqdm import tqdm as inner_tqdm
-    except ImportError:
-        inner_tqdm = lambda x, **kwargs: x
-    return inner_tqdm
+# 行情快照接口的限速上游（push2 与其他东方财富接口分开限速）及并发数
+QUOTE_HOST = "eastmoney_push2"
+QUOTE_FETCH_WORKERS = int(os.getenv("QUOTE_FETCH_WORKERS", 8))
+
+# 请求头，模拟浏览器行为
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.131 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Connection": "keep-alive"
+}
+
+# 复用HTTP连接，常驻进程（quote_daemon）中每次抓取不必重新建立连接
+_session = requests.Session()
+_session.headers.update(REQUEST_HEADERS)
+
+def close_session():
+    """关闭复用的HTTP会话（进程退出时调用）"""
+    _session.close()
+
+class ColumnarRecords:
+    """
+    把逐条的记录字典直接按列追加，最后一次性构建DataFrame
+
+    列顺序与 pd.DataFrame(记录列表) 一致：按字段首次出现的顺序，缺失的字段补None
+    """
+
+    def __init__(self):
+        self.columns: Dict[str, list] = {}
+        self.size = 0
+
+    def extend(self, records: List[Dict]):
+        for record in records:
+            for key in record:
+                if key not in self.columns:
+                    self.columns[key] = [None] * self.size
+            for key, values in self.columns.items():
+                values.append(record.get(key))
+            self.size += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+def _page_records(page_data) -> List[Dict]:
+    """取出一页数据中的记录列表（np=1时diff为列表，否则为以序号为键的字典）"""
+    diff = page_data["data"]["diff"]
+    return list(diff.values()) if isinstance(diff, dict) else diff
 
 def fetch_paginated_data(url: str, base_params: Dict, timeout: int = 15):
     """
     东方财富-分页获取数据并合并结果
+
+    第1页确定总数后，其余页通过调度器在同一个keep-alive会话上并发获取；
+    会话在多次调用之间复用，只在进程退出时由 close_session() 关闭
     :param url: 请求URL
     :param base_params: 基础请求参数
     :param timeout: 请求超时时间
     :return: 合并后的数据
     """
-    # 请求头，模拟浏览器行为
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.131 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        "Connection": "keep-alive"
-    }
-    
-    # 复制参数以避免修改原始参数
-    params = base_params.copy()
-    
-    # 获取第一页数据，用于确定分页信息
-    try:
-        r = requests.get(url, params=params, headers=headers, timeout=timeout)
-        first_page_data = r.json()
-        logger.info("[成功] 成功获取第1页数据")
-    except Exception as e:
-        logger.error(f"获取第1页数据失败: {str(e)}", exc_info=True)
-        return pd.DataFrame()
-    
-    # 计算分页信息
-    per_page_num = len(first_page_data["data"]["diff"])
-    total_page = math.ceil(first_page_data["data"]["total"] / per_page_num)
-    
-    # 存储所有页面数据
-    temp_list = []
-    
-    # 添加第一页数据
-    temp_list.append(pd.DataFrame(first_page_data["data"]["diff"]))
-    
-    # 获取进度条
-    tqdm = get_tqdm()
-    
-    # 获取剩余页面数据
-    for page in tqdm(range(2, total_page + 1), leave=False):
-        params.update({"pn": page})
-        
+    session = _session
+
+    def fetch_page(page: int):
+        """返回 (整页响应, 记录列表)；5xx、非JSON内容或缺少数据时抛出异常，由调度器重试"""
+        params = {**base_params, "pn": page}
+        r = session.get(url, params=params, timeout=timeout)
+        r.raise_for_status()
+        page_data = r.json()
+        return page_data, _page_records(page_data)
+
+    records = ColumnarRecords()
+    with FetchScheduler(max_workers=QUOTE_FETCH_WORKERS) as scheduler:
+        # 获取第一页数据，用于确定分页信息
         try:
-            r = requests.get(url, params=params, headers=headers, timeout=timeout)
-            page_data = r.json()
-            logger.info(f"成功获取第{page}页数据")
-            
-            inner_temp_df = pd.DataFrame(page_data["data"]["diff"])
-            temp_list.append(inner_temp_df)
+            first_page_data, first_page = scheduler.submit(QUOTE_HOST, fetch_page, 1).result()
+            logger.info("[成功] 成功获取第1页数据")
         except Exception as e:
-            logger.warning(f"获取第{page}页失败，跳过此页: {str(e)}")
-            continue
-    
+            logger.error(f"获取第1页数据失败: {str(e)}", exc_info=True)
+            return pd.DataFrame()
+
+        # 计算分页信息
+        records.extend(first_page)
+        per_page_num = len(first_page)
+        total_page = math.ceil(first_page_data["data"]["total"] / per_page_num) if per_page_num else 1
+
+        # 并发获取剩余页面数据，按完成顺序直接追加到列中
+        failed_pages = []
+        for page, result, error in scheduler.map(QUOTE_HOST, fetch_page, range(2, total_page + 1)):
+            if error:
+                logger.warning(f"获取第{page}页失败，跳过此页: {str(error)}")
+                failed_pages.append(page)
+                continue
+            records.extend(result[1])
+    logger.info(f"共获取 {total_page - len(failed_pages)}/{total_page} 页，{records.size} 条数据")
+
     # 合并所有数据
-    if not temp_list:
+    if not records.size:
         return pd.DataFrame()
-        
-    temp_df = pd.concat(temp_list, ignore_index=True)
+
+    temp_df = records.to_frame()
     temp_df["f3"] = pd.to_numeric(temp_df["f3"], errors="coerce")
     temp_df.sort_values(by=["f3"], ascending=False, inplace=True, ignore_index=True)
     temp_df.reset_index(inplace=True)
@@ -246,20 +277,21 @@ def fetch_realtime_quotes() -> pd.DataFrame:
     
     return temp_df
 
+def is_trading_time(now: datetime | None = None) -> bool:
+    """是否在抓取时段内（9:00-17:30，覆盖盘前与收盘后的数据更新）"""
+    now = now or datetime.now()
+    # 转换为分钟表示的时间，方便比较
+    current_time_in_minutes = now.hour * 60 + now.minute
+    market_open_time = 9 * 60 + 0
+    market_close_time = 17 * 60 + 30
+    return market_open_time <= current_time_in_minutes <= market_close_time
+
 if __name__ == "__main__":
     # 添加东八区时间检测，只在交易时间内执行
     now = datetime.now()
-    current_hour = now.hour
-    current_minute = now.minute
-    
-    # 转换为分钟表示的时间，方便比较
-    current_time_in_minutes = current_hour * 60 + current_minute
-    market_open_time = 9 * 60 + 0  # 9:30
-    market_close_time = 17 * 60 + 30  # 16:30
     
-    # 检查是否在交易时间内（9:30-16:30）
-    if not (market_open_time <= current_time_in_minutes <= market_close_time):
-        logger.info(f"当前时间 {now.strftime('%H:%M')} 不在交易时间（9:30-16:30）内，不进行数据爬取")
+    if not is_trading_time(now):
+        logger.info(f"当前时间 {now.strftime('%H:%M')} 不在交易时间（9:00-17:30）内，不进行数据爬取")
     else:
         logger.info(f"当前时间 {now.strftime('%H:%M')} 在交易时间内，开始爬取数据")
         initialize_database()
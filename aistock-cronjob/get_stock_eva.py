@@ -1,11 +1,32 @@
+import argparse
+import json
+import os
+import re
 import requests
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Set
 from datetime import datetime
 
 from utils.db import get_db_session
 from utils.model import UserStock
+from utils.save import get_recent_news_by_codes, get_latest_evaluations, save_stock_evaluations
+from utils.ai_utils import analyze_financial_news
+from utils.backend_cache import warm_computed_cache
+from utils.llm_memo import memo_stats
+from utils.llm_client import llm_stats
+
+# 同时进行的大模型评估数
+EVA_CONCURRENCY = int(os.getenv("EVA_CONCURRENCY", 4))
+# 每只股票参与评估的最新新闻条数
+EVA_NEWS_PER_STOCK = 10
+
+# 与后端 routes/ai_eva.py 一致：缓存键、正常结果3小时、无新闻1小时、过期后宽限期30分钟
+EVA_CACHE_KEY = "stock:eva:{code}"
+EVA_CACHE_SECONDS = 10800
+EVA_EMPTY_CACHE_SECONDS = 3600
+EVA_STALE_SECONDS = 1800
 
 def get_all_watched_stocks() -> Set[str]:
     """获取所有用户关注的股票代码集合，并加入前8热门股票（国内人气榜）"""
@@ -24,7 +45,7 @@ def get_all_watched_stocks() -> Set[str]:
     return watched_stocks
 
 def fetch_stock_eva():
-    """获取所有用户关注股票和前8热门股票的评价"""
+    """通过后端 /api/eva 接口逐个刷新评价（旧方式，保留用于排查）"""
     watched_stocks = get_all_watched_stocks()
     for stock_code in watched_stocks:
         print(f"正在请求股票 {stock_code} 的评价API...")
@@ -37,7 +58,163 @@ def fetch_stock_eva():
             print(f"请求股票 {stock_code} 评价API时出错: {e}")
         time.sleep(random.uniform(0.5, 1.5))  # 避免请求过快
 
-if __name__ == "__main__":
+def _response(conclusion, reason, news_list, evaluation_time):
+    """与后端 /api/eva 成功响应相同的结构"""
+    return {
+        "code": 0,
+        "msg": "success",
+        "data": {
+            "conclusion": conclusion,
+            "reason": reason,
+            "news_list": news_list,
+            "evaluation_time": evaluation_time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+    }
+
+def _stored_news_list(news_list):
+    """评测表中的 news_list 由后端以 JSON 字符串写入，读取时还原为列表"""
+    if isinstance(news_list, str):
+        try:
+            return json.loads(news_list)
+        except json.JSONDecodeError:
+            return []
+    return news_list or []
+
+def _news_unchanged(news, last_evaluation):
+    """上次评估之后，参与评估的新闻都没有新增或更新；上次评估失败（结论未知）时视为有变化"""
+    if not last_evaluation or last_evaluation['conclusion'] == '未知':
+        return False
+    return all(item['download_time'] and item['download_time'] <= last_evaluation['evaluation_time'] for item in news)
+
+def evaluate_stock(stock_code, news):
+    """
+    评估一只股票（在线程池中执行）
+
+    参数:
+    - stock_code: 股票代码
+    - news: 该股票最新的新闻（按发布时间倒序）
+
+    返回:
+    - 评测记录字典；大模型分析失败时返回None
+    """
+    evaluation_time = datetime.now()
+    # 合并新闻内容，包含新闻链接（与后端一致，每条最多500字）
+    combined_news = ""
+    for i, item in enumerate(news, 1):
+        content = item['content'][:500] + "..." if len(item['content']) > 500 else item['content']
+        combined_news += f"【新闻{i}：{item['title']}】{content} ({item['link']})\n"
+
+    result = analyze_financial_news(combined_news)
+    if result['conclusion'] == '未知':
+        print(f"❗ 股票 {stock_code} 评估失败: {result['reason'][:100]}")
+        return None
+
+    # 发布时间直接取自已加载的新闻，不再逐条查询数据库
+    publish_times = {item['link']: item['ctime'] for item in news if item['link']}
+    news_list = []
+    for news_item in result['news_list']:
+        link_match = re.search(r'\((http[^)]+)\)', news_item)
+        link = link_match.group(1) if link_match else ""
+        title_match = re.search(r'\[(.*?)\]', news_item)
+        title = title_match.group(1) if title_match else news_item
+        publish_time = publish_times.get(link) or datetime.now()
+        news_list.append({
+            "title": title,
+            "link": link,
+            "publish_time": publish_time.strftime("%Y-%m-%d %H:%M:%S")
+        })
+
+    return {
+        'code': stock_code,
+        'evaluation_time': evaluation_time,
+        'conclusion': result['conclusion'],
+        'reason': result['reason'],
+        'news_list': news_list
+    }
+
+def batch_evaluate(codes, force=False):
+    """
+    批量评估股票：一次查询加载全部新闻，并发调用大模型，批量写入评测表和后端缓存
+
+    参数:
+    - codes: 股票代码集合
+    - force: 为True时不跳过新闻未变化的股票
+
+    返回:
+    - dict: 评估、跳过、无新闻、失败的股票数
+    """
+    codes = sorted(codes)
+    news_by_code = get_recent_news_by_codes(codes, EVA_NEWS_PER_STOCK)
+    latest = get_latest_evaluations(codes)
+    stats = {'evaluated': 0, 'skipped': 0, 'no_news': 0, 'failed': 0}
+    cache_entries = []
+    pending = {}
+
+    for code in codes:
+        news = news_by_code.get(code, [])
+        last = latest.get(code)
+        if not news:
+            stats['no_news'] += 1
+            cache_entries.append((EVA_CACHE_KEY.format(code=code), _response(
+                "中性", f"未找到股票 {code} 的相关新闻", [], datetime.now()
+            ), EVA_EMPTY_CACHE_SECONDS))
+        elif not force and _news_unchanged(news, last):
+            # 新闻未变化：沿用上次的评测，只刷新缓存
+            stats['skipped'] += 1
+            cache_entries.append((EVA_CACHE_KEY.format(code=code), _response(
+                last['conclusion'], last['reason'], _stored_news_list(last['news_list']), last['evaluation_time']
+            ), EVA_CACHE_SECONDS))
+        else:
+            pending[code] = news
+
+    print(f"📊 共 {len(codes)} 支股票：待评估 {len(pending)}，新闻未变化跳过 {stats['skipped']}，无新闻 {stats['no_news']}")
+
+    evaluations = []
+    with ThreadPoolExecutor(max_workers=EVA_CONCURRENCY) as executor:
+        futures = {executor.submit(evaluate_stock, code, news): code for code, news in pending.items()}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                evaluation = future.result()
+            except Exception as e:
+                print(f"❗ 股票 {code} 评估出错: {e}")
+                evaluation = None
+            if evaluation is None:
+                stats['failed'] += 1
+                continue
+            stats['evaluated'] += 1
+            print(f"✅ {code}: {evaluation['conclusion']}")
+            evaluations.append(evaluation)
+            cache_entries.append((EVA_CACHE_KEY.format(code=code), _response(
+                evaluation['conclusion'], evaluation['reason'], evaluation['news_list'], evaluation['evaluation_time']
+            ), EVA_CACHE_SECONDS))
+
+    # news_list 与后端一致以 JSON 字符串存储
+    save_stock_evaluations([
+        {**evaluation, 'news_list': json.dumps(evaluation['news_list'], ensure_ascii=False)}
+        for evaluation in evaluations
+    ])
+    warmed = warm_computed_cache(cache_entries, stale_seconds=EVA_STALE_SECONDS)
+    print(f"🔥 已写入 {warmed} 个评测缓存")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="批量更新关注股票的AI评测")
+    parser.add_argument("--force", action="store_true", help="新闻未变化的股票也重新评估")
+    parser.add_argument("--http", action="store_true", help="改为逐个调用后端 /api/eva 接口（旧方式）")
+    parser.add_argument("--codes", nargs="*", help="只评估指定的股票代码")
+    args = parser.parse_args()
+
     print(f"开始时间: {datetime.now()}")
-    fetch_stock_eva()
+    if args.http:
+        fetch_stock_eva()
+    else:
+        codes = set(args.codes) if args.codes else get_all_watched_stocks()
+        stats = batch_evaluate(codes, force=args.force)
+        print(f"📈 评估 {stats['evaluated']}，跳过 {stats['skipped']}，无新闻 {stats['no_news']}，失败 {stats['failed']}")
+        print(f"🧠 {memo_stats.summary()}")
+        print(f"🤖 {llm_stats.summary()}")
     print(f"结束时间: {datetime.now()}")
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,168 @@
 import akshare as ak
 import logging
+import os
+import pandas as pd
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import and_
 from sqlalchemy.sql.expression import func
 from utils.db import SessionLocal
+from utils.fetch_scheduler import FetchScheduler
 from utils.model import HotStock, UserStock, StockHistory, Stocks
+from utils.upsert import bulk_upsert
 
 # 设置日志记录
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 首次加载（或全量重载）时获取的历史年数
+HISTORY_YEARS = int(os.getenv("STOCK_HISTORY_YEARS", 3))
+# 设置为1时忽略已有数据，重新下载所有股票的完整历史
+FULL_RELOAD = os.getenv("STOCK_HISTORY_FULL_RELOAD", "0") == "1"
+# 同一只股票两次更新的最小间隔(秒)
+MIN_UPDATE_INTERVAL = 86400
+# 重叠日收盘价差异超过该值时，认为发生了除权除息，需要重载前复权历史
+ADJUST_TOLERANCE = 1e-4
+
+# akshare 列名 -> StockHistory 字段
+COLUMN_MAP = {
+    '日期': 'date',
+    '开盘': 'open_price',
+    '收盘': 'close_price',
+    '最高': 'high',
+    '最低': 'low',
+    '成交量': 'volume',
+    '成交额': 'turnover',
+    '振幅': 'amplitude',
+    '涨跌幅': 'change_percent',
+    '涨跌额': 'change_amount',
+    '换手率': 'turnover_rate',
+}
+
+
+def load_history_state(session):
+    """
+    一次分组查询获取每只股票已有历史数据的状态
+
+    Returns:
+        dict: {股票代码: (最新日期, 最新日期的收盘价, 最近更新时间)}
+    """
+    latest = session.query(
+        StockHistory.code.label('code'),
+        func.max(StockHistory.date).label('max_date'),
+        func.max(StockHistory.updated_at).label('last_updated')
+    ).group_by(StockHistory.code).subquery()
+
+    rows = session.query(latest.c.code, latest.c.max_date, StockHistory.close_price, latest.c.last_updated)\
+        .join(StockHistory, and_(StockHistory.code == latest.c.code, StockHistory.date == latest.c.max_date))\
+        .all()
+    return {code: (max_date, close_price, last_updated) for code, max_date, close_price, last_updated in rows}
+
+
+def fetch_history(code, start_date, end_date):
+    """
+    获取前复权日线数据
+
+    Returns:
+        DataFrame: 列名已转换为 StockHistory 字段，date 为 date 类型
+    """
+    stock_data = ak.stock_zh_a_hist(symbol=code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
+    if stock_data is None or stock_data.empty:
+        return pd.DataFrame(columns=list(COLUMN_MAP.values()))
+    df = stock_data.rename(columns=COLUMN_MAP)[list(COLUMN_MAP.values())]
+    df['date'] = pd.to_datetime(df['date']).dt.date
+    return df
+
+
+def is_adjusted_since(df, last_date, last_close):
+    """判断重叠日的前复权收盘价是否变化（期间发生了除权除息，已保存的历史需要重新复权）"""
+    overlap = df.loc[df['date'] == last_date, 'close_price']
+    if overlap.empty or last_close is None:
+        return False
+    return abs(float(overlap.iloc[0]) - float(last_close)) > ADJUST_TOLERANCE
+
+
+def upsert_history(session, code, df):
+    """
+    批量 upsert 写入一只股票的历史数据
+
+    Returns:
+        int: 写入的行数
+    """
+    if df.empty:
+        return 0
+    now = datetime.now()
+    # NaN 转为 None 写入 NULL
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    for record in records:
+        record['code'] = code
+        record['updated_at'] = now
+    return bulk_upsert(session, StockHistory, records)
+
+
 def fetch_and_save_stock_history():
     session = SessionLocal()
     try:
-        # 获取当前日期和3年前的日期
-        end_date = datetime.now().strftime('%Y%m%d')
-        start_date = (datetime.now() - timedelta(days=3*365)).strftime('%Y%m%d')
+        # 获取当前日期和全量加载的起始日期
+        today = datetime.now()
+        end_date = today.strftime('%Y%m%d')
+        full_start_date = (today - timedelta(days=HISTORY_YEARS * 365)).strftime('%Y%m%d')
 
         # 获取 HotStock 和 UserStock 表中的股票代码
         hot_stock_codes = session.query(HotStock.code).filter(func.length(HotStock.code) == 6).all()
         user_stock_codes = session.query(UserStock.code).filter(func.length(UserStock.code) == 6).all()
-        existing_codes = session.query(StockHistory.code).filter(func.length(StockHistory.code) == 6).all()
+
+        # 已有历史数据的股票及其最新日期、更新时间（一次分组查询）
+        history_state = {} if FULL_RELOAD else load_history_state(session)
 
         # 从 Stocks 表中随机挑选 50 个 6 位股票代码
         random_stock_codes = session.query(Stocks.code).filter(func.length(Stocks.code) == 6).order_by(func.rand()).limit(50).all()
 
         # 合并并去重股票代码
-        all_codes = {code for code, in hot_stock_codes + user_stock_codes + existing_codes + random_stock_codes if len(code) == 6}
+        all_codes = {code for code, in hot_stock_codes + user_stock_codes + random_stock_codes if len(code) == 6}
+        all_codes.update(code for code in history_state if len(code) == 6)
 
-        logger.info(f"开始处理 {len(all_codes)} 只股票的历史数据")
+        logger.info(f"开始处理 {len(all_codes)} 只股票的历史数据，模式: {'全量' if FULL_RELOAD else '增量'}")
 
+        # 24 小时内更新过的股票跳过
+        pending_codes = []
         for code in all_codes:
-            try:
-                # 检查最近更新时间是否超过 24 小时
-                latest_update = session.query(StockHistory.updated_at).filter(StockHistory.code == code).order_by(StockHistory.updated_at.desc()).first()
-                if latest_update and (datetime.now() - latest_update[0]).total_seconds() < 86400:
-                    logger.info(f"跳过 {code}，最近更新时间在 24 小时内")
+            last_updated = history_state.get(code, (None, None, None))[2]
+            if not (last_updated and (today - last_updated).total_seconds() < MIN_UPDATE_INTERVAL):
+                pending_codes.append(code)
+        skipped = len(all_codes) - len(pending_codes)
+        saved_rows = reloaded = 0
+
+        def fetch_code_history(code):
+            """在线程池中获取一只股票需要写入的数据，返回 (DataFrame, 是否复权重载)"""
+            last_date, last_close, _ = history_state.get(code, (None, None, None))
+            if not last_date:
+                return fetch_history(code, full_start_date, end_date), False
+            # 增量：从已有的最新日期开始获取，重叠的一天用于检测复权变化
+            df = fetch_history(code, last_date.strftime('%Y%m%d'), end_date)
+            if not is_adjusted_since(df, last_date, last_close):
+                return df, False
+            logger.info(f"{code} 自 {last_date} 起发生除权除息，重新加载完整历史")
+            scheduler.acquire("eastmoney")
+            return fetch_history(code, full_start_date, end_date), True
+
+        # 并发下载，数据库写入留在当前线程（session 不是线程安全的）
+        with FetchScheduler() as scheduler:
+            for code, result, error in scheduler.map("eastmoney", fetch_code_history, pending_codes):
+                if error:
+                    logger.error(f"获取 {code} 的历史数据失败: {error}")
                     continue
+                df, was_reloaded = result
+                try:
+                    rows = upsert_history(session, code, df)
+                    session.commit()
+                    saved_rows += rows
+                    reloaded += was_reloaded
+                    logger.debug(f"成功保存或更新 {code} 的历史数据 {rows} 条")
+                except Exception as e:
+                    session.rollback()
+                    logger.error(f"保存 {code} 的历史数据失败: {e}", exc_info=True)
 
-                # 调用 akshare 接口获取后复权数据
-                stock_data = ak.stock_zh_a_hist(symbol=code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
-                for _, row in stock_data.iterrows():
-                    # 检查是否已存在记录
-                    existing_record = session.query(StockHistory).filter_by(code=code, date=row['日期']).first()
-                    if existing_record:
-                        # 更新已有记录
-                        existing_record.open_price = row['开盘']
-                        existing_record.close_price = row['收盘']
-                        existing_record.high = row['最高']
-                        existing_record.low = row['最低']
-                        existing_record.volume = row['成交量']
-                        existing_record.turnover = row['成交额']
-                        existing_record.amplitude = row['振幅']
-                        existing_record.change_percent = row['涨跌幅']
-                        existing_record.change_amount = row['涨跌额']
-                        existing_record.turnover_rate = row['换手率']
-                        existing_record.updated_at = datetime.now()
-                    else:
-                        # 插入新记录
-                        history = StockHistory(
-                            code=code,
-                            date=row['日期'],
-                            open_price=row['开盘'],
-                            close_price=row['收盘'],
-                            high=row['最高'],
-                            low=row['最低'],
-                            volume=row['成交量'],
-                            turnover=row['成交额'],
-                            amplitude=row['振幅'],
-                            change_percent=row['涨跌幅'],
-                            change_amount=row['涨跌额'],
-                            turnover_rate=row['换手率'],
-                            updated_at=datetime.now()
-                        )
-                        session.add(history)
-                session.commit()
-                logger.info(f"成功保存或更新 {code} 的历史数据")
-            except Exception as e:
-                session.rollback()
-                logger.error(f"获取或保存 {code} 的历史数据失败: {e}", exc_info=True)
+        logger.info(f"历史数据处理完成：写入 {saved_rows} 条，跳过 {skipped} 只，复权重载 {reloaded} 只")
     finally:
         session.close()
 
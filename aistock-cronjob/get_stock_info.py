@@ -1,10 +1,9 @@
 import akshare as ak
-import time
-import random
 import logging
 from utils.model import Stocks
 from utils.save import initialize_database
 from utils.db import SessionLocal
+from utils.fetch_scheduler import FetchScheduler
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import func
 from datetime import datetime
@@ -13,28 +12,12 @@ from datetime import datetime
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def fetch_stock_info(symbol, retries=3):
-    """通过接口获取单个股票的详细信息，支持重试"""
+def fetch_stock_info(symbol):
+    """通过接口获取单个股票的详细信息，失败时抛出异常（由调度器重试）"""
     symbol = symbol[-6:]  # 确保只使用后6位作为股票代码
-    for attempt in range(retries):
-        try:
-            # 获取股票信息
-            stock_info = ak.stock_individual_info_em(symbol=symbol)
-            # 成功获取数据后，将数据转换为字典格式
-            result = {
-                row["item"]: row["value"]  # 提取每一行的"item"作为键，"value"作为值
-                for _, row in stock_info.iterrows()
-            }
-
-            return result
-        except Exception as e:
-            logger.warning(f"获取股票 {symbol} 信息失败 (尝试 {attempt + 1}/{retries}): {e}")
-            if attempt < retries - 1:
-                # 统一休眠时间为1-3秒
-                sleep_time = random.randint(1, 3)
-                logger.info(f"随机暂停 {sleep_time} 秒后重试...")
-                time.sleep(sleep_time)
-    return None
+    stock_info = ak.stock_individual_info_em(symbol=symbol)
+    # 将数据转换为字典格式：每一行的"item"作为键，"value"作为值
+    return dict(zip(stock_info["item"], stock_info["value"]))
 
 def cache_all_stocks():
     session = SessionLocal()
@@ -46,11 +29,15 @@ def cache_all_stocks():
             Stocks.code.regexp_match('^[0-9]{6}$')
         ).all()
         
-        logger.info(f"开始缓存 {len(all_stocks)} 只股票信息")
+        codes = [stock.code for stock in all_stocks]
+        logger.info(f"开始缓存 {len(codes)} 只股票信息")
         
-        for stock in all_stocks:
-            stock_info = fetch_stock_info(stock.code)
-            if stock_info:
+        # 并发获取，按东方财富的限速放行请求
+        with FetchScheduler() as scheduler:
+            for code, stock_info, error in scheduler.map("eastmoney", fetch_stock_info, codes):
+                if error:
+                    logger.warning(f"获取股票 {code} 信息失败: {error}")
+                    continue
                 formatted_stock_info = {
                     "code": stock_info.get("股票代码"),
                     "latest_price": stock_info.get("最新"),
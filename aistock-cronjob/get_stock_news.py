@@ -17,6 +17,7 @@ from utils.db import get_db_session
 from utils.model import UserStock, Stocks, News
 import utils.db as db
 from utils.save import save_news
+from utils.fetch_scheduler import FetchScheduler
 
 # 配置日志
 logging.basicConfig(
@@ -168,8 +169,12 @@ def _update_news_in_db(stock_code, news_data):
         db.session.rollback()
         logger.error(f"[news/update] 提交更改失败: {e}", exc_info=True)
 
-def process_news_for_stock(stock_code: str) -> Tuple[int, int]:
-    """获取单个股票的相关新闻，返回成功和失败数"""
+def process_news_for_stock(stock_code: str, df: pd.DataFrame | None = None) -> Tuple[int, int]:
+    """
+    处理单个股票的相关新闻，返回成功和失败数
+
+    df 为调度器并发获取的原始新闻，为空时在当前线程获取
+    """
     stock_name = get_stock_name(stock_code)
     # 如果未找到股票名称，直接返回失败
     if not stock_name:
@@ -183,8 +188,9 @@ def process_news_for_stock(stock_code: str) -> Tuple[int, int]:
         return 0, 1
     
     try:
-        logger.info(f"正在获取股票 {stock_code}({stock_name}) 的新闻...")
-        df = ak.stock_news_em(symbol=stock_name)
+        if df is None:
+            logger.info(f"正在获取股票 {stock_code}({stock_name}) 的新闻...")
+            df = ak.stock_news_em(symbol=stock_name)
         
         if df is None or df.empty:
             logger.warning(f"股票 {stock_code}({stock_name}) 没有获取到任何新闻")
@@ -263,15 +269,28 @@ def fetch_stock_news():
     success_count = 0
     fail_count = 0
     
-    # 循环遍历每个股票代码
-    for stock_code in watched_stocks:
-        # 处理每个股票的新闻
-        s_count, f_count = process_news_for_stock(stock_code)
-        success_count += s_count
-        fail_count += f_count
-            
-        # 添加延时，避免请求过于频繁
-        time.sleep(random.uniform(0.5, 1.5))
+    # 先在当前线程查出股票名称，找不到名称的直接计为失败
+    stock_names = {code: get_stock_name(code) for code in watched_stocks}
+    for stock_code, stock_name in stock_names.items():
+        if not stock_name:
+            logger.warning(f"未找到股票代码 {stock_code} 对应的股票名称，跳过")
+            fail_count += 1
+    
+    # 并发获取新闻（按东方财富的限速放行），去重和入库在当前线程依次处理
+    with FetchScheduler() as scheduler:
+        results = scheduler.map(
+            "eastmoney",
+            lambda code: ak.stock_news_em(symbol=stock_names[code]),
+            [code for code, name in stock_names.items() if name]
+        )
+        for stock_code, df, error in results:
+            if error:
+                logger.error(f"获取股票 {stock_code}({stock_names[stock_code]}) 新闻时出错: {error}")
+                fail_count += 1
+                continue
+            s_count, f_count = process_news_for_stock(stock_code, df)
+            success_count += s_count
+            fail_count += f_count
     
     print(f"新闻请求完成：成功 {success_count} 个，失败 {fail_count} 个")
     return success_count, fail_count
@@ -8,6 +8,7 @@ from sqlalchemy import text
 from utils.db import get_db_session
 from utils.db import SessionLocal as db  # 修复db未定义
 
+import asyncio
 import os
 import time
 from dataclasses import dataclass
@@ -15,14 +16,17 @@ from typing import List, Dict, Any
 import json
 import re
 import httpx
-from requests.exceptions import RequestException, Timeout, ConnectionError
 from dotenv import load_dotenv
-from openai import OpenAI
+from utils.llm_client import ChatClient
 from utils.model import StockTagRelation, Stocks
 from sqlalchemy import func
 
 load_dotenv(override=True)
 
+# 同时获取的页面数、单个页面的最长等待时间(秒)，与后端 utils/ai_utils.py 一致
+TAG_PAGE_FETCH_CONCURRENCY = int(os.getenv("TAG_PAGE_FETCH_CONCURRENCY", 5))
+TAG_PAGE_FETCH_TIMEOUT = float(os.getenv("TAG_PAGE_FETCH_TIMEOUT", 45))
+
 
 # --------------------------------------------------------------------------- #
 # 搜索客户端
@@ -41,17 +45,23 @@ class SearchClient:
         snippet: str
         position: int
 
-    async def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
+    async def search(
+        self, query: str, max_results: int = 10, client: httpx.AsyncClient | None = None
+    ) -> List[SearchResult]:
         """
         执行搜索并返回结果
 
         Args:
             query: 搜索查询字符串
             max_results: 返回的最大结果数
+            client: 共享的httpx客户端，为None时临时创建
 
         Returns:
             SearchResult对象列表
         """
+        if client is None:
+            async with httpx.AsyncClient() as client:
+                return await self.search(query, max_results, client=client)
         try:
             logging.info(f"正在通过API搜索: {query} (超时: {self.timeout}秒)")
             query = f"{query} -site:zhihu.com -site:finance.sina.com.cn -site:qianzhan.com"
@@ -64,51 +74,49 @@ class SearchClient:
             start_time = time.time()
             logging.debug(f"开始API请求: {start_time}")
 
-            async with httpx.AsyncClient() as client:
-                logging.debug("已创建httpx客户端")
-                try:
-                    response = await client.get(
-                        search_url, params=params, timeout=self.timeout
-                    )
-                    elapsed = time.time() - start_time
-                    logging.debug(
-                        f"API请求完成 ({elapsed:.2f}秒), 状态码: {response.status_code}"
-                    )
-                    response.raise_for_status()
-                except httpx.TimeoutException as e:
-                    elapsed = time.time() - start_time
-                    logging.error(f"搜索请求超时 ({elapsed:.2f}秒): {str(e)}")
-                    return []
-                except Exception as e:
-                    elapsed = time.time() - start_time
-                    logging.error(f"请求过程中发生异常 ({elapsed:.2f}秒): {str(e)}")
-                    raise
+            try:
+                response = await client.get(
+                    search_url, params=params, timeout=self.timeout
+                )
+                elapsed = time.time() - start_time
+                logging.debug(
+                    f"API请求完成 ({elapsed:.2f}秒), 状态码: {response.status_code}"
+                )
+                response.raise_for_status()
+            except httpx.TimeoutException as e:
+                elapsed = time.time() - start_time
+                logging.error(f"搜索请求超时 ({elapsed:.2f}秒): {str(e)}")
+                return []
+            except Exception as e:
+                elapsed = time.time() - start_time
+                logging.error(f"请求过程中发生异常 ({elapsed:.2f}秒): {str(e)}")
+                raise
 
-                try:
-                    data = response.json()
-                    logging.debug(
-                        f"成功解析响应JSON，结果数量: {len(data.get('results', []))}"
-                    )
-                except Exception as e:
-                    logging.error(f"解析JSON响应失败: {str(e)}")
-                    logging.debug(f"响应内容: {response.text[:500]}...")
-                    return []
-
-                results = []
-                for idx, result in enumerate(data.get("results", [])):
-                    results.append(
-                        self.SearchResult(
-                            title=result.get("title", ""),
-                            link=result.get("link", ""),
-                            snippet=result.get("snippet", ""),
-                            position=result.get("position", idx + 1),
-                        )
+            try:
+                data = response.json()
+                logging.debug(
+                    f"成功解析响应JSON，结果数量: {len(data.get('results', []))}"
+                )
+            except Exception as e:
+                logging.error(f"解析JSON响应失败: {str(e)}")
+                logging.debug(f"响应内容: {response.text[:500]}...")
+                return []
+
+            results = []
+            for idx, result in enumerate(data.get("results", [])):
+                results.append(
+                    self.SearchResult(
+                        title=result.get("title", ""),
+                        link=result.get("link", ""),
+                        snippet=result.get("snippet", ""),
+                        position=result.get("position", idx + 1),
                     )
-
-                logging.info(
-                    f"成功找到 {len(results)} 条结果，请求耗时: {elapsed:.2f}秒"
                 )
-                return results
+
+            logging.info(
+                f"成功找到 {len(results)} 条结果，请求耗时: {elapsed:.2f}秒"
+            )
+            return results
 
         except httpx.TimeoutException as e:
             logging.error(f"搜索请求超时: {str(e)}")
@@ -123,16 +131,22 @@ class SearchClient:
             logging.error(f"详细错误信息: {traceback.format_exc()}")
             return []
 
-    async def fetch_content(self, url: str) -> str:
+    async def fetch_content(
+        self, url: str, client: httpx.AsyncClient | None = None
+    ) -> str:
         """
         获取和解析网页内容
 
         Args:
             url: 要获取内容的网页URL
+            client: 共享的httpx客户端，为None时临时创建
 
         Returns:
             解析后的网页文本内容
         """
+        if client is None:
+            async with httpx.AsyncClient() as client:
+                return await self.fetch_content(url, client=client)
         try:
             logging.info(f"正在通过API获取内容: {url} (超时: {self.timeout}秒)")
 
@@ -144,41 +158,39 @@ class SearchClient:
             fetch_url = f"{self.base_url}/fetch"
             logging.debug(f"请求URL: {fetch_url}, 参数: {params}")
 
-            async with httpx.AsyncClient() as client:
-                logging.debug("已创建httpx客户端")
-                try:
-                    response = await client.get(
-                        fetch_url, params=params, timeout=self.timeout
-                    )
-                    elapsed = time.time() - start_time
-                    logging.debug(
-                        f"获取内容请求完成 ({elapsed:.2f}秒), 状态码: {response.status_code}"
-                    )
-                    response.raise_for_status()
-                except httpx.TimeoutException as e:
-                    elapsed = time.time() - start_time
-                    logging.error(f"获取内容请求超时 ({elapsed:.2f}秒): {str(e)}")
-                    return f"错误: 获取网页时请求超时 ({elapsed:.2f}秒)。"
-                except Exception as e:
-                    elapsed = time.time() - start_time
-                    logging.error(
-                        f"获取内容请求过程中发生异常 ({elapsed:.2f}秒): {str(e)}"
-                    )
-                    raise
+            try:
+                response = await client.get(
+                    fetch_url, params=params, timeout=self.timeout
+                )
+                elapsed = time.time() - start_time
+                logging.debug(
+                    f"获取内容请求完成 ({elapsed:.2f}秒), 状态码: {response.status_code}"
+                )
+                response.raise_for_status()
+            except httpx.TimeoutException as e:
+                elapsed = time.time() - start_time
+                logging.error(f"获取内容请求超时 ({elapsed:.2f}秒): {str(e)}")
+                return f"错误: 获取网页时请求超时 ({elapsed:.2f}秒)。"
+            except Exception as e:
+                elapsed = time.time() - start_time
+                logging.error(
+                    f"获取内容请求过程中发生异常 ({elapsed:.2f}秒): {str(e)}"
+                )
+                raise
 
-                try:
-                    data = response.json()
-                    content = data.get("content", "")
-                    logging.debug(f"成功解析响应JSON，内容长度: {len(content)}")
-                except Exception as e:
-                    logging.error(f"解析JSON响应失败: {str(e)}")
-                    logging.debug(f"响应内容: {response.text[:500]}...")
-                    return f"错误: 解析响应失败: {str(e)}"
+            try:
+                data = response.json()
+                content = data.get("content", "")
+                logging.debug(f"成功解析响应JSON，内容长度: {len(content)}")
+            except Exception as e:
+                logging.error(f"解析JSON响应失败: {str(e)}")
+                logging.debug(f"响应内容: {response.text[:500]}...")
+                return f"错误: 解析响应失败: {str(e)}"
 
-                logging.info(
-                    f"成功获取并解析内容 ({len(content)} 字符), 请求耗时: {elapsed:.2f}秒"
-                )
-                return content
+            logging.info(
+                f"成功获取并解析内容 ({len(content)} 字符), 请求耗时: {elapsed:.2f}秒"
+            )
+            return content
 
         except httpx.TimeoutException as e:
             logging.error(f"请求URL超时: {url}, 错误: {str(e)}")
@@ -213,84 +225,12 @@ class SearchClient:
 # --------------------------------------------------------------------------- #
 # LLM Client
 # --------------------------------------------------------------------------- #
-@dataclass
-class LLMClient:
-    base_url: str = os.getenv("LLM_BASE_URL")
-    api_key: str = os.getenv("LLM_API_KEY")
-    default_model: str = os.getenv("LLM_MODEL")
-    timeout: int = 180  # 增加超时时间（秒）
-    max_content_length: int = 409600  # 最大内容长度限制
-    client: OpenAI | None = None
-
-    def __post_init__(self):
-        if not (self.base_url and self.api_key and self.default_model):
-            raise RuntimeError("请设置环境变量 LLM_BASE_URL, LLM_API_KEY, LLM_MODEL")
-        # 初始化 OpenAI 客户端实例
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url.rstrip("/"),
-            timeout=self.timeout,  # 设置全局超时时间
-        )
-
-    def chat(
-        self,
-        messages: List[Dict[str, str]],
-        model: str | None = None,
-        temperature: float = 0.3,
-        max_retries: int = 5,  # 增加重试次数
-        retry_delay: int = 3,  # 重试延迟（秒）
-    ) -> str:
-        # 确保消息内容不超过最大长度
-        processed_messages: List[Dict[str, str]] = []
-        for msg in messages:
-            content = msg.get("content", "")
-            if len(content) > self.max_content_length:
-                content = (
-                    content[: self.max_content_length]
-                    + f"\n...(内容已截断，原长度:{len(content)}字符)"
-                )
-            processed_messages.append(
-                {
-                    "role": msg.get("role", "user"),
-                    "content": content,
-                }
-            )
+class LLMClient(ChatClient):
+    """在通用对话客户端（utils/llm_client.py）之上实现标签龙头股搜索"""
 
-        retries = 0
-        last_error = None
-        while retries < max_retries:
-            try:
-                response = self.client.chat.completions.create(
-                    model=model or self.default_model,
-                    messages=processed_messages,
-                    temperature=temperature,
-                )
-                return response.choices[0].message.content.strip()
-            except (RequestException, ConnectionError, Timeout) as e:
-                retries += 1
-                last_error = e
-                logging.warning(
-                    f"[LLMClient] 请求失败，重试 {retries}/{max_retries}: {e}"
-                )
-                if retries < max_retries:
-                    time.sleep(retry_delay * retries)  # 指数退避重试延迟
-                else:
-                    logging.error(
-                        f"[LLMClient] 请求彻底失败，已重试 {max_retries} 次: {e}"
-                    )
-            except Exception as e:
-                # 捕获其他所有异常
-                logging.error(f"[LLMClient] 未预期的错误: {e}", exc_info=True)
-                retries += 1
-                if retries < max_retries:
-                    time.sleep(retry_delay)
-                else:
-                    break
-
-        # 重试失败后返回回退消息
-        error_msg = f"请求失败，已重试 {max_retries} 次: {last_error or '未知错误'}"
-        logging.error(f"[LLMClient] {error_msg}")
-        raise RuntimeError(error_msg)
+    def __init__(self, **kwargs):
+        kwargs.setdefault("max_content_length", 409600)
+        super().__init__(**kwargs)
 
     async def search_stocks_by_tag(
         self, tag: str, crawler: SearchClient = None, max_pages: int = 10
@@ -312,9 +252,60 @@ class LLMClient:
 
         logging.info(f"开始搜索股票标签: {tag}")
 
+        # 搜索与页面获取共用一个连接池
+        async with httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=TAG_PAGE_FETCH_CONCURRENCY)
+        ) as client:
+            return await self._search_stocks_by_tag(tag, crawler, max_pages, client)
+
+    async def _fetch_pages(
+        self, crawler: SearchClient, pages: List[tuple], client: httpx.AsyncClient
+    ) -> List[Dict[str, Any]]:
+        """
+        并发获取选定页面的内容，每个页面最多等待 TAG_PAGE_FETCH_TIMEOUT 秒，超时或失败的页面被丢弃
+
+        Args:
+            pages: [(页面位置ID, SearchResult), ...]
+
+        Returns:
+            成功获取的页面列表，顺序与 pages 一致
+        """
+
+        async def fetch(page_id, result):
+            logging.info(f"正在爬取页面 {page_id}: {result.link}")
+            try:
+                content = await asyncio.wait_for(
+                    crawler.fetch_content(result.link, client=client),
+                    TAG_PAGE_FETCH_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                logging.warning(
+                    f"爬取页面 {page_id} 超过 {TAG_PAGE_FETCH_TIMEOUT} 秒，已跳过: {result.link}"
+                )
+                return None
+            # fetch_content 失败时返回以"错误:"开头的说明，不交给模型
+            if not content or content.startswith("错误:"):
+                return None
+            return {
+                "page_id": page_id,
+                "url": result.link,
+                "title": result.title,
+                "content": content[:10000],  # 限制内容长度
+            }
+
+        fetched = await asyncio.gather(
+            *(fetch(page_id, result) for page_id, result in pages)
+        )
+        return [page for page in fetched if page is not None]
+
+    async def _search_stocks_by_tag(
+        self, tag: str, crawler: SearchClient, max_pages: int, client: httpx.AsyncClient
+    ) -> Dict[str, Any]:
         # 1. 使用API搜索相关内容
         search_query = f"{tag} 相关的A股"
-        search_results = await crawler.search(search_query, max_results=max_pages)
+        search_results = await crawler.search(
+            search_query, max_results=max_pages, client=client
+        )
 
         if not search_results:
             return {"status": "error", "message": f"未找到与'{tag}'相关的搜索结果"}
@@ -340,7 +331,7 @@ class LLMClient:
 
         # 3. 发送请求给模型，获取要爬取的页面ID
         try:
-            page_ids_response = self.chat(
+            page_ids_response = await self.achat(
                 messages=[{"role": "user", "content": extract_pages_prompt}],
                 temperature=0.3,
             )
@@ -355,21 +346,13 @@ class LLMClient:
             if not page_ids:
                 return {"status": "error", "message": "未找到合适的页面ID"}
 
-            # 4. 获取选定页面的内容
-            pages_content = []
-            for page_id in page_ids:
-                if 1 <= page_id <= len(search_results):
-                    page_url = search_results[page_id - 1].link
-                    logging.info(f"正在爬取页面 {page_id}: {page_url}")
-                    content = await crawler.fetch_content(page_url)
-                    pages_content.append(
-                        {
-                            "page_id": page_id,
-                            "url": page_url,
-                            "title": search_results[page_id - 1].title,
-                            "content": content[:10000],  # 限制内容长度
-                        }
-                    )
+            # 4. 并发获取选定页面的内容（去重，忽略越界的ID）
+            pages = [
+                (page_id, search_results[page_id - 1])
+                for page_id in dict.fromkeys(page_ids)
+                if isinstance(page_id, int) and 1 <= page_id <= len(search_results)
+            ]
+            pages_content = await self._fetch_pages(crawler, pages, client)
 
             if not pages_content:
                 return {"status": "error", "message": "未能成功爬取任何页面内容"}
@@ -401,7 +384,7 @@ class LLMClient:
             """
 
             # 6. 发送请求提取股票信息
-            stocks_response = self.chat(
+            stocks_response = await self.achat(
                 messages=[{"role": "user", "content": extract_stocks_prompt}],
             )
 
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+嵌入向量存储迁移任务
+功能：把 news_embeddings / embedding_cache 表的 embedding_vector 列从 JSON 转换为二进制 float32/float16
+
+用法:
+    python migrate_embeddings.py                  # 执行迁移
+    python migrate_embeddings.py --dry-run        # 只统计需要迁移的表和行数
+    python migrate_embeddings.py --dtype float16  # 以 float16 存储
+
+每张表的步骤:
+1. 新增临时二进制列 embedding_blob
+2. 分批读取 JSON 向量，编码后写入临时列；无法解析的行直接删除
+3. 删除旧列，把临时列重命名为 embedding_vector（MySQL 上在同一条 ALTER TABLE 中完成）
+
+列已经是二进制类型的表会被跳过；中途中断后重新执行会从未转换的行继续，
+旧列已删除但临时列尚未重命名的表只补做重命名
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from sqlalchemy import LargeBinary, and_, bindparam, column, delete, func, inspect, select, table, text, update
+from sqlalchemy.exc import SQLAlchemyError
+from dotenv import load_dotenv
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.db import engine
+from utils.vector_codec import encode_vector, decode_vector, EMBEDDING_STORAGE_DTYPE
+
+# 加载环境变量
+load_dotenv(override=True)
+
+# 迁移阶段：新增临时列并转换 / 继续转换 / 只需重命名临时列
+STAGE_CONVERT = 'convert'
+STAGE_RESUME = 'resume'
+STAGE_RENAME = 'rename'
+
+# 需要迁移的表及其主键
+EMBEDDING_TABLES = {
+    'news_embeddings': ['news_id'],
+    'embedding_cache': ['model_name', 'content_hash'],
+}
+TEMP_COLUMN = 'embedding_blob'
+BATCH_SIZE = int(os.getenv("MIGRATE_BATCH_SIZE", 500))
+
+
+def _is_binary(column_info):
+    """反射得到的列类型是否为二进制"""
+    try:
+        return column_info['type'].python_type is bytes
+    except NotImplementedError:
+        return False
+
+
+def _pending_tables():
+    """返回 {表名: 迁移阶段}，只包含仍需迁移的表"""
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    pending = {}
+    for name in EMBEDDING_TABLES:
+        if name not in existing:
+            continue
+        columns = {col['name']: col for col in inspector.get_columns(name)}
+        if 'embedding_vector' in columns:
+            if not _is_binary(columns['embedding_vector']):
+                pending[name] = STAGE_RESUME if TEMP_COLUMN in columns else STAGE_CONVERT
+        elif TEMP_COLUMN in columns:
+            # 上次迁移删除旧列后中断
+            pending[name] = STAGE_RENAME
+    return pending
+
+
+def _swap_columns(name, blob_type, drop_old=True):
+    """删除旧列（drop_old 为 False 时旧列已不存在），把临时列重命名为 embedding_vector"""
+    with engine.begin() as conn:
+        if engine.dialect.name == 'mysql':
+            # MySQL 的 DDL 会隐式提交，删列和改名必须放在同一条语句中，否则中断后表里没有 embedding_vector 列
+            drop_clause = "DROP COLUMN embedding_vector, " if drop_old else ""
+            conn.execute(text(
+                f"ALTER TABLE {name} {drop_clause}CHANGE {TEMP_COLUMN} embedding_vector {blob_type} NOT NULL "
+                f"COMMENT '嵌入向量，带维度头的二进制 float32/float16'"
+            ))
+        else:
+            if drop_old:
+                conn.execute(text(f"ALTER TABLE {name} DROP COLUMN embedding_vector"))
+            conn.execute(text(f"ALTER TABLE {name} RENAME COLUMN {TEMP_COLUMN} TO embedding_vector"))
+
+
+def migrate_table(name, stage, dtype):
+    """
+    迁移一张表
+
+    返回:
+    - dict: 转换行数、删除行数、迁移前后向量数据的字节数
+    """
+    pk = EMBEDDING_TABLES[name]
+    blob_type = LargeBinary().compile(dialect=engine.dialect)
+    tbl = table(name, *[column(c) for c in pk], column('embedding_vector'), column(TEMP_COLUMN, LargeBinary))
+    stats = {'converted': 0, 'deleted': 0, 'json_bytes': 0, 'binary_bytes': 0}
+
+    if stage == STAGE_RENAME:
+        _swap_columns(name, blob_type, drop_old=False)
+        return stats
+
+    if stage == STAGE_CONVERT:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {name} ADD COLUMN {TEMP_COLUMN} {blob_type}"))
+
+    update_stmt = update(tbl).where(
+        and_(*[tbl.c[c] == bindparam(f"_{c}") for c in pk])
+    ).values({TEMP_COLUMN: bindparam('_blob')})
+    delete_stmt = delete(tbl).where(and_(*[tbl.c[c] == bindparam(f"_{c}") for c in pk]))
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(*[tbl.c[c] for c in pk], tbl.c.embedding_vector)
+                .where(tbl.c[TEMP_COLUMN].is_(None))
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+
+            updates, deletes = [], []
+            for row in rows:
+                key = {f"_{c}": row._mapping[c] for c in pk}
+                raw = row._mapping['embedding_vector']
+                try:
+                    vector = decode_vector(raw)
+                except (ValueError, TypeError):
+                    vector = None
+                if vector is None or not vector.size:
+                    deletes.append(key)
+                    continue
+                blob = encode_vector(vector, dtype)
+                updates.append({**key, '_blob': blob})
+                stats['json_bytes'] += len(raw) if isinstance(raw, (str, bytes)) else len(str(raw))
+                stats['binary_bytes'] += len(blob)
+
+            if updates:
+                conn.execute(update_stmt, updates)
+            if deletes:
+                conn.execute(delete_stmt, deletes)
+            stats['converted'] += len(updates)
+            stats['deleted'] += len(deletes)
+        print(f"   {name}: 已转换 {stats['converted']} 行")
+
+    # 替换旧列
+    _swap_columns(name, blob_type)
+    if engine.dialect.name == 'mysql':
+        # 回收旧 JSON 数据占用的空间
+        with engine.connect() as conn:
+            conn.execute(text(f"OPTIMIZE TABLE {name}"))
+    return stats
+
+
+def main():
+    """主函数：执行嵌入向量存储迁移"""
+    parser = argparse.ArgumentParser(description="把嵌入向量从 JSON 列迁移为二进制列")
+    parser.add_argument("--dry-run", action="store_true", help="只统计需要迁移的表和行数")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=EMBEDDING_STORAGE_DTYPE,
+                        help="向量存储精度，默认取 EMBEDDING_STORAGE_DTYPE")
+    args = parser.parse_args()
+
+    print("🔁 嵌入向量存储迁移开始")
+    print("=" * 50)
+    start_time = datetime.now()
+
+    try:
+        pending = _pending_tables()
+        if not pending:
+            print("✅ 嵌入向量已是二进制存储，无需迁移")
+            return 0
+
+        for name, stage in pending.items():
+            if stage == STAGE_RENAME:
+                print(f"📊 {name}: 数据已转换，只需重命名 {TEMP_COLUMN} 列（继续上次未完成的迁移）")
+                continue
+            with engine.connect() as conn:
+                count = conn.execute(select(func.count()).select_from(table(name))).scalar()
+            print(f"📊 {name}: {count} 行待迁移" + ("（继续上次未完成的迁移）" if stage == STAGE_RESUME else ""))
+        if args.dry_run:
+            return 0
+
+        for name, stage in pending.items():
+            stats = migrate_table(name, stage, args.dtype)
+            if stage == STAGE_RENAME:
+                print(f"✅ {name}: 已把 {TEMP_COLUMN} 列重命名为 embedding_vector")
+                continue
+            ratio = stats['json_bytes'] / stats['binary_bytes'] if stats['binary_bytes'] else 0
+            print(f"✅ {name}: 转换 {stats['converted']} 行，删除无效数据 {stats['deleted']} 行，"
+                  f"向量数据 {stats['json_bytes'] / 1024 / 1024:.1f}MB -> {stats['binary_bytes'] / 1024 / 1024:.1f}MB "
+                  f"(压缩 {ratio:.1f} 倍)")
+    except SQLAlchemyError as e:
+        print(f"❌ 迁移失败: {e}")
+        return 1
+
+    print(f"{'=' * 50}")
+    print(f"🎉 迁移完成，耗时 {(datetime.now() - start_time).total_seconds():.2f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    """脚本入口点"""
+    sys.exit(main())
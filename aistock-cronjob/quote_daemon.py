@@ -0,0 +1,161 @@
+"""
+行情常驻进程：在同一个进程内按固定间隔采集市场指数和实时行情
+
+取代 crontab 中每 10 秒启动一次的 get_index.py 与每分钟启动一次的 get_realtime_quotes.py，
+akshare/pandas 只导入一次，数据库引擎和HTTP连接在多次采集之间复用，HTTP会话只在进程退出时关闭。
+
+- 每个任务在独立线程中运行，互不阻塞
+- 同一任务不会重叠执行：上一次未结束时跳过到期的执行，并计入 overruns
+- 定期输出每个任务的执行次数、失败次数与耗时统计
+
+环境变量:
+- INDEX_INTERVAL_SECONDS: 指数采集间隔，默认10秒
+- QUOTE_INTERVAL_SECONDS: 实时行情采集间隔，默认60秒（只在交易时段采集）
+- DAEMON_METRICS_INTERVAL_SECONDS: 统计输出间隔，默认300秒
+"""
+import logging
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from utils.save import initialize_database
+from get_index import get_market_indices, close_session as close_index_session
+from get_realtime_quotes import fetch_realtime_quotes, is_trading_time, close_session as close_quote_session
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("quote_daemon")
+
+INDEX_INTERVAL_SECONDS = float(os.getenv("INDEX_INTERVAL_SECONDS", 10))
+QUOTE_INTERVAL_SECONDS = float(os.getenv("QUOTE_INTERVAL_SECONDS", 60))
+DAEMON_METRICS_INTERVAL_SECONDS = float(os.getenv("DAEMON_METRICS_INTERVAL_SECONDS", 300))
+
+
+@dataclass
+class TaskMetrics:
+    """单个任务的执行统计（自上次输出以来）"""
+    runs: int = 0
+    failures: int = 0
+    overruns: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, elapsed: float, ok: bool) -> None:
+        with self.lock:
+            self.runs += 1
+            self.failures += 0 if ok else 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            self.last_seconds = elapsed
+
+    def record_overrun(self, skipped: int) -> None:
+        with self.lock:
+            self.overruns += skipped
+
+    def snapshot_and_reset(self) -> dict:
+        with self.lock:
+            snapshot = {
+                "runs": self.runs,
+                "failures": self.failures,
+                "overruns": self.overruns,
+                "avg_ms": round(self.total_seconds / self.runs * 1000, 1) if self.runs else 0.0,
+                "max_ms": round(self.max_seconds * 1000, 1),
+                "last_ms": round(self.last_seconds * 1000, 1),
+            }
+            self.runs = self.failures = self.overruns = 0
+            self.total_seconds = self.max_seconds = 0.0
+            return snapshot
+
+
+@dataclass
+class PeriodicTask:
+    """
+    按固定间隔执行的任务
+
+    func 返回 False 或抛出异常视为失败；should_run 返回 False 时跳过本次执行（如非交易时段）
+    """
+    name: str
+    interval: float
+    func: Callable[[], Optional[bool]]
+    should_run: Callable[[], bool] = lambda: True
+    metrics: TaskMetrics = field(default_factory=TaskMetrics)
+
+    def run_forever(self, stop_event: threading.Event) -> None:
+        next_run = time.monotonic()
+        while not stop_event.is_set():
+            if self.should_run():
+                started = time.monotonic()
+                ok = False
+                try:
+                    ok = self.func() is not False
+                except Exception as e:
+                    logger.error(f"[{self.name}] 执行失败: {e}", exc_info=True)
+                elapsed = time.monotonic() - started
+                self.metrics.record(elapsed, ok)
+                logger.debug(f"[{self.name}] 耗时 {elapsed:.2f} 秒")
+
+            # 按固定节奏调度；执行时间超过间隔时跳过错过的轮次，不补跑
+            next_run += self.interval
+            now = time.monotonic()
+            if now > next_run:
+                skipped = int((now - next_run) // self.interval) + 1
+                self.metrics.record_overrun(skipped)
+                logger.warning(f"[{self.name}] 执行超时，跳过 {skipped} 次")
+                next_run += skipped * self.interval
+            stop_event.wait(next_run - now)
+
+
+def log_metrics(tasks, stop_event: threading.Event) -> None:
+    """定期输出各任务的执行统计"""
+    while not stop_event.wait(DAEMON_METRICS_INTERVAL_SECONDS):
+        for task in tasks:
+            logger.info(f"[metrics] {task.name}: {task.metrics.snapshot_and_reset()}")
+
+
+def main():
+    initialize_database()
+
+    tasks = [
+        PeriodicTask("index", INDEX_INTERVAL_SECONDS, get_market_indices),
+        PeriodicTask(
+            "realtime_quotes",
+            QUOTE_INTERVAL_SECONDS,
+            lambda: not fetch_realtime_quotes().empty,
+            should_run=is_trading_time,
+        ),
+    ]
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"收到信号 {signum}，等待当前任务结束后退出")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    threads = [
+        threading.Thread(target=task.run_forever, args=(stop_event,), name=task.name, daemon=True)
+        for task in tasks
+    ]
+    threads.append(threading.Thread(target=log_metrics, args=(tasks, stop_event), name="metrics", daemon=True))
+    for thread in threads:
+        thread.start()
+    logger.info("行情常驻进程已启动: " + ", ".join(f"{task.name} 每 {task.interval:g} 秒" for task in tasks))
+
+    # 主线程等待信号
+    while not stop_event.is_set():
+        stop_event.wait(1)
+    for thread in threads:
+        thread.join(timeout=30)
+    close_index_session()
+    close_quote_session()
+    logger.info("行情常驻进程已退出")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,13 @@ export PYTHONPATH="/app:$PYTHONPATH"
 export PYTHON_PATH=$(which python)
 echo "Using Python executable: $PYTHON_PATH"
 
+# 写入嵌入向量的任务启动前先完成存储迁移：db.create_all() 不会修改已有表，
+# 未迁移的 JSON 列无法写入二进制向量。迁移失败时退出，由容器重启策略重试
+cd /app && $PYTHON_PATH migrate_embeddings.py || {
+    echo "migrate_embeddings.py failed at $(date), exiting"
+    exit 1
+}
+
 # 启动cron服务
 service cron start
 
@@ -30,6 +37,15 @@ touch /var/log/cron/cache_clean.log
 touch /var/log/cron/cache_stock_detail_page.log
 touch /var/log/cron/log_cleanup.log
 touch /var/log/cron/cleanup_old_news.log
+touch /var/log/cron/quote_daemon.log
+touch /var/log/cron/news_index.log
+
+# 启动行情常驻进程（市场指数、实时行情），异常退出后自动重启
+(while true; do
+    cd /app && $PYTHON_PATH quote_daemon.py >> /var/log/cron/quote_daemon.log 2>&1
+    echo "quote_daemon exited at $(date), restarting in 5s" >> /var/log/cron/quote_daemon.log
+    sleep 5
+done) &
 
 # 输出启动信息
 echo "AI Stock Cron Service started at $(date)"
@@ -6,98 +6,59 @@ AI工具模块
 from __future__ import annotations
 import os
 import logging
-import time
-from dataclasses import dataclass
-from typing import List, Dict
-
-from openai import OpenAI
-from requests.exceptions import RequestException, Timeout, ConnectionError
 import re
 import json
 
-# --------------------------------------------------------------------------- #
-# DeepSeek Client (via OpenAI-compatible LLM)
-# --------------------------------------------------------------------------- #
-@dataclass
-class DeepSeekClient:
-    base_url: str = os.getenv("LLM_BASE_URL")
-    api_key: str = os.getenv("LLM_API_KEY")
-    default_model: str = os.getenv("LLM_MODEL")
-    timeout: int = 180  # 增加超时时间（秒）
-    max_content_length: int = 40960  # 最大内容长度限制
-    client: OpenAI | None = None
-
-    def __post_init__(self):
-        if not (self.base_url and self.api_key and self.default_model):
-            raise RuntimeError(
-                "请设置环境变量 LLM_BASE_URL, LLM_API_KEY, LLM_MODEL"
-            )
-        # 初始化 OpenAI 客户端实例
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url.rstrip("/"),
-            timeout=self.timeout,  # 设置全局超时时间
-        )
-
-    def chat(
-        self,
-        messages: List[Dict[str, str]],
-        model: str | None = None,
-        temperature: float = 0.3,
-        max_retries: int = 5,  # 增加重试次数
-        retry_delay: int = 3,  # 重试延迟（秒）
-    ) -> str:
-        # 确保消息内容不超过最大长度
-        processed_messages: List[Dict[str, str]] = []
-        for msg in messages:
-            content = msg.get("content", "")
-            if len(content) > self.max_content_length:
-                content = (
-                    content[: self.max_content_length]
-                    + f"\n...(内容已截断，原长度:{len(content)}字符)"
-                )
-            processed_messages.append({
-                "role": msg.get("role", "user"),
-                "content": content,
-            })
-
-        retries = 0
-        last_error = None
-        while retries < max_retries:
-            try:
-                response = self.client.chat.completions.create(
-                    model=model or self.default_model,
-                    messages=processed_messages,
-                    temperature=temperature,
-                )
-                return response.choices[0].message.content.strip()
-            except (RequestException, ConnectionError, Timeout) as e:
-                retries += 1
-                last_error = e
-                logging.warning(f"[DeepSeekClient] 请求失败，重试 {retries}/{max_retries}: {e}")
-                if retries < max_retries:
-                    time.sleep(retry_delay * retries)  # 指数退避重试延迟
-                else:
-                    logging.error(f"[DeepSeekClient] 请求彻底失败，已重试 {max_retries} 次: {e}")
-            except Exception as e:
-                # 捕获其他所有异常
-                logging.error(f"[DeepSeekClient] 未预期的错误: {e}", exc_info=True)
-                retries += 1
-                if retries < max_retries:
-                    time.sleep(retry_delay)
-                else:
-                    break
-        
-        # 重试失败后返回回退消息
-        error_msg = f"请求失败，已重试 {max_retries} 次: {last_error or '未知错误'}"
-        logging.error(f"[DeepSeekClient] {error_msg}")
-        raise RuntimeError(error_msg)
+from . import llm_memo
+from .llm_client import ChatClient
 
-   
 # --------------------------------------------------------------------------- #
 # 公共对外函数
 # --------------------------------------------------------------------------- #
-_deepseek = DeepSeekClient(default_model="deepseek-ai/DeepSeek-V3")
+_deepseek = ChatClient(default_model="deepseek-ai/DeepSeek-V3")
+
+# 提示词模板版本（llm_memo 的键之一），修改对应提示词时需要递增
+STOCKS_NEWS_PROMPT_VERSION = "stocks_news:v1"
+# 与后端 utils/ai_utils.py 一致，两边共用记忆
+FINANCIAL_NEWS_PROMPT_VERSION = "financial_news:v1"
+
+
+def _parse_json_reply(response):
+    """
+    从大模型回复中解析JSON：先整体解析，失败时再提取代码块或首个JSON片段
+
+    返回:
+    - 解析结果；无法解析时返回None
+    """
+    # 先尝试清理和标准化响应
+    cleaned_response = response.strip()
+
+    # 首先尝试直接解析整个响应
+    try:
+        return json.loads(cleaned_response)
+    except json.JSONDecodeError:
+        pass
+
+    # 如果直接解析失败，尝试提取JSON部分
+    json_pattern = r'```(?:json)?\s*([\s\S]*?)\s*```|(\[[\s\S]*?\]|\{[\s\S]*?\})'
+    json_matches = re.findall(json_pattern, cleaned_response)
+
+    for match in json_matches:
+        # 取非空的匹配组
+        json_str = match[0] if match[0] else match[1]
+        json_str = json_str.strip()
+
+        if json_str:
+            try:
+                return json.loads(json_str)
+            except json.JSONDecodeError as e:
+                logging.error(f"JSON解析错误 (匹配部分): {e}, 内容: {json_str[:100]}...")
+
+    # 特殊处理空数组的情况
+    if '[]' in cleaned_response:
+        return []
+    return None
+
 
 def analyze_stocks_news(stocks_with_news):
     """
@@ -154,40 +115,87 @@ def analyze_stocks_news(stocks_with_news):
             {"role": "user", "content": prompt}
         ]
         
-        response = client.chat(messages)
+        # 相同的自选股与新闻组合直接复用上次的回复
+        model = client.default_model
+        response = llm_memo.lookup(STOCKS_NEWS_PROMPT_VERSION, model, stocks_with_news)
+        usage = None
+        memo_hit = response is not None
+        if not memo_hit:
+            response, usage = client.chat(messages, with_usage=True)
         # 记录完整响应，便于调试
         logging.debug(f"AI原始响应: {response}")
-        
-        # 先尝试清理和标准化响应
-        cleaned_response = response.strip()
-        
-        # 首先尝试直接解析整个响应
-        try:
-            result = json.loads(cleaned_response)
-            return result
-        except json.JSONDecodeError:
-            # 如果直接解析失败，尝试提取JSON部分
-            json_pattern = r'```(?:json)?\s*([\s\S]*?)\s*```|(\[[\s\S]*?\]|\{[\s\S]*?\})'
-            json_matches = re.findall(json_pattern, cleaned_response)
-            
-            for match in json_matches:
-                # 取非空的匹配组
-                json_str = match[0] if match[0] else match[1]
-                json_str = json_str.strip()
-                
-                if json_str:
-                    try:
-                        result = json.loads(json_str)
-                        return result
-                    except json.JSONDecodeError as e:
-                        logging.error(f"JSON解析错误 (匹配部分): {e}, 内容: {json_str[:100]}...")
-            
-            # 特殊处理空数组的情况
-            if '[]' in cleaned_response:
-                return []
-                
-            logging.error(f"无法从AI响应中解析JSON，原始响应：{cleaned_response[:200]}...")
+
+        result = _parse_json_reply(response)
+        if result is None:
+            logging.error(f"无法从AI响应中解析JSON，原始响应：{response.strip()[:200]}...")
             return []
+        if not memo_hit:
+            llm_memo.store(STOCKS_NEWS_PROMPT_VERSION, model, stocks_with_news, response, usage)
+        return result
     except Exception as e:
         logging.error(f"分析股票新闻时发生错误: {str(e)}", exc_info=True)
         return []
+
+
+def analyze_financial_news(news_text):
+    """
+    判断一组新闻对股票的影响（提示词与解析方式与后端 utils/ai_utils.py 的 analyze_financial_news 一致）
+
+    参数:
+    - news_text: 合并后的新闻文本，每条形如 "【新闻1：标题】内容 (链接)"
+
+    返回:
+    - {'conclusion': '重大利好|利好|中性|利空|重大利空|未知', 'reason': '...', 'news_list': ['1. [标题](链接)', ...]}
+    """
+    prompt = (
+        "你是一个金融分析师，请根据以下一系列新闻判断其对市场的影响，"
+        "结论应为【重大利好】、【利好】、【利空】、【重大利空】或【中性】，并简要说明理由。\n\n"
+        "请注意：如果在理由中引用了具体新闻，请使用 Markdown 超链接格式包装新闻，"
+        "即使用 `[新闻标题](新闻链接)` 的形式，使其可以点击访问。\n\n"
+        "需要给出参考的新闻列表，新闻列表不能重复，仅仅给出有意义、有参考价值、评价过程中使用到的新闻。\n\n"
+        "新闻内容：\n"
+        f"{news_text}\n\n"
+        "请严格按照格式回答：\n"
+        "结论：【重大利好/重大利空/利好/利空/中性】\n"
+        "理由：XXX\n"
+        "新闻列表："
+        "1. [新闻标题1](链接1)\n"
+        "2. [新闻标题2](链接2)\n"
+        "3. [新闻标题3](链接3)\n"
+        "...\n"
+    )
+    try:
+        model = os.getenv("LLM_MODEL") or _deepseek.default_model
+        reply = llm_memo.lookup(FINANCIAL_NEWS_PROMPT_VERSION, model, news_text)
+        usage = None
+        memo_hit = reply is not None
+        if not memo_hit:
+            reply, usage = _deepseek.chat(
+                [{"role": "user", "content": prompt}],
+                model=model,
+                temperature=0.5,
+                with_usage=True,
+            )
+
+        conclusion = "未知"
+        for c in ("重大利好", "利好", "中性", "利空", "重大利空"):
+            if f"【{c}】" in reply:
+                conclusion = c
+                break
+
+        reason = reply.split("理由：", 1)[-1].split("新闻列表：", 1)[0].strip()
+
+        news_list = []
+        for line in reply.split("新闻列表：", 1)[-1].strip().splitlines():
+            line = line.strip()
+            # 匹配以数字加点开头的条目
+            if len(line) > 1 and line[0].isdigit() and line[1] == '.':
+                news_list.append(line)
+
+        # 只记住给出了明确结论的回复
+        if not memo_hit and conclusion != "未知":
+            llm_memo.store(FINANCIAL_NEWS_PROMPT_VERSION, model, news_text, reply, usage)
+        return {"conclusion": conclusion, "reason": reason, "news_list": news_list}
+    except Exception as e:
+        logging.error(f"分析金融新闻失败: {e}", exc_info=True)
+        return {"conclusion": "未知", "reason": f"分析失败: {str(e)}", "news_list": []}
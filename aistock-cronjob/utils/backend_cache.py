@@ -0,0 +1,67 @@
+# utils/backend_cache.py
+"""
+按后端的缓存格式写入Redis，定时任务算好的结果可以直接被后端接口读取
+
+- 缓存值格式与后端 utils/cache_codec.py 一致：4字节头(0xAC, 版本1, 序列化器1=json, 压缩0=不压缩) + JSON
+- 条目格式与后端 redis_cache.get_or_compute 一致：{"data": 数据, "fresh_until": 软过期时间戳}，
+  Redis 中的过期时间为软过期时间再加上宽限期
+- 写入后在 cache:invalidate 频道广播，后端各进程丢弃自己的进程内缓存副本
+"""
+
+import json
+import os
+import socket
+import time
+import redis
+
+REDIS_BROKER_URL = os.getenv("REDIS_BROKER_URL", "redis://redis:6379/0")
+
+# 与后端 utils/cache_codec.py 的 CODEC_MAGIC / CODEC_FORMAT_VERSION / SERIALIZER_JSON / COMPRESSION_NONE 一致
+_CODEC_HEADER = bytes((0xAC, 1, 1, 0))
+# 与后端 utils/redis_cache.py 的 CACHE_INVALIDATION_CHANNEL 一致
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+_client = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.from_url(REDIS_BROKER_URL)
+    return _client
+
+
+def encode_cache_value(data):
+    """编码为后端可解码的缓存值"""
+    return _CODEC_HEADER + json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def warm_computed_cache(entries, stale_seconds=0):
+    """
+    批量写入 get_or_compute 格式的缓存条目（一次往返）
+
+    参数:
+    - entries: 列表 [(键, 数据, 软过期秒数), ...]
+    - stale_seconds: 软过期后仍可返回旧值的宽限期(秒)，与后端调用 get_or_compute 时的 stale_seconds 一致
+
+    返回:
+    - int: 写入的键数量，Redis 不可用时返回0
+    """
+    if not entries:
+        return 0
+    try:
+        now = time.time()
+        pipe = _redis().pipeline(transaction=False)
+        for key, data, expire_seconds in entries:
+            entry = {"data": data, "fresh_until": now + expire_seconds}
+            pipe.setex(key, int(expire_seconds + stale_seconds), encode_cache_value(entry))
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({
+            "origin": f"cronjob:{socket.gethostname()}:{os.getpid()}",
+            "keys": [key for key, _, _ in entries],
+            "pattern": None
+        }))
+        pipe.execute()
+        return len(entries)
+    except redis.RedisError as e:
+        print(f"❗ 写入后端缓存失败: {e}")
+        return 0
@@ -0,0 +1,130 @@
+# utils/embedding_window.py
+"""
+近期新闻嵌入向量窗口，用于相似新闻去重
+
+- 向量在加入时归一化并以 float32 矩阵保存，余弦相似度即点积
+- 一批新向量与窗口内全部向量的相似度由一次矩阵乘法得到
+- 同一批内的新向量相互之间也做去重，先出现的保留
+- 保留下来的新向量加入窗口，后续批次会与它们比较
+
+窗口扩大到数千条时，单次打分仍只是一次 (批大小 x 窗口大小) 的矩阵乘法
+"""
+
+from typing import Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """转换为 float32 矩阵并按行归一化，零向量保持为零"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingWindow:
+    """
+    归一化嵌入矩阵
+
+    参数:
+    - ids: 窗口内向量对应的键（通常为新闻ID）
+    - vectors: 与 ids 一一对应的嵌入向量
+    """
+
+    def __init__(self, ids: Sequence[Hashable] = (), vectors: Sequence = ()):
+        self.ids: List[Hashable] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        if len(ids):
+            self.add(ids, vectors)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """窗口内的归一化向量 (窗口大小 x 维度)"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def add(self, ids: Sequence[Hashable], vectors, normalized: bool = False) -> None:
+        """加入向量，容量按倍数扩展，避免每次加入都复制整个矩阵"""
+        if not len(ids):
+            return
+        rows = np.asarray(vectors, dtype=np.float32) if normalized else normalize_rows(vectors)
+        if self._matrix is None:
+            self._matrix = np.empty((max(len(rows), 16), rows.shape[1]), dtype=np.float32)
+        elif rows.shape[1] != self._matrix.shape[1]:
+            raise ValueError(f"向量维度不一致: {rows.shape[1]} != {self._matrix.shape[1]}")
+        needed = self._size + len(rows)
+        if needed > len(self._matrix):
+            grown = np.empty((max(needed, len(self._matrix) * 2), self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size:needed] = rows
+        self._size = needed
+        self.ids.extend(ids)
+
+    def best_matches(self, vectors) -> Tuple[List[Optional[Hashable]], np.ndarray]:
+        """
+        为每个向量找到窗口内最相似的一条
+
+        返回:
+        - (最相似的键列表, 相似度数组)，窗口为空时键为None、相似度为0
+        """
+        queries = normalize_rows(vectors)
+        if not self._size:
+            return [None] * len(queries), np.zeros(len(queries), dtype=np.float32)
+        scores = queries @ self.matrix.T
+        best = scores.argmax(axis=1)
+        return [self.ids[i] for i in best], scores[np.arange(len(queries)), best]
+
+    def find_duplicates(self, vectors, threshold: float, keys: Optional[Sequence[Hashable]] = None,
+                        add: bool = True) -> List[Optional[Tuple[Optional[Hashable], float]]]:
+        """
+        批量判断新向量是否与窗口内或同批内的向量重复
+
+        参数:
+        - vectors: 新向量
+        - threshold: 余弦相似度阈值，大于等于该值视为重复
+        - keys: 新向量加入窗口时使用的键，默认None
+        - add: 是否把不重复的新向量加入窗口
+
+        返回:
+        - 与 vectors 一一对应的列表：不重复为None，重复为 (重复对象的键, 相似度)；
+          与同批内先出现的向量重复时，键为该向量的 keys 值
+        """
+        queries = normalize_rows(vectors)
+        count = len(queries)
+        keys = list(keys) if keys is not None else [None] * count
+
+        if self._size:
+            window_scores = queries @ self.matrix.T
+            window_best = window_scores.argmax(axis=1)
+            window_best_scores = window_scores[np.arange(count), window_best]
+        else:
+            window_best = np.zeros(count, dtype=int)
+            window_best_scores = np.full(count, -1.0, dtype=np.float32)
+        batch_scores = queries @ queries.T
+
+        results: List[Optional[Tuple[Optional[Hashable], float]]] = []
+        kept: List[int] = []
+        for row in range(count):
+            if window_best_scores[row] >= threshold:
+                results.append((self.ids[window_best[row]], float(window_best_scores[row])))
+                continue
+            if kept:
+                candidates = batch_scores[row, kept]
+                best = int(candidates.argmax())
+                if candidates[best] >= threshold:
+                    results.append((keys[kept[best]], float(candidates[best])))
+                    continue
+            kept.append(row)
+            results.append(None)
+
+        if add and kept:
+            self.add([keys[row] for row in kept], queries[kept], normalized=True)
+        return results
@@ -0,0 +1,210 @@
+# fetch_scheduler.py
+"""
+定时任务共用的并发抓取调度器
+
+- 有界线程池并发执行抓取任务
+- 按上游（eastmoney / xueqiu / sina 等）分别做令牌桶限速，所有任务共享同一个限额
+- 失败后按指数退避+随机抖动重试
+- 每个上游一个熔断器：连续失败达到阈值后暂停请求该上游，冷却后放行一个探测请求
+
+用法:
+    with FetchScheduler() as scheduler:
+        for code, result, error in scheduler.map("eastmoney", fetch_one, codes):
+            ...
+"""
+
+from __future__ import annotations
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 线程池大小
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", 8))
+# 单个任务的最大尝试次数（含首次）
+FETCH_MAX_ATTEMPTS = int(os.getenv("FETCH_MAX_ATTEMPTS", 3))
+# 重试退避：第n次重试等待 random(0, min(上限, 基数 * 2^n)) 秒
+FETCH_BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", 1.0))
+FETCH_BACKOFF_MAX = float(os.getenv("FETCH_BACKOFF_MAX", 30.0))
+# 熔断：连续失败次数阈值与冷却时间(秒)
+FETCH_BREAKER_THRESHOLD = int(os.getenv("FETCH_BREAKER_THRESHOLD", 10))
+FETCH_BREAKER_COOLDOWN = float(os.getenv("FETCH_BREAKER_COOLDOWN", 60.0))
+
+# 各上游的默认限速：(每秒请求数, 突发容量)，可通过 FETCH_RATE_<上游> / FETCH_BURST_<上游> 覆盖
+DEFAULT_HOST_LIMITS = {
+    "eastmoney": (5.0, 5),
+    "eastmoney_push2": (20.0, 10),  # 行情快照分页接口，单次约60页
+    "xueqiu": (2.0, 2),
+    "sina": (2.0, 2),
+    "aistock": (5.0, 5),  # 自己的后端API（缓存预热）
+}
+# 未配置的上游使用的限速
+DEFAULT_RATE = (2.0, 2)
+
+
+class CircuitOpenError(RuntimeError):
+    """上游处于熔断状态，任务未执行"""
+
+
+class TokenBucket:
+    """线程安全的令牌桶，acquire 在令牌不足时阻塞等待"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    关闭：正常放行；连续失败达到阈值后打开
+    打开：拒绝所有请求，冷却时间过后进入半开
+    半开：只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """记录一次失败，返回熔断器是否因此（重新）打开"""
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.threshold):
+                self._opened_at = time.monotonic()
+                self._probing = False
+                return True
+            return False
+
+
+def _host_limit(host: str) -> Tuple[float, int]:
+    rate, burst = DEFAULT_HOST_LIMITS.get(host, DEFAULT_RATE)
+    key = host.upper()
+    return float(os.getenv(f"FETCH_RATE_{key}", rate)), int(os.getenv(f"FETCH_BURST_{key}", burst))
+
+
+class FetchScheduler:
+    """
+    并发抓取调度器
+
+    Args:
+        max_workers: 线程池大小
+        max_attempts: 单个任务的最大尝试次数
+    """
+
+    def __init__(self, max_workers: int = FETCH_MAX_WORKERS, max_attempts: int = FETCH_MAX_ATTEMPTS):
+        self.max_attempts = max(1, max_attempts)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "FetchScheduler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _limits_for(self, host: str) -> Tuple[TokenBucket, CircuitBreaker]:
+        with self._lock:
+            if host not in self._buckets:
+                rate, burst = _host_limit(host)
+                self._buckets[host] = TokenBucket(rate, burst)
+                self._breakers[host] = CircuitBreaker(FETCH_BREAKER_THRESHOLD, FETCH_BREAKER_COOLDOWN)
+            return self._buckets[host], self._breakers[host]
+
+    def _run(self, host: str, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        bucket, breaker = self._limits_for(host)
+        for attempt in range(1, self.max_attempts + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"上游 {host} 已熔断，跳过任务")
+            bucket.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if breaker.record_failure():
+                    logger.warning(f"上游 {host} 连续失败，熔断 {FETCH_BREAKER_COOLDOWN:.0f} 秒")
+                if attempt >= self.max_attempts:
+                    raise
+                delay = random.uniform(0, min(FETCH_BACKOFF_MAX, FETCH_BACKOFF_BASE * 2 ** attempt))
+                logger.warning(f"[{host}] 任务失败 (尝试 {attempt}/{self.max_attempts}): {e}，{delay:.1f} 秒后重试")
+                time.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    def acquire(self, host: str) -> None:
+        """任务内部需要对同一上游发起额外请求时，先调用此方法获取令牌"""
+        bucket, _ = self._limits_for(host)
+        bucket.acquire()
+
+    def submit(self, host: str, fn: Callable, *args, **kwargs):
+        """
+        提交一个抓取任务
+
+        Args:
+            host: 上游名称，决定使用哪个限速桶和熔断器
+            fn: 抓取函数，抛出异常视为失败并重试
+
+        Returns:
+            Future: 任务结果
+        """
+        return self._executor.submit(self._run, host, fn, args, kwargs)
+
+    def map(self, host: str, fn: Callable, items: Iterable) -> Iterator[Tuple[Any, Any, Exception | None]]:
+        """
+        对每个元素执行 fn(item)，按完成顺序返回结果
+
+        Yields:
+            tuple: (元素, 结果, 异常)，成功时异常为None，失败时结果为None
+        """
+        futures = {self.submit(host, fn, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
@@ -0,0 +1,193 @@
+# utils/llm_memo.py
+"""
+大模型调用结果的持久化记忆（memo）
+
+- 键: (提示词模板版本, 模型, 规范化输入的 SHA-256)，输入相同则直接返回上次的原始回复
+- 提示词模板修改后递增版本号（如 financial_news:v1 -> v2），旧记录自然失效
+- 每条记录有过期时间（LLM_MEMO_TTL_HOURS），过期记录视为未命中，由 cleanup_old_news.py 删除
+- 只有解析成功的回复才写入，调用失败或格式错误不会被记住
+- 与后端 utils/llm_memo.py 共用 llm_memo 表，相同提示词版本的结果两边互通
+
+用法:
+    reply = lookup("financial_news:v1", model, news_text)
+    if reply is None:
+        reply, usage = client.chat(messages, with_usage=True)
+        ...解析成功后...
+        store("financial_news:v1", model, news_text, reply, usage)
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from .db import SessionLocal
+from .model import LLMMemo
+from .upsert import bulk_upsert
+
+LLM_MEMO_ENABLED = os.getenv("LLM_MEMO_ENABLED", "1") == "1"
+# 记录的有效期(小时)
+LLM_MEMO_TTL_HOURS = float(os.getenv("LLM_MEMO_TTL_HOURS", 168))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_input(value):
+    """
+    规范化输入：字符串去掉首尾空白并把连续空白合并为一个空格；
+    其他类型按键排序序列化为 JSON（与后端 utils/llm_memo.py 一致）
+    """
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return _WHITESPACE.sub(" ", value.strip())
+
+
+def input_hash(value):
+    return hashlib.sha256(normalize_input(value).encode("utf-8")).hexdigest()
+
+
+class MemoStats:
+    """本进程的记忆命中与token节省统计（可能在多个线程中更新，需要加锁）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.calls = 0
+        self.tokens_used = 0
+        self.tokens_saved = 0
+
+    def record_hit(self, tokens):
+        with self.lock:
+            self.hits += 1
+            self.tokens_saved += tokens
+
+    def record_call(self, tokens):
+        with self.lock:
+            self.calls += 1
+            self.tokens_used += tokens
+
+    def summary(self):
+        with self.lock:
+            total = self.hits + self.calls
+            hit_rate = self.hits / total * 100 if total else 0.0
+            return (f"大模型记忆命中 {self.hits}/{total} ({hit_rate:.1f}%)，避免调用 {self.hits} 次，"
+                    f"实际调用消耗 {self.tokens_used} tokens，节省 {self.tokens_saved} tokens")
+
+
+memo_stats = MemoStats()
+
+
+def _usage_tokens(usage):
+    usage = usage or {}
+    return (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+
+
+def lookup(prompt_version, model_name, input_value):
+    """
+    查找未过期的记忆
+
+    返回:
+    - str: 上次的原始回复；未命中、已禁用或查询失败时返回None
+    """
+    if not LLM_MEMO_ENABLED:
+        return None
+    key = (prompt_version, model_name or "", input_hash(input_value))
+    session = SessionLocal()
+    try:
+        memo = session.get(LLMMemo, key)
+        if memo is None or memo.expires_at <= datetime.now():
+            return None
+        session.query(LLMMemo).filter(
+            LLMMemo.prompt_version == key[0], LLMMemo.model_name == key[1], LLMMemo.input_hash == key[2]
+        ).update({LLMMemo.hit_count: LLMMemo.hit_count + 1}, synchronize_session=False)
+        session.commit()
+        memo_stats.record_hit((memo.prompt_tokens or 0) + (memo.completion_tokens or 0))
+        return memo.output
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"❗ 查询大模型记忆失败: {e}")
+        return None
+    finally:
+        session.close()
+
+
+def store(prompt_version, model_name, input_value, output, usage=None, ttl_hours=None):
+    """
+    记录一次成功调用的原始回复，同时计入本进程的调用统计
+
+    参数:
+    - usage: 接口返回的用量 {prompt_tokens, completion_tokens}，没有时为None
+    - ttl_hours: 有效期(小时)，默认 LLM_MEMO_TTL_HOURS
+    """
+    memo_stats.record_call(_usage_tokens(usage))
+    if not LLM_MEMO_ENABLED or not output:
+        return
+    now = datetime.now()
+    usage = usage or {}
+    session = SessionLocal()
+    try:
+        bulk_upsert(session, LLMMemo, [{
+            'prompt_version': prompt_version,
+            'model_name': model_name or "",
+            'input_hash': input_hash(input_value),
+            'output': output,
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+            'hit_count': 0,
+            'created_at': now,
+            'expires_at': now + timedelta(hours=ttl_hours or LLM_MEMO_TTL_HOURS)
+        }], update_columns=['output', 'prompt_tokens', 'completion_tokens', 'created_at', 'expires_at'])
+        session.commit()
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"❗ 保存大模型记忆失败: {e}")
+    finally:
+        session.close()
+
+
+def cleanup_expired_memos():
+    """
+    删除已过期的记忆
+
+    返回:
+    - int: 删除的行数
+    """
+    session = SessionLocal()
+    try:
+        deleted = session.query(LLMMemo).filter(LLMMemo.expires_at <= datetime.now()).delete(synchronize_session=False)
+        session.commit()
+        return deleted
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"❗ 清理过期大模型记忆失败: {e}")
+        return 0
+    finally:
+        session.close()
+
+
+def get_memo_totals():
+    """
+    累计统计（跨进程、跨服务）
+
+    返回:
+    - dict: 记忆条数、累计命中（即避免的调用）次数、累计节省的token数
+    """
+    session = SessionLocal()
+    try:
+        entries, hits, tokens = session.query(
+            func.count(),
+            func.coalesce(func.sum(LLMMemo.hit_count), 0),
+            func.coalesce(func.sum(LLMMemo.hit_count * (
+                func.coalesce(LLMMemo.prompt_tokens, 0) + func.coalesce(LLMMemo.completion_tokens, 0)
+            )), 0)
+        ).one()
+        return {"entries": entries, "calls_avoided": int(hits), "tokens_saved": int(tokens)}
+    except SQLAlchemyError as e:
+        print(f"❗ 获取大模型记忆统计失败: {e}")
+        return {}
+    finally:
+        session.close()
@@ -0,0 +1,237 @@
+# utils/news_index.py
+"""
+新闻嵌入向量的本地 HNSW 近似最近邻索引（定时任务负责构建和维护，后端只读）
+
+- 每个嵌入模型一个索引，标签即新闻ID，余弦距离
+- 增量同步：只读取 news_embeddings 中 updated_at 不早于上次同步时间的行，新增或覆盖对应向量
+- 删除：标记删除，后续新增的向量复用被删除的位置
+- 写入：先写入新文件，再原子替换元数据文件指向新文件，读取方不会读到写了一半的索引
+- 同一目录的写操作用文件锁串行化（新闻任务的多个类别、清理任务可能同时运行）
+
+目录结构（NEWS_INDEX_DIR）:
+    <模型>.meta.json        元数据：维度、条数、容量、最近同步时间、当前索引文件名
+    <模型>.<代次>.hnsw      hnswlib 索引文件
+    <模型>.lock             写锁
+"""
+
+import fcntl
+import glob
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from sqlalchemy.exc import SQLAlchemyError
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+from .db import SessionLocal
+from .model import NewsEmbedding
+from .vector_codec import decode_vector
+
+# 索引文件目录（与后端共享的数据卷）
+NEWS_INDEX_DIR = os.getenv("NEWS_INDEX_DIR", "/app/data/news_index")
+# HNSW 参数：每个节点的连接数、构建时的候选集大小
+NEWS_INDEX_M = int(os.getenv("NEWS_INDEX_M", 16))
+NEWS_INDEX_EF_CONSTRUCTION = int(os.getenv("NEWS_INDEX_EF_CONSTRUCTION", 200))
+# 同步时每次从数据库读取的行数
+NEWS_INDEX_SYNC_BATCH = int(os.getenv("NEWS_INDEX_SYNC_BATCH", 2000))
+
+META_VERSION = 1
+
+
+def _slug(model_name):
+    """模型名转换为文件名"""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def _meta_path(model_name):
+    return os.path.join(NEWS_INDEX_DIR, f"{_slug(model_name)}.meta.json")
+
+
+@contextmanager
+def _write_lock(model_name):
+    """同一模型索引的写锁（跨进程）"""
+    os.makedirs(NEWS_INDEX_DIR, exist_ok=True)
+    with open(os.path.join(NEWS_INDEX_DIR, f"{_slug(model_name)}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _require_hnswlib():
+    if hnswlib is None:
+        raise RuntimeError("未安装 hnswlib，无法构建新闻向量索引（pip install hnswlib）")
+
+
+def load_meta(model_name):
+    """读取索引元数据，不存在时返回None"""
+    try:
+        with open(_meta_path(model_name), encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta if meta.get("version") == META_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def _load_index(model_name):
+    """加载已有索引，返回 (index, meta)，不存在时返回 (None, None)"""
+    meta = load_meta(model_name)
+    if meta is None:
+        return None, None
+    path = os.path.join(NEWS_INDEX_DIR, meta["file"])
+    if not os.path.exists(path):
+        return None, None
+    index = hnswlib.Index(space="cosine", dim=meta["dim"])
+    index.load_index(path, max_elements=meta["max_elements"], allow_replace_deleted=True)
+    return index, meta
+
+
+def _new_index(dim, capacity):
+    index = hnswlib.Index(space="cosine", dim=dim)
+    index.init_index(max_elements=max(capacity, 1024), ef_construction=NEWS_INDEX_EF_CONSTRUCTION,
+                     M=NEWS_INDEX_M, allow_replace_deleted=True)
+    return index
+
+
+def _save_index(model_name, index, meta):
+    """写入新代次的索引文件，再原子替换元数据，最后删除旧文件"""
+    generation = int(time.time() * 1000)
+    meta["file"] = f"{_slug(model_name)}.{generation}.hnsw"
+    meta["count"] = index.get_current_count()
+    meta["max_elements"] = index.get_max_elements()
+    meta["saved_at"] = datetime.now().isoformat()
+
+    index.save_index(os.path.join(NEWS_INDEX_DIR, meta["file"]))
+    tmp_meta = _meta_path(model_name) + ".tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_meta, _meta_path(model_name))
+
+    # 读取方已打开的旧文件在删除后仍可读完
+    for path in glob.glob(os.path.join(NEWS_INDEX_DIR, f"{_slug(model_name)}.*.hnsw")):
+        if os.path.basename(path) != meta["file"]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _iter_embeddings(model_name, since=None):
+    """按 (updated_at, news_id) 顺序分批读取嵌入，返回 (ID数组, 向量矩阵, 本批最大updated_at) 的生成器"""
+    session = SessionLocal()
+    try:
+        last_key = None
+        while True:
+            query = session.query(NewsEmbedding.news_id, NewsEmbedding.embedding_vector, NewsEmbedding.updated_at)\
+                .filter(NewsEmbedding.model_name == model_name)
+            if since is not None:
+                query = query.filter(NewsEmbedding.updated_at >= since)
+            if last_key is not None:
+                updated_at, news_id = last_key
+                query = query.filter(
+                    (NewsEmbedding.updated_at > updated_at) |
+                    ((NewsEmbedding.updated_at == updated_at) & (NewsEmbedding.news_id > news_id))
+                )
+            rows = query.order_by(NewsEmbedding.updated_at, NewsEmbedding.news_id).limit(NEWS_INDEX_SYNC_BATCH).all()
+            if not rows:
+                break
+            last_key = (rows[-1].updated_at, rows[-1].news_id)
+            ids, vectors = [], []
+            for row in rows:
+                vector = decode_vector(row.embedding_vector)
+                if vector is not None and vector.size:
+                    ids.append(row.news_id)
+                    vectors.append(vector)
+            if ids:
+                yield np.asarray(ids, dtype=np.int64), np.vstack(vectors), rows[-1].updated_at
+    finally:
+        session.close()
+
+
+def sync_news_index(model_name, rebuild=False):
+    """
+    把数据库中的新闻嵌入同步到索引
+
+    参数:
+    - model_name: 嵌入模型名称
+    - rebuild: 为True时忽略已有索引，全量重建（同时清理已删除的位置）
+
+    返回:
+    - dict: 本次新增或更新的向量数、索引中的向量总数（含已标记删除、尚未被复用的位置）；失败时返回None
+    """
+    _require_hnswlib()
+    start = time.time()
+    try:
+        with _write_lock(model_name):
+            index, meta = (None, None) if rebuild else _load_index(model_name)
+            since = datetime.fromisoformat(meta["synced_at"]) if meta and meta.get("synced_at") else None
+
+            added = 0
+            for ids, vectors, batch_updated_at in _iter_embeddings(model_name, since):
+                if index is None:
+                    index = _new_index(vectors.shape[1], len(ids) * 2)
+                    meta = {"version": META_VERSION, "model": model_name, "dim": vectors.shape[1]}
+                elif vectors.shape[1] != meta["dim"]:
+                    raise ValueError(f"向量维度 {vectors.shape[1]} 与索引维度 {meta['dim']} 不一致，请使用 --rebuild 重建")
+                # 容量不足时按倍数扩容
+                needed = index.get_current_count() + len(ids)
+                if needed > index.get_max_elements():
+                    index.resize_index(max(needed, index.get_max_elements() * 2))
+                # 已存在的ID会覆盖旧向量；新ID优先复用被删除的位置
+                index.add_items(vectors, ids, replace_deleted=True)
+                meta["synced_at"] = batch_updated_at.isoformat()
+                added += len(ids)
+
+            if index is None:
+                print(f"ℹ️ 模型 {model_name} 暂无嵌入数据，未生成向量索引")
+                return {"added": 0, "total": 0}
+            if added or rebuild:
+                _save_index(model_name, index, meta)
+            total = index.get_current_count()
+            print(f"✅ 新闻向量索引同步完成: 新增/更新 {added} 条，索引共 {total} 条，耗时 {time.time() - start:.2f} 秒")
+            return {"added": added, "total": total}
+    except (SQLAlchemyError, OSError, RuntimeError, ValueError) as e:
+        print(f"❗ 新闻向量索引同步失败: {e}")
+        return None
+
+
+def remove_from_news_index(news_ids):
+    """
+    从所有模型的索引中删除指定新闻
+
+    返回:
+    - int: 实际删除的向量数
+    """
+    if not news_ids or hnswlib is None or not os.path.isdir(NEWS_INDEX_DIR):
+        return 0
+    removed = 0
+    for meta_path in glob.glob(os.path.join(NEWS_INDEX_DIR, "*.meta.json")):
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                model_name = json.load(f)["model"]
+            with _write_lock(model_name):
+                index, meta = _load_index(model_name)
+                if index is None:
+                    continue
+                deleted = 0
+                for news_id in news_ids:
+                    try:
+                        index.mark_deleted(news_id)
+                        deleted += 1
+                    except RuntimeError:
+                        # 不在索引中或已删除
+                        pass
+                if deleted:
+                    _save_index(model_name, index, meta)
+                removed += deleted
+        except (OSError, ValueError, KeyError, RuntimeError) as e:
+            print(f"❗ 从向量索引删除新闻失败 ({meta_path}): {e}")
+    return removed
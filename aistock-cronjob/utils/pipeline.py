@@ -0,0 +1,145 @@
+# utils/pipeline.py
+"""
+多阶段流水线：每个阶段有独立的线程数，阶段之间用有界队列连接
+
+- 各阶段同时工作：第一条数据进入第二阶段时，后面的数据仍在第一阶段处理
+- 队列满时上游阻塞等待（背压），慢阶段不会被无限堆积的数据撑爆内存
+- 阶段函数返回 None 表示丢弃该条数据；抛出异常时记录日志并丢弃
+- 阶段设置 batch_size 时，fn 一次收到最多 batch_size 条数据（列表），返回结果列表
+- 最后一个阶段的输出按完成顺序由调用方线程逐条取出
+
+用法:
+    pipeline = StagedPipeline([
+        Stage("crawl", crawl, workers=8),
+        Stage("embed", embed, workers=4),
+        Stage("dedup", dedup, workers=1),  # 有共享状态的阶段使用单线程
+    ])
+    for item in pipeline.run(items):
+        ...
+"""
+
+from __future__ import annotations
+import os
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List
+
+# 阶段之间的队列长度
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 16))
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    流水线阶段：fn(item) 返回交给下一阶段的数据，返回 None 表示丢弃
+
+    batch_size > 1 时 fn(items) 接收列表并返回列表，列表中的 None 同样表示丢弃；
+    取到第一条数据后最多再等待 batch_wait 秒凑满一批，超时则直接处理已取到的部分
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    batch_size: int = 1
+    batch_wait: float = 0.0
+
+
+class StagedPipeline:
+    """
+    有界队列连接的多阶段线程流水线
+
+    参数:
+    - stages: 按顺序执行的阶段
+    - queue_size: 每个阶段输入队列的长度
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = PIPELINE_QUEUE_SIZE):
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.errors = {stage.name: 0 for stage in stages}
+        self._lock = threading.Lock()
+
+    def _worker(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: list, downstream_workers: int):
+        done = False
+        while not done:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            batch = [item]
+            # 批处理阶段：在 batch_wait 内继续收集数据，凑满一批或超时后处理
+            deadline = time.monotonic() + stage.batch_wait
+            while len(batch) < stage.batch_size:
+                try:
+                    item = inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+            try:
+                results = stage.fn(batch) if stage.batch_size > 1 else [stage.fn(batch[0])]
+            except Exception as e:
+                with self._lock:
+                    self.errors[stage.name] += len(batch)
+                print(f"❗ 流水线阶段 {stage.name} 处理失败: {e}")
+                traceback.print_exc()
+                continue
+            for result in results:
+                if result is not None:
+                    outbox.put(result)
+
+        # 本阶段最后一个退出的线程通知下游结束
+        with self._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(downstream_workers):
+                outbox.put(_DONE)
+
+    def run(self, items: Iterable) -> Iterator:
+        """
+        把 items 送入流水线，按完成顺序逐条返回最后一个阶段的输出
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        # 最后的输出队列不限长度，调用方处理较慢时也不会阻塞最后一个阶段
+        queues.append(queue.Queue())
+
+        threads = []
+        for index, stage in enumerate(self.stages):
+            workers = max(1, stage.workers)
+            downstream = max(1, self.stages[index + 1].workers) if index + 1 < len(self.stages) else 1
+            remaining = [workers]
+            for n in range(workers):
+                threads.append(threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[index], queues[index + 1], remaining, downstream),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                ))
+
+        def feed():
+            for item in items:
+                queues[0].put(item)
+            for _ in range(max(1, self.stages[0].workers)):
+                queues[0].put(_DONE)
+
+        threads.append(threading.Thread(target=feed, name="pipeline-feed", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        output = queues[-1]
+        while True:
+            item = output.get()
+            if item is _DONE:
+                break
+            yield item
+
+        for thread in threads:
+            thread.join()
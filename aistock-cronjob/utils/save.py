@@ -1,7 +1,10 @@
 # utils/save.py
 
 from .db import engine, SessionLocal, Base
-from .model import News, HotStock, StockInfo, StockRealtimeQuote, Stocks, Index, NewsEmbedding, Tag, NewsTagRelation, NewsSummary
+from .model import News, HotStock, StockInfo, StockRealtimeQuote, Stocks, Index, NewsEmbedding, EmbeddingCache, Tag, NewsTagRelation, NewsSummary, StockEvaluation
+from .upsert import bulk_upsert, bulk_update, UPSERT_CHUNK_SIZE
+from .vector_codec import encode_vector, decode_vector
+from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 import hashlib
 from datetime import datetime
@@ -20,6 +23,23 @@ def initialize_database():
     except SQLAlchemyError as e:
         print(f"❌ 初始化失败: {e}")
 
+# 新闻类别对应的股票记录名称
+NEWS_CATEGORY_NAMES = {
+    'hk_us': '港美股',
+    'cn': 'A股',
+    'watch': 'A股',
+    'top': '头条'
+}
+
+def _news_ids_by_hash(session, hashes):
+    """按内容哈希批量查询新闻ID（分块 IN 查询）"""
+    hashes = list(hashes)
+    ids = {}
+    for start in range(0, len(hashes), UPSERT_CHUNK_SIZE):
+        chunk = hashes[start:start + UPSERT_CHUNK_SIZE]
+        ids.update(session.query(News.content_hash, News.id).filter(News.content_hash.in_(chunk)).all())
+    return ids
+
 def save_news(news_list):
     """
     保存新闻列表到数据库
@@ -31,53 +51,41 @@ def save_news(news_list):
     result = {}
     
     try:
-        new_count = 0
-        update_count = 0
-        skip_count = 0
+        current_time = datetime.now()
+        prepared = [
+            (news, hashlib.sha256(news['content'].encode('utf-8')).hexdigest())
+            for news in news_list
+        ]
         
-        # 批量获取现有股票代码，避免外键约束错误
-        existing_stocks_codes = {code for code, in session.query(Stocks.code).all()}
+        # 确保新闻关联的股票/类别记录存在，已存在的不做修改
+        codes = {news.get('code') for news in news_list if news.get('code')}
+        bulk_upsert(session, Stocks, [
+            {'code': code, 'name': NEWS_CATEGORY_NAMES.get(code, code), 'market': 'NEWS'}
+            for code in codes
+        ], update_columns=[])
         
-        for news in news_list:
-            # 计算内容哈希值
-            content_hash = hashlib.sha256(news['content'].encode('utf-8')).hexdigest()
-            # 获取当前时间作为下载时间
-            current_time = datetime.now()
-            
-            # 检查并创建股票代码记录（如果需要）
+        # 只查询本批次涉及的哈希，不读取全表
+        existing_ids = _news_ids_by_hash(session, {content_hash for _, content_hash in prepared})
+        
+        updates = []
+        inserts = {}  # content_hash -> 新闻，同一批次内相同内容只插入一次
+        skip_count = 0
+        for news, content_hash in prepared:
             news_code = news.get('code')
-            if news_code and news_code not in existing_stocks_codes:
-                # 为新闻类别创建对应的股票记录
-                stock_name = {
-                    'hk_us': '港美股',
-                    'cn': 'A股',
-                    'watch': 'A股',
-                    'top': '头条'
-                }.get(news_code, news_code)
-                
-                new_stock = Stocks(code=news_code, name=stock_name, market='NEWS')
-                session.add(new_stock)
-                session.flush()  # 确保立即插入
-                existing_stocks_codes.add(news_code)
             
-            # 检查是否存在ID，有ID表示更新现有新闻
+            # 有ID表示更新现有新闻
             if 'id' in news and news['id']:
-                # 在更新前检查是否有哈希冲突（相同哈希但不同ID的记录）
-                existing_news_with_hash = session.query(News).filter(
-                    News.content_hash == content_hash,
-                    News.id != news['id']
-                ).first()
-                
-                if existing_news_with_hash:
-                    # 存在冲突，记录日志并跳过此条
-                    print(f"⚠️ 哈希冲突: 新闻ID {news['id']} 的内容与ID {existing_news_with_hash.id} 重复，跳过更新")
+                # 相同哈希但不同ID的记录视为冲突
+                conflict_id = existing_ids.get(content_hash)
+                if conflict_id is not None and conflict_id != news['id']:
+                    print(f"⚠️ 哈希冲突: 新闻ID {news['id']} 的内容与ID {conflict_id} 重复，跳过更新")
                     skip_count += 1
                     # 仍然返回当前新闻ID
                     result[news['id']] = {'content': news['content'], 'is_new': False, 'skipped': True}
                     continue
                 
-                # 更新现有新闻
-                session.query(News).filter(News.id == news['id']).update({
+                updates.append({
+                    'id': news['id'],
                     'title': news['title'],
                     'content': news['content'],
                     'content_hash': content_hash,
@@ -87,33 +95,33 @@ def save_news(news_list):
                     'download_time': current_time
                 })
                 result[news['id']] = {'content': news['content'], 'is_new': False}
-                update_count += 1
+            elif content_hash in existing_ids:
+                # 已存在，记录日志
+                print(f"⚠️ 内容已存在: 发现重复新闻内容 (ID: {existing_ids[content_hash]}): {news['title']}")
+                result[existing_ids[content_hash]] = {'content': news['content'], 'is_new': False, 'existing': True}
+                skip_count += 1
+            elif content_hash in inserts:
+                skip_count += 1
             else:
-                # 检查数据库中是否已存在相同的 content_hash
-                exists = session.query(News).filter(News.content_hash == content_hash).first()
-                if not exists:
-                    # 如果不存在，则创建新记录
-                    new_entry = News(
-                        ctime=news['ctime'],
-                        title=news['title'],
-                        content=news['content'],
-                        content_hash=content_hash,
-                        link=news.get('link'),
-                        code=news_code,
-                        download_time=current_time
-                    )
-                    session.add(new_entry)
-                    session.flush()  # 获取自动生成的ID
-                    result[new_entry.id] = {'content': news['content'], 'is_new': True}
-                    new_count += 1
-                else:
-                    # 已存在，记录日志
-                    print(f"⚠️ 内容已存在: 发现重复新闻内容 (ID: {exists.id}): {news['title']}")
-                    result[exists.id] = {'content': news['content'], 'is_new': False, 'existing': True}
-                    skip_count += 1
+                inserts[content_hash] = {
+                    'ctime': news['ctime'],
+                    'title': news['title'],
+                    'content': news['content'],
+                    'content_hash': content_hash,
+                    'link': news.get('link'),
+                    'code': news_code,
+                    'download_time': current_time
+                }
+        
+        bulk_update(session, News, updates)
+        
+        # 按内容哈希去重插入，再一次查询取回自动生成的ID
+        bulk_upsert(session, News, list(inserts.values()), update_columns=[], conflict_columns=['content_hash'])
+        for content_hash, news_id in _news_ids_by_hash(session, inserts).items():
+            result[news_id] = {'content': inserts[content_hash]['content'], 'is_new': True}
                 
         session.commit()
-        print(f"✅ 成功保存 {new_count} 条新新闻，更新 {update_count} 条现有新闻，跳过 {skip_count} 条重复新闻")
+        print(f"✅ 成功保存 {len(inserts)} 条新新闻，更新 {len(updates)} 条现有新闻，跳过 {skip_count} 条重复新闻")
         return result
     except SQLAlchemyError as e:
         session.rollback()
@@ -124,10 +132,10 @@ def save_news(news_list):
 
 def save_hot_stocks(hot_stocks_list):
     """
-    优化版本：保存热门股票数据到数据库
-    - 批量处理，减少数据库交互
-    - 智能更新，避免不必要的删除重建
-    - 详细统计和日志记录
+    保存热门股票数据到数据库
+    - 股票基础信息只补充缺失的记录，热门榜单按代码 upsert
+    - 删除不在本次榜单中的记录
+    - 不读取全表
     """
     if not hot_stocks_list:
         print("⚠️ 热门股票列表为空，跳过保存")
@@ -137,78 +145,31 @@ def save_hot_stocks(hot_stocks_list):
     try:
         current_time = datetime.now()
         
-        # 1. 批量获取现有的股票代码，避免重复查询
-        existing_stocks_codes = {code for code, in session.query(Stocks.code).all()}
+        # 同一代码只保留最后一条
+        latest = {stock['code']: stock for stock in hot_stocks_list}
         
-        # 2. 批量获取现有的热门股票数据
-        existing_hot_stocks = {hot.code: hot for hot in session.query(HotStock).all()}
+        # 1. 补充缺失的股票基础信息，已存在的不修改
+        bulk_upsert(session, Stocks, [
+            {'code': code, 'name': stock.get('name', ''), 'market': 'HK' if len(code) == 5 else 'CN'}
+            for code, stock in latest.items()
+        ], update_columns=[])
         
-        # 3. 准备新增的股票记录
-        new_stocks_to_add = []
-        hot_stocks_to_add = []
-        hot_stocks_to_update = []
+        # 2. 插入或更新热门股票记录
+        bulk_upsert(session, HotStock, [
+            {'code': code, 'rank': stock['rank'], 'remark': stock['remark'], 'updated_at': current_time}
+            for code, stock in latest.items()
+        ])
         
-        # 4. 处理每个热门股票
-        for stock in hot_stocks_list:
-            code = stock['code']
-            name = stock.get('name', '')
-            market = 'HK' if len(code) == 5 else 'CN'  # 优化市场判断逻辑
-            
-            # 检查是否需要添加到 Stocks 表
-            if code not in existing_stocks_codes:
-                new_stocks_to_add.append(Stocks(code=code, name=name, market=market))
-                existing_stocks_codes.add(code)  # 避免重复添加
-            
-            # 检查是否需要更新或新增热门股票记录
-            if code in existing_hot_stocks:
-                # 更新现有记录
-                existing_hot = existing_hot_stocks[code]
-                if (existing_hot.rank != stock['rank'] or 
-                    existing_hot.remark != stock['remark']):
-                    existing_hot.rank = stock['rank']
-                    existing_hot.remark = stock['remark']
-                    existing_hot.updated_at = current_time
-                    hot_stocks_to_update.append(existing_hot)
-            else:
-                # 新增记录
-                hot_stocks_to_add.append(HotStock(
-                    code=code,
-                    rank=stock['rank'],
-                    remark=stock['remark'],
-                    updated_at=current_time
-                ))
-        
-        # 5. 找出需要删除的热门股票（不在新列表中的）
-        new_codes = {stock['code'] for stock in hot_stocks_list}
-        hot_stocks_to_delete = [code for code in existing_hot_stocks.keys() if code not in new_codes]
-        
-        # 6. 执行数据库操作
-        operation_count = 0
-        
-        # 批量添加新股票
-        if new_stocks_to_add:
-            session.add_all(new_stocks_to_add)
-            operation_count += len(new_stocks_to_add)
-        
-        # 批量添加新热门股票
-        if hot_stocks_to_add:
-            session.add_all(hot_stocks_to_add)
-            operation_count += len(hot_stocks_to_add)
-        
-        # 批量删除过期的热门股票
-        if hot_stocks_to_delete:
-            session.query(HotStock).filter(HotStock.code.in_(hot_stocks_to_delete)).delete(synchronize_session=False)
-            operation_count += len(hot_stocks_to_delete)
+        # 3. 删除不在新列表中的热门股票
+        deleted = session.query(HotStock).filter(HotStock.code.notin_(list(latest))).delete(synchronize_session=False)
         
         # 提交所有更改
         session.commit()
         
-        # 7. 输出详细统计信息
+        # 4. 输出统计信息
         print(f"✅ 热门股票数据保存完成:")
-        print(f"   - 新增股票基础信息: {len(new_stocks_to_add)} 条")
-        print(f"   - 新增热门股票: {len(hot_stocks_to_add)} 条")
-        print(f"   - 更新热门股票: {len(hot_stocks_to_update)} 条")
-        print(f"   - 删除过期热门股票: {len(hot_stocks_to_delete)} 条")
+        print(f"   - 写入热门股票: {len(latest)} 条")
+        print(f"   - 删除过期热门股票: {deleted} 条")
         print(f"   - 总计处理: {len(hot_stocks_list)} 条热门股票数据")
         
         return True
@@ -222,81 +183,62 @@ def save_hot_stocks(hot_stocks_list):
     finally:
         session.close()
 
+# 辅助转换函数：转 int
+def _to_int(v):
+    try:
+        return int(v)
+    except (ValueError, TypeError):
+        return None
+
+# 辅助转换函数：转 date（不是 datetime）
+def _to_date(v):
+    try:
+        s = str(v).strip()
+        # 1) 13 位时间戳（毫秒）
+        if v and isinstance(v, (int, float)) and len(s) == 13 and s.isdigit():
+            return datetime.fromtimestamp(v / 1000).date()
+        
+        # 2) 8 位纯数字（YYYYMMDD），支持数字或字符串
+        if len(s) == 8 and s.isdigit():
+            return datetime.strptime(s, "%Y%m%d").date()
+        
+        # 3) 标准短横线日期（'YYYY-MM-DD'）
+        if isinstance(v, str) and len(s) == 10 and s[4] == '-' and s[7] == '-':
+            return datetime.strptime(s, "%Y-%m-%d").date()
+        
+        # 其它情况一律视为无效
+        return None
+    except (ValueError, TypeError):
+        return None
+
 def save_stock_info_batch(stock_info_list):
     session = SessionLocal()
     try:
-        # 1) 取已有的 Stocks.code
-        existing_stocks_codes = {code for code, in session.query(Stocks.code).all()}
-
-        # —— 一次性取出 StockInfo.code，避免同批次重复插入 —— 
-        existing_info_codes = {code for code, in session.query(StockInfo.code).all()}
-
-        for stock_info in stock_info_list:
-            # 辅助转换函数：转 int
-            def to_int(v):
-                try:
-                    return int(v)
-                except (ValueError, TypeError):
-                    return None
-
-            # 辅助转换函数：转 date（不是 datetime）
-            def to_data(v):
-                try:
-                    s = str(v).strip()
-                    # 1) 13 位时间戳（毫秒）
-                    if v and isinstance(v, (int, float)) and len(s) == 13 and s.isdigit():
-                        return datetime.fromtimestamp(v / 1000).date()
-                    
-                    # 2) 8 位纯数字（YYYYMMDD），支持数字或字符串
-                    if len(s) == 8 and s.isdigit():
-                        return datetime.strptime(s, "%Y%m%d").date()
-                    
-                    # 3) 标准短横线日期（'YYYY-MM-DD'）
-                    if isinstance(v, str) and len(s) == 10 and s[4] == '-' and s[7] == '-':
-                        return datetime.strptime(s, "%Y-%m-%d").date()
-                    
-                    # 其它情况一律视为无效
-                    return None
-                except (ValueError, TypeError):
-                    return None
-
-            code = stock_info['code']
-            name = stock_info.get('name', '')
-
-            # 确保 Stocks 表有该 code
-            if code not in existing_stocks_codes:
-                session.add(Stocks(code=code, name=name))
-                existing_stocks_codes.add(code)
-
-            # 字段转换
-            total_shares       = to_int(stock_info.get('total_shares'))
-            circulating_shares = to_int(stock_info.get('circulating_shares'))
-            industry           = stock_info.get('industry')
-            listing_date       = to_data(stock_info.get('listing_date'))
-            now                = datetime.now()
-
-            # 插入或更新 StockInfo
-            if code in existing_info_codes:
-                session.query(StockInfo).filter_by(code=code).update({
-                    'total_shares':       total_shares,
-                    'circulating_shares': circulating_shares,
-                    'industry':           industry,
-                    'listing_date':       listing_date,
-                    'updated_at':         now,
-                })
-            else:
-                session.add(StockInfo(
-                    code=code,
-                    total_shares=total_shares,
-                    circulating_shares=circulating_shares,
-                    industry=industry,
-                    listing_date=listing_date,
-                    updated_at=now
-                ))
-                existing_info_codes.add(code)
+        now = datetime.now()
+        # 同一代码只保留最后一条
+        latest = {stock_info['code']: stock_info for stock_info in stock_info_list}
+
+        # 1) 确保 Stocks 表有该 code，已存在的不修改
+        bulk_upsert(session, Stocks, [
+            {'code': code, 'name': stock_info.get('name', '')}
+            for code, stock_info in latest.items()
+        ], update_columns=[])
+
+        # 2) 插入或更新 StockInfo
+        bulk_upsert(session, StockInfo, [
+            {
+                'code': code,
+                'total_shares': _to_int(stock_info.get('total_shares')),
+                'circulating_shares': _to_int(stock_info.get('circulating_shares')),
+                'industry': stock_info.get('industry'),
+                'listing_date': _to_date(stock_info.get('listing_date')),
+                'updated_at': now,
+            }
+            for code, stock_info in latest.items()
+        ])
 
         session.commit()
-        print(f"✅ 批量保存或更新 {len(stock_info_list)} 条股票信息")
+        print(f"✅ 批量保存或更新 {len(latest)} 条股票信息")
     except SQLAlchemyError as e:
         session.rollback()
         print(f"❗ 批量保存股票信息出错: {e}")
@@ -306,30 +248,22 @@ def save_stock_info_batch(stock_info_list):
 def save_realtime_quotes(quotes_list):
     session = SessionLocal()
     try:
-        # 预处理：将NaN统一转为None（提前在DataFrame处理更好）
-        processed_quotes = [
-            {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in q.items()}
+        now = datetime.now()
+        # 预处理：将NaN统一转为None，同一代码只保留最后一条
+        processed_quotes = {
+            q['代码']: {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in q.items()}
             for q in quotes_list
-        ]
-
-        # 1. 批量查询已存在的code（减少循环内查询）
-        existing_stocks_codes = {code for code, in session.query(Stocks.code).all()}
-        existing_quote_codes = {code for code, in session.query(StockRealtimeQuote.code).all()}
+        }
 
-        # 2. 分桶收集数据
-        new_stocks = []
-        new_quotes = []
-        update_quotes = []
+        # 1. 补充缺失的股票记录，已存在的不修改
+        bulk_upsert(session, Stocks, [
+            {'code': code, 'name': quote['名称']}
+            for code, quote in processed_quotes.items()
+        ], update_columns=[])
 
-        for quote in processed_quotes:
-            code = quote['代码']
-            # 处理Stocks表
-            if code not in existing_stocks_codes:
-                new_stocks.append(Stocks(code=code, name=quote['名称']))
-                existing_stocks_codes.add(code)  # 避免重复添加
-
-            # 处理实时行情表
-            quote_data = {
+        # 2. 插入或更新实时行情
+        quotes = [
+            {
                 'code': code,
                 'latest_price': quote['最新价'],
                 'change_percent': quote['涨跌幅'],
@@ -351,28 +285,14 @@ def save_realtime_quotes(quotes_list):
                 'change_5min': quote['5分钟涨跌'],
                 'change_60d': quote['60日涨跌幅'],
                 'change_ytd': quote['年初至今涨跌幅'],
-                'updated_at': datetime.now()
+                'updated_at': now
             }
-
-            if code in existing_quote_codes:
-                update_quotes.append(quote_data)
-            else:
-                new_quotes.append(StockRealtimeQuote(**quote_data))
-
-        # 3. 批量插入Stocks（单次提交）
-        if new_stocks:
-            session.bulk_save_objects(new_stocks)
-
-        # 4. 批量插入新行情数据
-        if new_quotes:
-            session.bulk_save_objects(new_quotes)
-
-        # 5. 批量更新已有行情数据（修复参数错误）
-        if update_quotes:
-            session.bulk_update_mappings(StockRealtimeQuote, update_quotes)
+            for code, quote in processed_quotes.items()
+        ]
+        bulk_upsert(session, StockRealtimeQuote, quotes)
   
         session.commit()
-        print(f"✅ 批量处理完成：新增Stocks {len(new_stocks)}条，新增行情{len(new_quotes)}条，更新行情{len(update_quotes)}条")
+        print(f"✅ 批量处理完成：写入行情 {len(quotes)} 条")
 
     except Exception as e:
         session.rollback()
@@ -392,12 +312,7 @@ def save_market_indices(indices_list):
         
     session = SessionLocal()
     try:
-        # 批量获取已存在的指数代码，不再查询不存在的id字段
-        existing_indices = {idx_code for idx_code, in 
-                          session.query(Index.idx_code).all()}
-        
-        new_indices = []
-        updates = []
+        records = {}
         current_time = datetime.now()
         
         for index_data in indices_list:
@@ -412,7 +327,7 @@ def save_market_indices(indices_list):
                 print(f"⚠️ 指数 {idx_code} 数据格式错误: {e}")
                 continue
             
-            index_record = {
+            records[idx_code] = {
                 'idx_code': idx_code,
                 'name': index_data['name'],
                 'value': value,
@@ -420,33 +335,13 @@ def save_market_indices(indices_list):
                 'change_percent': change_percent,
                 'updated_at': current_time
             }
-            
-            if idx_code in existing_indices:
-                # 准备更新数据
-                updates.append(index_record)
-            else:
-                # 准备新增数据
-                new_indices.append(Index(**index_record))
-                existing_indices.add(idx_code)  # 防止重复添加
-        
-        # 批量更新现有记录
-        if updates:
-            for update in updates:
-                session.query(Index).filter_by(idx_code=update['idx_code']).update({
-                    'name': update['name'],
-                    'value': update['value'],
-                    'change_amount': update['change_amount'],
-                    'change_percent': update['change_percent'],
-                    'updated_at': update['updated_at']
-                })
         
-        # 批量添加新记录
-        if new_indices:
-            session.bulk_save_objects(new_indices)
+        # 插入或更新
+        bulk_upsert(session, Index, list(records.values()))
             
         session.commit()
         
-        print(f"✅ 成功保存指数数据: 新增 {len(new_indices)} 条，更新 {len(updates)} 条")
+        print(f"✅ 成功保存指数数据: {len(records)} 条")
         return True
         
     except SQLAlchemyError as e:
@@ -467,44 +362,24 @@ def save_news_embeddings(embeddings_data):
     """
     session = SessionLocal()
     try:
-        # 预处理
-        existing_embeddings = {news_id for news_id, in session.query(NewsEmbedding.news_id).all()}
-        
-        new_embeddings = []
-        update_count = 0
-        
+        now = datetime.now()
+        records = {}
         for data in embeddings_data:
-            news_id = data['news_id']
-            vector = data['embedding_vector']
-            model = data['model_name']
-            
-            # 转换为Python列表，数据库会自动处理JSON序列化
-            if isinstance(vector, np.ndarray):
-                vector = vector.tolist()
-            
-            if news_id in existing_embeddings:
-                # 更新现有记录
-                session.query(NewsEmbedding).filter_by(news_id=news_id).update({
-                    'embedding_vector': vector,
-                    'model_name': model,
-                    'updated_at': datetime.now()
-                })
-                update_count += 1
-            else:
-                # 添加新记录
-                new_embedding = NewsEmbedding(
-                    news_id=news_id,
-                    embedding_vector=vector,
-                    model_name=model
-                )
-                new_embeddings.append(new_embedding)
-        
-        # 保存新记录
-        if new_embeddings:
-            session.add_all(new_embeddings)
+            records[data['news_id']] = {
+                'news_id': data['news_id'],
+                # 以二进制 float32/float16 存储
+                'embedding_vector': encode_vector(data['embedding_vector']),
+                'model_name': data['model_name'],
+                'created_at': now,
+                'updated_at': now
+            }
+        
+        # 插入或更新，已有记录保留原创建时间
+        bulk_upsert(session, NewsEmbedding, list(records.values()),
+                    update_columns=['embedding_vector', 'model_name', 'updated_at'])
             
         session.commit()
-        print(f"✅ 成功保存 {len(new_embeddings)} 条新嵌入数据，更新 {update_count} 条嵌入数据")
+        print(f"✅ 成功保存 {len(records)} 条嵌入数据")
         return True
     except SQLAlchemyError as e:
         session.rollback()
@@ -513,6 +388,74 @@ def save_news_embeddings(embeddings_data):
     finally:
         session.close()
 
+def get_cached_embeddings(model_name, content_hashes):
+    """
+    按内容哈希批量读取嵌入缓存
+    
+    参数:
+    - model_name: 嵌入模型名称
+    - content_hashes: 嵌入文本的哈希列表
+    
+    返回:
+    - 字典，键为content_hash，值为(嵌入向量numpy数组, token数)
+    """
+    hashes = list(set(content_hashes))
+    if not hashes:
+        return {}
+    
+    session = SessionLocal()
+    try:
+        result = {}
+        for start in range(0, len(hashes), UPSERT_CHUNK_SIZE):
+            chunk = hashes[start:start + UPSERT_CHUNK_SIZE]
+            rows = session.query(
+                EmbeddingCache.content_hash, EmbeddingCache.embedding_vector, EmbeddingCache.token_count
+            ).filter(
+                EmbeddingCache.model_name == model_name,
+                EmbeddingCache.content_hash.in_(chunk)
+            ).all()
+            for content_hash, vector, token_count in rows:
+                result[content_hash] = (decode_vector(vector), token_count or 0)
+        return result
+    except SQLAlchemyError as e:
+        print(f"❗ 读取嵌入缓存出错: {e}")
+        return {}
+    finally:
+        session.close()
+
+def save_cached_embeddings(model_name, entries):
+    """
+    写入嵌入缓存，已存在的 (模型, 内容哈希) 保持不变
+    
+    参数:
+    - model_name: 嵌入模型名称
+    - entries: 字典列表，每个字典包含 content_hash, embedding_vector, token_count
+    """
+    if not entries:
+        return True
+    
+    session = SessionLocal()
+    try:
+        now = datetime.now()
+        records = {}
+        for entry in entries:
+            records[entry['content_hash']] = {
+                'model_name': model_name,
+                'content_hash': entry['content_hash'],
+                'embedding_vector': encode_vector(entry['embedding_vector']),
+                'token_count': entry.get('token_count'),
+                'created_at': now
+            }
+        bulk_upsert(session, EmbeddingCache, list(records.values()), update_columns=[])
+        session.commit()
+        return True
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"❗ 写入嵌入缓存失败: {e}")
+        return False
+    finally:
+        session.close()
+
 def save_news_tags(tags_data):
     """
     保存新闻标签信息到数据库
@@ -527,119 +470,66 @@ def save_news_tags(tags_data):
     """
     session = SessionLocal()
     try:
-        # 获取所有已存在的标签
-        existing_tags = {name.lower(): (id, type) for id, name, type in 
-                        session.query(Tag.id, Tag.name, Tag.tag_type).all()}
+        now = datetime.now()
         
-        # 获取已有的新闻-标签关系
-        existing_relations = {(news_id, tag_id) for news_id, tag_id in 
-                             session.query(NewsTagRelation.news_id, NewsTagRelation.tag_id).all()}
-        
-        # 获取已有摘要的新闻ID
-        existing_summaries = {news_id for news_id, in 
-                             session.query(NewsSummary.news_id).all()}
-        
-        new_tags = []  # 需要新增的标签
-        new_relations = []  # 需要新增的新闻-标签关系
-        new_summaries = []  # 需要新增的摘要
-        updated_summaries = 0  # 已更新的摘要计数
-        updated_news = 0  # 已更新新闻重要性标记计数
-        
-        # 处理每条传入的标签数据
+        # 本批次用到的标签：小写名称 -> (名称, 类型)，同名标签以首次出现的类型为准
+        batch_tags = {}
+        for data in tags_data:
+            for key, tag_type in (('positive_tags', 1), ('negative_tags', 0)):
+                for tag_name in data.get(key, []):
+                    if tag_name and tag_name.strip():
+                        batch_tags.setdefault(tag_name.strip().lower(), (tag_name.strip(), tag_type))
+        
+        # 1. 补充缺失的标签，再只查询本批次标签的ID
+        bulk_upsert(session, Tag, [
+            {'name': name, 'tag_type': tag_type, 'created_at': now}
+            for name, tag_type in batch_tags.values()
+        ], update_columns=[], conflict_columns=['name'])
+        tag_ids = {}
+        if batch_tags:
+            names = [name for name, _ in batch_tags.values()]
+            tag_ids = {name.lower(): tag_id for tag_id, name in
+                       session.query(Tag.id, Tag.name).filter(Tag.name.in_(names)).all()}
+        
+        relations = set()  # (新闻ID, 标签ID)
+        summaries = {}
+        importance = {}
         for data in tags_data:
             news_id = data['news_id']
-            is_important = data.get('is_important', False)
-            summary = data.get('summary')
-            
-            # 1. 更新新闻重要性
-            session.query(News).filter(News.id == news_id).update({
-                'is_important': 1 if is_important else 0
-            })
-            updated_news += 1
             
-            # 2. 处理摘要
-            if summary:
-                if news_id in existing_summaries:
-                    # 更新已有摘要
-                    session.query(NewsSummary).filter(NewsSummary.news_id == news_id).update({
-                        'summary': summary
-                    })
-                    updated_summaries += 1
-                else:
-                    # 添加新摘要
-                    new_summaries.append(NewsSummary(
-                        news_id=news_id,
-                        summary=summary
-                    ))
-                    existing_summaries.add(news_id)  # 防止批处理中重复
+            # 新闻重要性
+            importance[news_id] = 1 if data.get('is_important', False) else 0
             
-            # 3. 处理标签
-            # 处理正向标签
-            for tag_name in data.get('positive_tags', []):
-                if not tag_name or not tag_name.strip():
-                    continue
-                    
-                tag_name_lower = tag_name.lower()
-                # 检查标签是否存在
-                if tag_name_lower in existing_tags:
-                    tag_id, tag_type = existing_tags[tag_name_lower]
-                else:
-                    # 创建新标签
-                    tag = Tag(
-                        name=tag_name.strip(),
-                        tag_type=1  # 正向标签
-                    )
-                    session.add(tag)
-                    session.flush()  # 获取新标签的ID
-                    tag_id = tag.id
-                    existing_tags[tag_name_lower] = (tag_id, 1)
-                
-                # 创建新闻-标签关系
-                if (news_id, tag_id) not in existing_relations:
-                    new_relations.append(NewsTagRelation(
-                        news_id=news_id,
-                        tag_id=tag_id
-                    ))
-                    existing_relations.add((news_id, tag_id))
+            # 摘要
+            if data.get('summary'):
+                summaries[news_id] = data['summary']
             
-            # 处理负向标签
-            for tag_name in data.get('negative_tags', []):
-                if not tag_name or not tag_name.strip():
-                    continue
-                    
-                tag_name_lower = tag_name.lower()
-                # 检查标签是否存在
-                if tag_name_lower in existing_tags:
-                    tag_id, tag_type = existing_tags[tag_name_lower]
-                else:
-                    # 创建新标签
-                    tag = Tag(
-                        name=tag_name.strip(),
-                        tag_type=0  # 负向标签
-                    )
-                    session.add(tag)
-                    session.flush()
-                    tag_id = tag.id
-                    existing_tags[tag_name_lower] = (tag_id, 0)
-                
-                # 创建新闻-标签关系
-                if (news_id, tag_id) not in existing_relations:
-                    new_relations.append(NewsTagRelation(
-                        news_id=news_id,
-                        tag_id=tag_id
-                    ))
-                    existing_relations.add((news_id, tag_id))
-        
-        # 批量添加新的摘要
-        if new_summaries:
-            session.add_all(new_summaries)
-        
-        # 批量添加新的新闻-标签关系
-        if new_relations:
-            session.add_all(new_relations)
+            # 新闻-标签关系
+            for key in ('positive_tags', 'negative_tags'):
+                for tag_name in data.get(key, []):
+                    if not tag_name or not tag_name.strip():
+                        continue
+                    tag_id = tag_ids.get(tag_name.strip().lower())
+                    if tag_id is not None:
+                        relations.add((news_id, tag_id))
+        
+        # 2. 批量更新新闻重要性
+        bulk_update(session, News, [
+            {'id': news_id, 'is_important': is_important} for news_id, is_important in importance.items()
+        ])
+        
+        # 3. 插入或更新摘要，已有记录保留原创建时间
+        bulk_upsert(session, NewsSummary, [
+            {'news_id': news_id, 'summary': summary, 'created_at': now} for news_id, summary in summaries.items()
+        ], update_columns=['summary'])
+        
+        # 4. 插入新闻-标签关系，已存在的跳过
+        bulk_upsert(session, NewsTagRelation, [
+            {'news_id': news_id, 'tag_id': tag_id, 'created_at': now} for news_id, tag_id in relations
+        ], update_columns=[])
         
         session.commit()
-        print(f"✅ 成功处理新闻标签数据: 更新{updated_news}条新闻重要性, {len(new_relations)}条新标签关系, {len(new_summaries)}条新摘要, 更新{updated_summaries}条现有摘要")
+        print(f"✅ 成功处理新闻标签数据: 更新{len(importance)}条新闻重要性, {len(relations)}条标签关系, {len(summaries)}条摘要")
         return True
     except SQLAlchemyError as e:
         session.rollback()
@@ -712,9 +602,8 @@ def get_news_embeddings(model_name, news_ids=None):
         
         result = {}
         for news_id, vector in query.all():
-            # 将JSON数据转换回numpy数组
-            vector_np = np.array(vector)
-            result[news_id] = vector_np
+            # 二进制数据直接映射为numpy数组
+            result[news_id] = decode_vector(vector)
             
         return result
     except SQLAlchemyError as e:
@@ -763,7 +652,7 @@ def get_all_news_with_embeddings(model_name, code=None, limit=5000):
                 'ctime': row.ctime,
                 'link': row.link,
                 'code': row.code,
-                'embedding': np.array(row.embedding_vector) if row.embedding_vector else None
+                'embedding': decode_vector(row.embedding_vector)
             }
             news_list.append(news_dict)
             
@@ -811,7 +700,7 @@ def get_recent_news_with_embeddings(model_name, code, limit=25):
                 'ctime': row.ctime,
                 'link': row.link,
                 'code': row.code,
-                'embedding': np.array(row.embedding_vector) if row.embedding_vector else None
+                'embedding': decode_vector(row.embedding_vector)
             }
             news_list.append(news_dict)
             
@@ -822,6 +711,56 @@ def get_recent_news_with_embeddings(model_name, code, limit=25):
     finally:
         session.close()
 
+def get_recent_embeddings(model_name, code, limit=2000, since=None):
+    """
+    获取特定类别最近新闻的嵌入向量（只读取ID和向量，不读取新闻正文）
+    
+    参数:
+    - model_name: 嵌入模型名称
+    - code: 股票代码/新闻类别
+    - limit: 最多获取的新闻条数
+    - since: 可选，只获取该时间之后的新闻
+    
+    返回:
+    - (embedded, missing): embedded 为 [(新闻ID, 嵌入向量numpy数组)]，
+      missing 为窗口内还没有该模型嵌入的新闻 [{'id', 'content'}]
+    """
+    session = SessionLocal()
+    try:
+        recent = session.query(News.id).filter(News.code == code)
+        if since is not None:
+            recent = recent.filter(News.ctime >= since)
+        recent_ids = [row.id for row in recent.order_by(News.ctime.desc()).limit(limit).all()]
+        
+        embedded = []
+        found = set()
+        for start in range(0, len(recent_ids), UPSERT_CHUNK_SIZE):
+            chunk = recent_ids[start:start + UPSERT_CHUNK_SIZE]
+            rows = session.query(NewsEmbedding.news_id, NewsEmbedding.embedding_vector).filter(
+                NewsEmbedding.model_name == model_name,
+                NewsEmbedding.news_id.in_(chunk)
+            ).all()
+            for news_id, vector in rows:
+                vector = decode_vector(vector)
+                if vector is not None:
+                    embedded.append((news_id, vector))
+                    found.add(news_id)
+        
+        missing_ids = [news_id for news_id in recent_ids if news_id not in found]
+        missing = []
+        for start in range(0, len(missing_ids), UPSERT_CHUNK_SIZE):
+            chunk = missing_ids[start:start + UPSERT_CHUNK_SIZE]
+            missing.extend(
+                {'id': row.id, 'content': row.content}
+                for row in session.query(News.id, News.content).filter(News.id.in_(chunk)).all()
+            )
+        return embedded, missing
+    except SQLAlchemyError as e:
+        print(f"❗ 获取最近新闻嵌入数据出错: {e}")
+        return [], []
+    finally:
+        session.close()
+
 def check_content_hashes(hash_list):
     """
     检查哪些内容哈希已存在于数据库
@@ -848,4 +787,109 @@ def check_content_hashes(hash_list):
         print(f"❗ 检查内容哈希失败: {e}")
         return set()
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+def get_recent_news_by_codes(codes, per_code=10, content_chars=500):
+    """
+    一次查询取出多只股票各自最新的若干条新闻
+
+    参数:
+    - codes: 股票代码列表
+    - per_code: 每只股票的新闻条数
+    - content_chars: 新闻内容只取前若干字符（评估提示词只使用前500字）
+
+    返回:
+    - 字典 {股票代码: [新闻字典, ...]}，每只股票的新闻按发布时间倒序，
+      新闻字典包含 id, title, content, link, ctime, download_time
+    """
+    if not codes:
+        return {}
+    session = SessionLocal()
+    try:
+        # 按股票分组、组内按发布时间倒序编号，只取每组前 per_code 条
+        row_number = func.row_number().over(
+            partition_by=News.code, order_by=(News.ctime.desc(), News.id.desc())
+        ).label('rn')
+        ranked = session.query(
+            News.id, News.code, News.title, func.substr(News.content, 1, content_chars + 1).label('content'),
+            News.link, News.ctime, News.download_time, row_number
+        ).filter(News.code.in_(list(codes))).subquery()
+        rows = session.query(ranked).filter(ranked.c.rn <= per_code).order_by(ranked.c.code, ranked.c.rn).all()
+
+        result = {}
+        for row in rows:
+            result.setdefault(row.code, []).append({
+                'id': row.id,
+                'title': row.title,
+                'content': row.content,
+                'link': row.link,
+                'ctime': row.ctime,
+                'download_time': row.download_time
+            })
+        return result
+    except SQLAlchemyError as e:
+        print(f"❗ 批量获取股票新闻出错: {e}")
+        return {}
+    finally:
+        session.close()
+
+
+def get_latest_evaluations(codes):
+    """
+    获取多只股票各自最近一次的AI评测
+
+    返回:
+    - 字典 {股票代码: {conclusion, reason, news_list, evaluation_time}}
+    """
+    if not codes:
+        return {}
+    session = SessionLocal()
+    try:
+        latest = session.query(
+            StockEvaluation.code, func.max(StockEvaluation.evaluation_time).label('evaluation_time')
+        ).filter(StockEvaluation.code.in_(list(codes))).group_by(StockEvaluation.code).subquery()
+        rows = session.query(StockEvaluation).join(
+            latest,
+            (StockEvaluation.code == latest.c.code) & (StockEvaluation.evaluation_time == latest.c.evaluation_time)
+        ).all()
+        return {
+            row.code: {
+                'conclusion': row.conclusion,
+                'reason': row.reason,
+                'news_list': row.news_list,
+                'evaluation_time': row.evaluation_time
+            }
+            for row in rows
+        }
+    except SQLAlchemyError as e:
+        print(f"❗ 获取最近评测出错: {e}")
+        return {}
+    finally:
+        session.close()
+
+
+def save_stock_evaluations(evaluations):
+    """
+    批量保存AI评测结果
+
+    参数:
+    - evaluations: 字典列表，包含 code, evaluation_time, conclusion, reason, news_list（JSON字符串，与后端一致）
+
+    返回:
+    - bool: 是否保存成功
+    """
+    if not evaluations:
+        return True
+    session = SessionLocal()
+    try:
+        bulk_upsert(session, StockEvaluation, evaluations, update_columns=['conclusion', 'reason', 'news_list'])
+        session.commit()
+        print(f"✅ 成功保存 {len(evaluations)} 条AI评测")
+        return True
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"❗ 保存AI评测失败: {e}")
+        return False
+    finally:
+        session.close()
@@ -0,0 +1,107 @@
+# utils/upsert.py
+"""
+按数据库方言生成批量 upsert 语句
+
+- MySQL: INSERT ... ON DUPLICATE KEY UPDATE
+- SQLite / PostgreSQL: INSERT ... ON CONFLICT (...) DO UPDATE / DO NOTHING
+
+数据按块以 executemany 写入，不需要事先读出表中已有的键
+"""
+
+import os
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# 每条语句写入的行数
+UPSERT_CHUNK_SIZE = int(os.getenv("UPSERT_CHUNK_SIZE", 1000))
+
+_ON_CONFLICT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def build_upsert(table, dialect_name, update_columns, conflict_columns=None):
+    """
+    构建 upsert 语句（不带数据，执行时以 executemany 传入）
+
+    参数:
+    - table: 目标表
+    - dialect_name: 数据库方言名称
+    - update_columns: 冲突时覆盖的列；为空时冲突行保持不变
+    - conflict_columns: ON CONFLICT 的冲突列（MySQL 忽略此参数，任意唯一键冲突都会触发），默认主键
+    """
+    if dialect_name == "mysql":
+        stmt = mysql_insert(table)
+        if update_columns:
+            return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+        # 用 "主键 = 主键" 实现冲突时不做任何修改，避免 INSERT IGNORE 把其他错误也降级为警告
+        pk = table.primary_key.columns.values()[0]
+        return stmt.on_duplicate_key_update({pk.name: pk})
+
+    if dialect_name not in _ON_CONFLICT_INSERTS:
+        raise NotImplementedError(f"不支持的数据库方言: {dialect_name}")
+    stmt = _ON_CONFLICT_INSERTS[dialect_name](table)
+    index_elements = conflict_columns or [column.name for column in table.primary_key.columns]
+    if update_columns:
+        return stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+    return stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+
+def bulk_upsert(session, model, rows, update_columns=None, conflict_columns=None, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    批量插入或更新
+
+    参数:
+    - session: 数据库会话（由调用方提交）
+    - model: ORM 模型
+    - rows: 字典列表，所有字典的键必须相同
+    - update_columns: 冲突时覆盖的列；None 表示除冲突列/主键外的所有列，[] 表示冲突时不修改
+    - conflict_columns: 冲突列，默认主键
+    - chunk_size: 每条语句写入的行数
+
+    返回:
+    - 写入的行数（含冲突后更新或跳过的行）
+    """
+    if not rows:
+        return 0
+    table = model.__table__
+    if update_columns is None:
+        keys = set(conflict_columns or [column.name for column in table.primary_key.columns])
+        update_columns = [column for column in rows[0] if column not in keys]
+
+    stmt = build_upsert(table, session.get_bind().dialect.name, update_columns, conflict_columns)
+    for chunk in _chunks(rows, chunk_size):
+        session.execute(stmt, chunk)
+    return len(rows)
+
+
+def bulk_update(session, model, rows, key="id", chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    按主键批量更新（executemany 的 UPDATE ... WHERE key = ?）
+
+    参数:
+    - rows: 字典列表，包含 key 列及要更新的列，所有字典的键必须相同
+    - key: 定位行的列
+
+    返回:
+    - 提交更新的行数
+    """
+    if not rows:
+        return 0
+    table = model.__table__
+    stmt = update(table).where(table.c[key] == bindparam(f"_{key}"))
+    params = [{f"_{key}" if column == key else column: value for column, value in row.items()} for row in rows]
+    for chunk in _chunks(params, chunk_size):
+        session.execute(stmt, chunk)
+    return len(rows)
@@ -0,0 +1,71 @@
+# utils/vector_codec.py
+"""
+嵌入向量的二进制编码
+
+格式: 8字节头 + 连续的小端浮点数
+- 头: 魔数 b'EV'(2) | 版本(1) | 数据类型(1, 1=float32 2=float16) | 维度(uint32)
+- 读取时用 np.frombuffer 直接映射为数组，不解析文本、不逐个转换浮点数
+
+解码时兼容迁移前的 JSON 数据（list / str）；写入只支持二进制列，
+JSON 列必须先由 migrate_embeddings.py 转换（容器启动时 start.sh 自动执行）
+"""
+
+import json
+import os
+import struct
+from typing import Iterable, Optional
+import numpy as np
+
+# 新写入向量使用的存储精度：float32 或 float16（体积减半，精度对余弦相似度去重足够）
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+
+_HEADER = struct.Struct("<2sBBI")
+_MAGIC = b"EV"
+_VERSION = 1
+_DTYPE_CODES = {"float32": 1, "float16": 2}
+_CODE_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+
+
+def encode_vector(vector, dtype: str = None) -> bytes:
+    """把向量编码为带头的二进制"""
+    dtype = dtype or EMBEDDING_STORAGE_DTYPE
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"不支持的存储精度: {dtype}")
+    code = _DTYPE_CODES[dtype]
+    array = np.asarray(vector, dtype=_CODE_DTYPES[code]).ravel()
+    return _HEADER.pack(_MAGIC, _VERSION, code, array.size) + array.tobytes()
+
+
+def is_encoded(value) -> bool:
+    """是否为本模块编码的二进制向量"""
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:2]) == _MAGIC
+
+
+def decode_vector(value) -> Optional[np.ndarray]:
+    """
+    解码向量
+
+    float32 数据直接返回指向原缓冲区的只读数组（零拷贝）；float16 数据转换为 float32。
+    旧的 JSON 数据（list 或 JSON 字符串）转换为 float32 数组。
+    """
+    if value is None:
+        return None
+    if is_encoded(value):
+        magic, version, code, dim = _HEADER.unpack_from(value)
+        if version != _VERSION or code not in _CODE_DTYPES:
+            raise ValueError(f"无法识别的向量编码: version={version}, dtype={code}")
+        array = np.frombuffer(value, dtype=_CODE_DTYPES[code], count=dim, offset=_HEADER.size)
+        return array if code == 1 else array.astype(np.float32)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value).decode("utf-8")
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32) if value else None
+
+
+def decode_matrix(values: Iterable) -> np.ndarray:
+    """把多个向量解码为 (条数 x 维度) 的 float32 矩阵"""
+    vectors = [decode_vector(value) for value in values]
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.vstack(vectors)